@@ -0,0 +1,282 @@
+"""Async HTTP inspection service for the Comparateur_PDF project.
+
+Submit an inspection with a multipart POST to /inspections holding the
+report PDFs and device photos (any field name) and an optional "dae_type"
+field ("G5" or "G3", used when the generation of an AED report cannot be
+detected from its content). The response streams newline-delimited JSON events:
+"queued" while waiting for a free slot, one "progress" event per file, then
+a final "result" event with the extracted data and the comparisons, or an
+"error" event.
+
+Usage:
+    python service.py [--host HOST] [--port PORT] [--ocr-workers N] [--stub]
+                      [--replay CASSETTE [--replay-latency L] [--replay-error-rate R]]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+from aiohttp import web
+from src.config import (
+    ALLOWED_EXTENSIONS, OCR_POOL_WORKERS, PDF_WORKERS, SERVICE_HOST, SERVICE_PORT, SERVICE_MAX_CONCURRENT,
+    SERVICE_MAX_PENDING, SERVICE_WORKERS, SERVICE_MAX_UPLOAD_MB
+)
+from src.checkpoint import CheckpointJournal, batch_job_id, content_digest
+from src.comparison import aed_record, compare_rvd_aed_data, compare_rvd_images_data
+from src.inspections import add_reports, duplicate_report_message
+from src.processing import analyze_images, analyze_pdfs, decode_images, new_pipeline_stats
+from src.records import json_default
+from src.scheduler import run_in_background
+from src.utils import strip_images
+
+def _is_pdf(name: str, content_type: str) -> bool:
+    """Tell whether an uploaded file is a PDF report."""
+    return content_type == "application/pdf" or name.lower().endswith('.pdf')
+
+def run_inspection(files: List[Tuple[str, str, bytes]], dae_type: str, client, reader,
+                   ocr_pool, stats: Dict, on_event: Callable[[Dict], None]) -> Dict:
+    """Run the full pipeline on the files of one inspection.
+
+    Stage outputs are checkpointed, so submitting the same files again
+    after a crash resumes the run.
+
+    Args:
+        files: (file name, content type, content) of each uploaded file.
+        dae_type: AED generation ("G5" or "G3") used when it cannot be detected.
+        client: Initialized InferenceHTTPClient.
+        reader: Initialized EasyOCR reader.
+        ocr_pool: OcrWorkerPool used for the OCR stage, if any.
+        stats: Pipeline counters updated in place.
+        on_event: Called with a progress event for each file.
+
+    Returns:
+        Extracted data, comparisons, pipeline messages and the files resumed
+        from the checkpoint journal.
+    """
+    processed_data = {
+        'RVD': {},
+        'AEDG5': {},
+        'AEDG3': {},
+        'AED': {},
+        'images': [],
+        'files': [name for name, _, _ in files],
+        'comparisons': {'rvd_vs_aed': {}, 'rvd_vs_images': {}}
+    }
+    messages = []
+
+    def on_message(level: str, text: str) -> None:
+        messages.append({'level': level, 'message': text})
+
+    total = len(files)
+    pdf_files = [f for f in files if _is_pdf(f[0], f[1])]
+    image_files = [f for f in files if not _is_pdf(f[0], f[1])]
+
+    journal = CheckpointJournal(batch_job_id(
+        [(name, content_digest(content)) for name, _, content in files], dae_type
+    ))
+
+    try:
+        # PDFs are parsed in the background while the images flow through their pipeline
+        pdf_future = run_in_background(
+            analyze_pdfs, [(name, content) for name, _, content in pdf_files], dae_type,
+            PDF_WORKERS, journal
+        ) if pdf_files else None
+
+        readable = []
+        for name, _, content in image_files:
+            if name.rsplit('.', 1)[-1].lower() not in ALLOWED_EXTENSIONS:
+                on_message('warning', f"Type de fichier non pris en charge : {name}")
+                continue
+            readable.append((name, io.BytesIO(content)))
+        named_images = decode_images(readable, on_message=on_message)
+        processed_data['images'] = analyze_images(
+            named_images, client, reader,
+            dedup_interval=None,  # A request holds a single inspection
+            ocr_pool=ocr_pool,
+            stats=stats,
+            on_progress=lambda done, name: on_event(
+                {'event': 'progress', 'file': name, 'done': done, 'total': total}
+            ),
+            on_message=on_message,
+            journal=journal
+        )
+
+        for i, (name, reports, error) in enumerate(pdf_future.result() if pdf_future else []):
+            on_event({'event': 'progress', 'file': name, 'done': len(image_files) + i + 1, 'total': total})
+            if error is not None:
+                on_message('error', f"Erreur lors de la lecture de {name} : {error}")
+                continue
+            rejected = add_reports(processed_data, reports)
+            if rejected:
+                on_message('error', duplicate_report_message(name, rejected))
+            for slot, data in reports:
+                if slot != 'AED' and processed_data[slot] is data:
+                    on_message('success', f"Rapport {slot} traité : {name}")
+            if not reports:
+                on_message('warning', f"Type de PDF non reconnu : {name}")
+    except BaseException:
+        journal.close()  # Keep the completed stages for a resubmission
+        raise
+    checkpoint = journal.report()
+    journal.finish()
+
+    rvd = processed_data['RVD']
+    aed = aed_record(processed_data, dae_type)
+    if rvd and aed:
+        processed_data['comparisons']['rvd_vs_aed'] = compare_rvd_aed_data(rvd, aed)
+    if rvd:
+        processed_data['comparisons']['rvd_vs_images'] = compare_rvd_images_data(rvd, processed_data['images'])
+    return {'data': strip_images(processed_data), 'messages': messages, 'checkpoint': checkpoint}
+
+async def _read_upload(request: web.Request) -> Tuple[List[Tuple[str, str, bytes]], str]:
+    """Read the uploaded files and the AED generation of a multipart request."""
+    limit = SERVICE_MAX_UPLOAD_MB * 1024 * 1024
+    files, dae_type, size = [], 'G5', 0
+    multipart = await request.multipart()
+    async for part in multipart:
+        if part.filename:
+            content = await part.read()
+            size += len(content)
+            if size > limit:
+                raise web.HTTPRequestEntityTooLarge(max_size=limit, actual_size=size)
+            files.append((part.filename, part.headers.get('Content-Type', ''), content))
+        elif part.name == 'dae_type':
+            dae_type = (await part.text()).strip().upper()
+    if dae_type not in ('G5', 'G3'):
+        raise web.HTTPBadRequest(text="dae_type must be G5 or G3")
+    if not files:
+        raise web.HTTPBadRequest(text="No file uploaded")
+    return files, dae_type
+
+async def _send(response: web.StreamResponse, event: Dict) -> None:
+    """Write one newline-delimited JSON event."""
+    await response.write((json.dumps(event, ensure_ascii=False, default=json_default) + "\n").encode('utf-8'))
+
+async def handle_inspection(request: web.Request) -> web.StreamResponse:
+    """Run an uploaded inspection and stream its progress and results."""
+    app = request.app
+    if app['pending'] >= SERVICE_MAX_PENDING:
+        raise web.HTTPServiceUnavailable(text="Service busy, retry later", headers={'Retry-After': '5'})
+    app['pending'] += 1
+    try:
+        files, dae_type = await _read_upload(request)
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        if app['slots'].locked():
+            await _send(response, {'event': 'queued', 'pending': app['pending']})
+
+        async with app['slots']:
+            loop = asyncio.get_running_loop()
+            events = asyncio.Queue()
+
+            def on_event(event: Dict) -> None:
+                loop.call_soon_threadsafe(events.put_nowait, event)
+
+            def run() -> None:
+                try:
+                    result = run_inspection(
+                        files, dae_type, app['client'], app['reader'], app['ocr_pool'],
+                        app['stats'], on_event
+                    )
+                    on_event({'event': 'result', **result})
+                except Exception as e:
+                    on_event({'event': 'error', 'message': str(e)})
+
+            job = loop.run_in_executor(app['executor'], run)
+            try:
+                while True:
+                    event = await events.get()
+                    await _send(response, event)
+                    if event['event'] in ('result', 'error'):
+                        break
+                await response.write_eof()
+            except ConnectionResetError:
+                pass  # The client left; its inspection still runs to the end
+            finally:
+                # The slot is only released once the run is over, whether or not
+                # the client is still there, so the limits bound the running jobs
+                await asyncio.shield(job)
+        return response
+    finally:
+        app['pending'] -= 1
+
+async def handle_health(request: web.Request) -> web.Response:
+    """Report the service load and pipeline counters."""
+    app = request.app
+    return web.json_response({'status': 'ok', 'pending': app['pending'], 'stats': app['stats']})
+
+def create_app(client, reader, ocr_pool=None, workers: int = SERVICE_WORKERS,
+               max_concurrent: int = SERVICE_MAX_CONCURRENT) -> web.Application:
+    """Build the HTTP application around shared clients and workers.
+
+    Args:
+        client: Initialized InferenceHTTPClient (or stub).
+        reader: Initialized EasyOCR reader (or stub).
+        ocr_pool: OcrWorkerPool shared by all requests, if any.
+        workers: Threads running inspections.
+        max_concurrent: Inspections running at the same time.
+
+    Returns:
+        The aiohttp application.
+    """
+    app = web.Application(client_max_size=SERVICE_MAX_UPLOAD_MB * 1024 * 1024)
+    app['client'] = client
+    app['reader'] = reader
+    app['ocr_pool'] = ocr_pool
+    app['stats'] = new_pipeline_stats()
+    app['executor'] = ThreadPoolExecutor(max_workers=workers)
+    app['slots'] = asyncio.Semaphore(max_concurrent)
+    app['pending'] = 0
+
+    async def shutdown(app: web.Application) -> None:
+        app['executor'].shutdown(wait=False)
+        if app['ocr_pool'] is not None:
+            app['ocr_pool'].close()
+
+    app.on_cleanup.append(shutdown)
+    app.router.add_post('/inspections', handle_inspection)
+    app.router.add_get('/health', handle_health)
+    return app
+
+def main():
+    """Start the inspection service."""
+    parser = argparse.ArgumentParser(description="Async HTTP inspection service")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--ocr-workers', type=int, default=OCR_POOL_WORKERS,
+                        help="OCR worker processes (fewer than 2: OCR in the service threads)")
+    parser.add_argument('--stub', action='store_true', help="Use stubbed inference and OCR")
+    parser.add_argument('--replay', metavar='CASSETTE',
+                        help="Serve classifications from a recorded cassette")
+    parser.add_argument('--replay-latency', default='recorded',
+                        help="'recorded', 'none' or a latency in seconds")
+    parser.add_argument('--replay-error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.stub:
+        from src.stubs import StubInferenceClient, StubOcrReader
+        client, reader = StubInferenceClient(), StubOcrReader()
+    elif args.replay:
+        from src.cassette import ReplayInferenceClient
+        from src.clients import load_ocr_reader
+        latency = args.replay_latency
+        client = ReplayInferenceClient(
+            args.replay,
+            latency=latency if latency in ('recorded', 'none') else float(latency),
+            error_rate=args.replay_error_rate
+        )
+        reader = load_ocr_reader()
+    else:
+        from src.clients import initialize_clients
+        client, reader = initialize_clients()
+    ocr_pool = None
+    if args.ocr_workers >= 2 and not args.stub:
+        from src.ocr_pool import OcrWorkerPool
+        ocr_pool = OcrWorkerPool(args.ocr_workers)
+    web.run_app(create_app(client, reader, ocr_pool), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""OCR engine benchmark for the Comparateur_PDF project.
+
+Compares, on a labelled corpus, EasyOCR under torch's default threading with
+the thread settings of the CPU-optimized mode, and EasyOCR's default int8
+quantized reader, used by the app, with its float32 model. The corpus folder
+holds the label photos and a labels.json file listing, for each photo, its
+device type and expected values:
+
+    [{"file": "batterie_01.jpg", "type": "Batterie",
+      "serial": "LXXX12345", "date": "2023-05-12"}, ...]
+
+Usage:
+    python -m src.benchmark path/to/corpus [--threads N] [--output report.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Dict, List, Optional
+import numpy as np
+import torch
+from PIL import Image
+from .clients import create_ocr_reader
+from .extraction import (
+    extract_important_info_g3, extract_important_info_g5, extract_important_info_batterie
+)
+from .processing import fix_orientation
+from .utils import normalize_serial, parse_date
+
+EXTRACTORS = {
+    'Defibrillateur G3': extract_important_info_g3,
+    'Defibrillateur G5': extract_important_info_g5,
+    'Batterie': extract_important_info_batterie,
+}
+
+def load_corpus(corpus_dir: str) -> List[Dict]:
+    """Load the labelled OCR samples of a corpus folder.
+
+    Args:
+        corpus_dir: Folder holding the photos and labels.json.
+
+    Returns:
+        Labels of the samples that can be read by OCR, with their loaded image.
+    """
+    with open(os.path.join(corpus_dir, 'labels.json'), encoding='utf-8') as f:
+        labels = json.load(f)
+    samples = []
+    for label in labels:
+        if label.get('type') not in EXTRACTORS:
+            continue
+        with Image.open(os.path.join(corpus_dir, label['file'])) as img:
+            image = fix_orientation(img).convert('RGB')
+        samples.append({**label, 'array': np.array(image)})
+    return samples
+
+def _same_date(found: Optional[str], expected: Optional[str]) -> bool:
+    """Compare two dates regardless of their formatting."""
+    if not found or not expected:
+        return found == expected
+    found_date, found_err = parse_date(found)
+    expected_date, expected_err = parse_date(expected)
+    return not (found_err or expected_err) and found_date == expected_date
+
+def run_engine(reader, samples: List[Dict], warmup: int = 1) -> Dict:
+    """Time an OCR reader over the corpus and score its extractions.
+
+    Args:
+        reader: EasyOCR reader to evaluate.
+        samples: Samples returned by load_corpus.
+        warmup: Number of untimed runs before measuring.
+
+    Returns:
+        Latency and accuracy figures.
+    """
+    for sample in samples[:warmup]:
+        reader.readtext(sample['array'])
+    latencies, serial_ok, date_ok = [], 0, 0
+    for sample in samples:
+        start = time.perf_counter()
+        results = reader.readtext(sample['array'])
+        latencies.append(time.perf_counter() - start)
+        serial, date = EXTRACTORS[sample['type']](results)
+        serial_ok += normalize_serial(serial or '') == normalize_serial(sample.get('serial') or '')
+        date_ok += _same_date(date, sample.get('date'))
+    count = len(samples) or 1
+    return {
+        'mean_s': statistics.mean(latencies) if latencies else 0.0,
+        'p95_s': sorted(latencies)[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+        'serial_accuracy': serial_ok / count,
+        'date_accuracy': date_ok / count,
+    }
+
+def _compare(baseline: Dict, candidate: Dict) -> Dict:
+    """Speedup and accuracy differences of a run over a baseline run."""
+    return {
+        'speedup': baseline['mean_s'] / candidate['mean_s'] if candidate['mean_s'] else None,
+        'serial_accuracy_delta': candidate['serial_accuracy'] - baseline['serial_accuracy'],
+        'date_accuracy_delta': candidate['date_accuracy'] - baseline['date_accuracy'],
+    }
+
+def benchmark_ocr(corpus_dir: str, threads: Optional[int] = None) -> Dict:
+    """Compare the threading and quantization settings of the OCR reader on a corpus.
+
+    Args:
+        corpus_dir: Folder holding the photos and labels.json.
+        threads: Intra-op threads of the tuned run (None: all cores).
+
+    Returns:
+        Figures of each run with its thread count and precision, then the
+        speedup and accuracy differences of tuned over default threading,
+        and of the int8 over the float32 reader.
+    """
+    samples = load_corpus(corpus_dir)
+    default_threads = torch.get_num_threads()
+    float_run = run_engine(create_ocr_reader(use_gpu=False, cpu_optimized=False, quantize=False), samples)
+    float_run.update(threads=default_threads, precision='float32')
+    default_run = run_engine(create_ocr_reader(use_gpu=False, cpu_optimized=False), samples)
+    default_run.update(threads=default_threads, precision='int8')
+    tuned_run = run_engine(create_ocr_reader(use_gpu=False, cpu_optimized=True, intra_op=threads), samples)
+    tuned_run.update(threads=torch.get_num_threads(), precision='int8')
+    torch.set_num_threads(default_threads)
+    return {
+        'samples': len(samples),
+        'default_threading': default_run,
+        'tuned_threading': tuned_run,
+        'float32': float_run,
+        'threading': _compare(default_run, tuned_run),
+        'quantization': _compare(float_run, default_run),
+    }
+
+def main():
+    """Run the OCR benchmark from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark the threading and quantization of the OCR engine")
+    parser.add_argument('corpus_dir', help="Folder holding the photos and labels.json")
+    parser.add_argument('--threads', type=int, default=None, help="Intra-op threads of the tuned run")
+    parser.add_argument('--output', help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = benchmark_ocr(args.corpus_dir, args.threads)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Time budget of interactive inspections for the Comparateur_PDF project.
+
+An inspection uploaded in the app gets a time budget. Before each costly
+step of an image (classification, OCR, barcode), the cost of each quality
+tier of the step is projected from the costs measured on previous images,
+and the best tier fitting the share of the remaining time left to the image
+is chosen. Steps no tier fits in are deferred: their images are returned as
+provisional results and completed at full quality in the background.
+
+Tiers of a step, from the best to the cheapest:
+    - 'full': the step as configured;
+    - 'roi': OCR only, the full-resolution pass reads only the region where
+      the fast pass found text;
+    - 'fast': OCR only, the fast pass without full-resolution pass.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+from .config import BUDGET_EWMA_ALPHA, BUDGET_PRIOR_COSTS
+
+# Tiers of each step of the image pipeline, best first
+STEP_TIERS = {
+    'classify': ['full'],
+    'ocr': ['full', 'roi', 'fast'],
+    'barcode': ['full'],
+}
+
+class CostModel:
+    """Exponentially weighted moving average of the cost of each step tier.
+
+    Costs are kept in seconds per megapixel of the photo, so photos of
+    different resolutions share the same model.
+    """
+
+    def __init__(self, alpha: float = BUDGET_EWMA_ALPHA, priors: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            alpha: Weight of the latest measure in the average.
+            priors: Cost of each 'step:tier' before any measure.
+        """
+        self.alpha = alpha
+        self._costs = dict(priors if priors is not None else BUDGET_PRIOR_COSTS)
+        self._lock = threading.Lock()
+
+    def estimate(self, step: str, tier: str, megapixels: float) -> float:
+        """Project the duration of a step tier on a photo, in seconds."""
+        with self._lock:
+            return self._costs.get(f"{step}:{tier}", 0.0) * megapixels
+
+    def observe(self, step: str, tier: str, megapixels: float, seconds: float) -> None:
+        """Fold the measured duration of a step tier into the model."""
+        cost = seconds / max(megapixels, 1e-3)
+        key = f"{step}:{tier}"
+        with self._lock:
+            previous = self._costs.get(key)
+            self._costs[key] = cost if previous is None else previous + self.alpha * (cost - previous)
+
+    @contextmanager
+    def measure(self, step: str, tier: str, megapixels: float) -> Iterator[None]:
+        """Time a with block running a step tier and fold it into the model."""
+        start = time.perf_counter()
+        yield
+        self.observe(step, tier, megapixels, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Return the current cost of each step tier, in seconds per megapixel."""
+        with self._lock:
+            return dict(self._costs)
+
+# Shared by every inspection of the process, so each one benefits from the measures of the others
+COSTS = CostModel()
+
+def new_budget_stats() -> Dict:
+    """Return empty time budget counters."""
+    return {'inspections': 0, 'over_budget': 0, 'provisional': 0, 'tiers': {}}
+
+class TimeBudget:
+    """Deadline of one inspection and the tier choices made to meet it."""
+
+    def __init__(self, seconds: Optional[float], costs: CostModel = COSTS):
+        """
+        Args:
+            seconds: Time allowed to the inspection from now, None for no limit.
+            costs: Cost model the projections come from.
+        """
+        self.seconds = seconds
+        self.costs = costs
+        self.deadline = time.monotonic() + seconds if seconds else None
+        # Set by analyze_images when provisional results are completed in the background
+        self.completion = None
+        self._pending: Dict[str, int] = {}
+        self._tiers: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (infinite without limit)."""
+        if self.deadline is None:
+            return float('inf')
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def plan(self, step: str, items: int) -> None:
+        """Declare the number of images a step will see."""
+        with self._lock:
+            self._pending[step] = self._pending.get(step, 0) + items
+
+    def skip(self, step: str) -> None:
+        """Tell that an image does not go through a step."""
+        with self._lock:
+            self._pending[step] = max(self._pending.get(step, 0) - 1, 0)
+
+    def choose(self, step: str, megapixels: float, workers: int = 1) -> Optional[str]:
+        """Pick the best tier of a step fitting the time left to an image.
+
+        The remaining time is shared between the images still to go through
+        the step, each worker of the step taking its share in parallel.
+
+        Args:
+            step: Step name, see STEP_TIERS.
+            megapixels: Size of the photo.
+            workers: Images going through the step at the same time.
+
+        Returns:
+            The chosen tier, or None if the step has to be deferred.
+        """
+        with self._lock:
+            waiting = max(self._pending.get(step, 0), 1)
+            self._pending[step] = waiting - 1
+        tiers = STEP_TIERS[step]
+        if self.deadline is None:
+            chosen = tiers[0]
+        else:
+            allowance = self.remaining() * min(1.0, workers / waiting)
+            chosen = next(
+                (tier for tier in tiers if self.costs.estimate(step, tier, megapixels) <= allowance), None
+            )
+        key = f"{step}:{chosen or 'defer'}"
+        with self._lock:
+            self._tiers[key] = self._tiers.get(key, 0) + 1
+        return chosen
+
+    def report(self, stats: Dict, provisional: int) -> None:
+        """Add the tier choices of the inspection to running counters.
+
+        Args:
+            stats: Counters updated in place, see new_budget_stats.
+            provisional: Number of provisional image results returned.
+        """
+        with self._lock:
+            tiers = dict(self._tiers)
+        stats['inspections'] += 1
+        stats['over_budget'] += int(provisional > 0)
+        stats['provisional'] += provisional
+        for key, count in tiers.items():
+            stats['tiers'][key] = stats['tiers'].get(key, 0) + count
+
+def provisional_message(count: int) -> Optional[str]:
+    """Tell the user that some results are provisional, None when all are final."""
+    if not count:
+        return None
+    return (
+        f"Budget de temps atteint : {count} résultat(s) d'image provisoire(s), "
+        "finalisé(s) en arrière-plan"
+    )
+
+def megapixels(size: Tuple[int, int]) -> float:
+    """Return the number of megapixels of a (width, height) size."""
+    return size[0] * size[1] / 1e6
@@ -0,0 +1,132 @@
+"""Record/replay of remote inference calls for the Comparateur_PDF project.
+
+A cassette is a JSON-lines file holding one recorded classification per
+line, keyed by the SHA-256 of the image content and the model id, with the
+measured round-trip latency. Replaying a cassette makes runs deterministic
+and possible offline, with optional simulated latency and errors.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional, Union
+
+def content_key(image_path: str, model_id: str) -> str:
+    """Key a classification request by image content and model.
+
+    Args:
+        image_path: Path to the image file.
+        model_id: Model the image is sent to.
+
+    Returns:
+        Hex digest identifying the request.
+    """
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(model_id.encode('utf-8'))
+    return digest.hexdigest()
+
+class RecordingInferenceClient:
+    """Wrap an inference client and append each response to a cassette."""
+
+    def __init__(self, client, cassette_path: str):
+        """
+        Args:
+            client: Live InferenceHTTPClient.
+            cassette_path: Cassette file, created or appended to.
+        """
+        self._client = client
+        self._path = cassette_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(cassette_path) or '.', exist_ok=True)
+
+    def _append(self, entry: Dict) -> None:
+        """Append one entry to the cassette."""
+        with self._lock, open(self._path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def infer(self, image_path: str, model_id: str) -> Dict:
+        """Classify an image with the live client and record the exchange."""
+        key = content_key(image_path, model_id)
+        start = time.perf_counter()
+        try:
+            response = self._client.infer(image_path, model_id=model_id)
+        except Exception as e:
+            self._append({
+                'key': key, 'model_id': model_id,
+                'latency': time.perf_counter() - start, 'error': f"{type(e).__name__}: {e}"
+            })
+            raise
+        self._append({
+            'key': key, 'model_id': model_id,
+            'latency': time.perf_counter() - start, 'response': response
+        })
+        return response
+
+class ReplayInferenceClient:
+    """Serve classifications from a cassette, without network access."""
+
+    def __init__(self, cassette_path: str, latency: Union[str, float] = 'recorded',
+                 latency_scale: float = 1.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            cassette_path: Cassette file to replay.
+            latency: 'recorded' to replay measured latencies, 'none' to answer
+                immediately, or a fixed latency in seconds.
+            latency_scale: Factor applied to the latency.
+            jitter: Standard deviation of a gaussian noise added to the latency, in seconds.
+            error_rate: Probability of failing a request with a ConnectionError.
+            seed: Seed of the latency and error draws, for reproducible runs.
+        """
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._entries = {}
+        with open(cassette_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry['key']] = entry
+
+    def _delay(self, entry: Dict) -> float:
+        """Draw the simulated latency of a request."""
+        if self.latency == 'none':
+            return 0.0
+        base = entry.get('latency', 0.0) if self.latency == 'recorded' else float(self.latency)
+        with self._lock:
+            noise = self._random.gauss(0.0, self.jitter) if self.jitter else 0.0
+        return max(0.0, base * self.latency_scale + noise)
+
+    def infer(self, image_path: str, model_id: str) -> Dict:
+        """Replay the recorded classification of an image.
+
+        Raises:
+            KeyError: If the image was not recorded for this model.
+            ConnectionError: When a simulated error is drawn.
+            RuntimeError: If the recorded request failed.
+        """
+        key = content_key(image_path, model_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            raise KeyError(f"No recorded response for image {key[:12]} and model {model_id}")
+        time.sleep(self._delay(entry))
+        with self._lock:
+            failed = self.error_rate and self._random.random() < self.error_rate
+        if failed:
+            raise ConnectionError("Simulated inference error")
+        if 'error' in entry:
+            raise RuntimeError(f"Recorded inference error: {entry['error']}")
+        return copy.deepcopy(entry['response'])
+
+    def __len__(self) -> int:
+        return len(self._entries)
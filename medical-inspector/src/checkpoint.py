@@ -0,0 +1,176 @@
+"""Checkpoint journal of batch runs for the Comparateur_PDF project.
+
+Each batch run appends the output of every completed stage of every file to
+a journal of msgpack entries (see records.pack), flushed to disk as it is
+written. A run interrupted by a crash or a restart is resumed by submitting
+the same files again: the job identifier is derived from their content, so
+the journal is found again and completed stages are read back instead of
+paying again for inference and OCR calls. The journal is deleted once the
+run completes.
+
+A journal is held under an exclusive lock while its run is live, so two
+sessions submitting the same files never share one: the later run keeps
+its own journal next to it. The lock goes away with the process holding
+it, so the journal of a crashed run can be resumed.
+"""
+
+import hashlib
+import os
+import threading
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Tuple
+from .config import CHECKPOINT_DIR
+from .records import pack, read_packed
+
+try:
+    import fcntl
+except ImportError:  # Windows: journals are not locked
+    fcntl = None
+
+def content_digest(content: bytes) -> str:
+    """Return the SHA-256 of a file content."""
+    return hashlib.sha256(content).hexdigest()
+
+def batch_job_id(files: Iterable[Tuple[str, str]], *params: str) -> str:
+    """Identify a batch run by its files and parameters.
+
+    Args:
+        files: (file name, content digest) of each file of the batch.
+        *params: Run parameters changing the results (e.g. the AED generation).
+
+    Returns:
+        Hex digest, the same whenever the same files are submitted again.
+    """
+    digest = hashlib.sha256()
+    for name, file_digest in sorted(files):
+        digest.update(f"{name}\0{file_digest}\n".encode('utf-8'))
+    for param in params:
+        digest.update(f"{param}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+class CheckpointJournal:
+    """Durable journal of the stage outputs of one batch run.
+
+    Entries are keyed by file name, content digest and stage, so a file
+    changed since the interrupted run is computed again. The journal tracks
+    which files were resumed from it and which were (re)computed.
+    """
+
+    def __init__(self, job_id: str, directory: str = CHECKPOINT_DIR):
+        """
+        Args:
+            job_id: Identifier of the run, see batch_job_id.
+            directory: Folder holding the journals.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._entries: Dict[Tuple[str, str, str], Any] = {}
+        self._resumed: Dict[str, set] = {}
+        self._computed: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.path, self._file = self._open_unlocked(directory, job_id)
+        self._load()
+
+    @staticmethod
+    def _open_unlocked(directory: str, job_id: str) -> Tuple[str, BinaryIO]:
+        """Open and lock the first journal of the job not held by a live run."""
+        attempt = 0
+        while True:
+            suffix = f".{attempt}" if attempt else ""
+            path = os.path.join(directory, f"{job_id}{suffix}.msgpack")
+            f = open(path, 'a+b')
+            if fcntl is None:
+                return path, f
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                attempt += 1
+                continue
+            # The run that held it may have finished and deleted it meanwhile
+            if os.path.exists(path) and os.path.samestat(os.fstat(f.fileno()), os.stat(path)):
+                return path, f
+            f.close()
+
+    def _load(self) -> None:
+        """Read the entries of an interrupted run, dropping a torn last entry."""
+        self._file.seek(0)
+        entries, intact = read_packed(self._file)
+        # New entries are appended after the intact ones
+        self._file.truncate(intact)
+        for entry in entries:
+            self._entries[(entry['file'], entry['digest'], entry['stage'])] = entry['output']
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, name: str, digest: str, stage: str) -> Optional[Any]:
+        """Return the recorded output of a stage, or None if it has to be computed.
+
+        Args:
+            name: File name.
+            digest: Content digest of the file.
+            stage: Stage name.
+        """
+        with self._lock:
+            output = self._entries.get((name, digest, stage))
+            if output is not None:
+                self._resumed.setdefault(name, set()).add(stage)
+            return output
+
+    def record(self, name: str, digest: str, stage: str, output: Any) -> None:
+        """Durably record the output of a completed stage.
+
+        Args:
+            name: File name.
+            digest: Content digest of the file.
+            stage: Stage name.
+            output: Stage output, records included.
+        """
+        entry = pack({'file': name, 'digest': digest, 'stage': stage, 'output': output})
+        with self._lock:
+            self._file.write(entry)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._entries[(name, digest, stage)] = output
+            self._computed.setdefault(name, set()).add(stage)
+
+    def report(self) -> Dict[str, list]:
+        """Tell which files were resumed from the journal and which were computed.
+
+        Returns:
+            File names under 'resumed' (every stage read back), 'partial'
+            (some stages read back, others computed) and 'recomputed'.
+        """
+        with self._lock:
+            resumed = set(self._resumed)
+            computed = set(self._computed)
+        return {
+            'resumed': sorted(resumed - computed),
+            'partial': sorted(resumed & computed),
+            'recomputed': sorted(computed - resumed),
+        }
+
+    def close(self) -> None:
+        """Close the journal, keeping it for a later resume."""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def finish(self) -> None:
+        """Delete and close the journal of a completed run.
+
+        The journal is deleted while still locked, so no other run can have
+        taken it over in between.
+        """
+        with self._lock:
+            if not self._file.closed and os.path.exists(self.path):
+                os.unlink(self.path)
+        self.close()
+
+def resume_message(report: Dict[str, list]) -> Optional[str]:
+    """Summarize a journal report for the user, None when nothing was resumed."""
+    if not report['resumed'] and not report['partial']:
+        return None
+    return (
+        f"Reprise d'un traitement interrompu : {len(report['resumed'])} fichier(s) repris, "
+        f"{len(report['partial'])} repris en partie, {len(report['recomputed'])} recalculé(s)"
+    )
@@ -1,10 +1,82 @@
 """Client initializations for the Comparateur_PDF project."""
 
+import os
+from typing import Optional
 import streamlit as st
 import torch
 import easyocr
 from inference_sdk import InferenceHTTPClient
-from .config import API_URL  
+from .config import (
+    API_URL, OCR_CPU_OPTIMIZED, OCR_INTRA_OP_THREADS, OCR_INTER_OP_THREADS,
+    INFERENCE_MODE, CASSETTE_PATH, REPLAY_LATENCY, REPLAY_ERROR_RATE
+)
+
+def configure_torch_threads(intra_op: Optional[int] = OCR_INTRA_OP_THREADS,
+                            inter_op: Optional[int] = OCR_INTER_OP_THREADS) -> None:
+    """Bound the number of threads torch uses in this process.
+
+    Args:
+        intra_op: Threads used inside an operator (None: all available cores).
+        inter_op: Threads used to run independent operators in parallel.
+    """
+    torch.set_num_threads(intra_op or os.cpu_count() or 1)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            pass  # Can only be set once, before any inter-op parallel work started
+
+def create_ocr_reader(use_gpu: bool, cpu_optimized: bool = OCR_CPU_OPTIMIZED,
+                      intra_op: Optional[int] = OCR_INTRA_OP_THREADS,
+                      quantize: bool = True) -> easyocr.Reader:
+    """Create an EasyOCR reader.
+
+    In CPU-optimized mode, torch threading is bounded; otherwise torch keeps
+    its default threading. By default, EasyOCR quantizes the recognition
+    network to int8 on CPU, in both modes.
+
+    Args:
+        use_gpu: Whether to run the models on GPU.
+        cpu_optimized: Whether to apply CPU tuning when running without GPU.
+        intra_op: Threads used inside an operator in CPU-optimized mode.
+        quantize: Whether EasyOCR quantizes the model on CPU (False: float32).
+
+    Returns:
+        EasyOCR reader.
+    """
+    if cpu_optimized and not use_gpu:
+        configure_torch_threads(intra_op)
+    return easyocr.Reader(['en'], gpu=use_gpu, quantize=quantize)
+
+@st.cache_resource
+def load_ocr_reader(cpu_optimized: bool = OCR_CPU_OPTIMIZED) -> easyocr.Reader:
+    """Load the EasyOCR reader once per process."""
+    # Check for GPU availability once and use it
+    return create_ocr_reader(torch.cuda.is_available(), cpu_optimized)
+
+def create_inference_client(mode: str = INFERENCE_MODE, cassette_path: str = CASSETTE_PATH):
+    """Create the classification client for an inference mode.
+
+    Args:
+        mode: "live", "record" (live calls saved to the cassette) or
+            "replay" (answers served from the cassette, no network).
+        cassette_path: Cassette file used by the record and replay modes.
+
+    Returns:
+        InferenceHTTPClient, or its recording or replaying counterpart.
+    """
+    from .cassette import RecordingInferenceClient, ReplayInferenceClient
+    if mode == 'replay':
+        return ReplayInferenceClient(
+            cassette_path, latency=REPLAY_LATENCY, error_rate=REPLAY_ERROR_RATE
+        )
+    client = InferenceHTTPClient(
+        api_url=API_URL,
+        api_key=st.secrets["API_KEY"]
+    )
+    if mode == 'record':
+        return RecordingInferenceClient(client, cassette_path)
+    return client
 
 def initialize_clients():
     """
@@ -14,13 +86,8 @@ def initialize_clients():
         tuple: (InferenceHTTPClient, EasyOCR Reader) instances
     """
     try:
-        client = InferenceHTTPClient(
-            api_url=API_URL,
-            api_key=st.secrets["API_KEY"]
-        )
-        # Check for GPU availability once and use it
-        use_gpu = torch.cuda.is_available()
-        reader = easyocr.Reader(['en'], gpu=use_gpu)
+        client = create_inference_client()
+        reader = load_ocr_reader()
         return client, reader
     except KeyError as e:
         raise KeyError("API_KEY not found in Streamlit secrets") from e
@@ -1,92 +1,185 @@
 """Comparison logic for the Comparateur_PDF project."""
 
-from typing import Dict
-import re
+from typing import Any, Callable, Dict, List, Optional
 import streamlit as st
+from .records import FieldComparison
+from .serial_match import match_serials
 from .utils import parse_date, normalize_serial
 
-def compare_rvd_aed() -> Dict[str, Dict[str, str]]:
-    """Compare data from RVD and AED reports.
+def _memoized(memo: Optional[Dict], key: str, depends_on: Dict[str, Any],
+              compute: Callable[[], FieldComparison]) -> FieldComparison:
+    """Serve a comparison result from the memo unless one of its inputs changed.
+
+    Args:
+        memo: Memo shared across calls, or None to always recompute.
+        key: Unique name of the comparison result.
+        depends_on: Input fields the result is computed from, with their current values.
+        compute: Function computing the result.
 
     Returns:
-        Comparison results.
+        The comparison result, annotated with the fields it depends on.
     """
-    results = {}
-    aed_type = f'AEDG{st.session_state.dae_type[-1]}'
-    if not st.session_state.processed_data.get('RVD'):
-        st.error("Données RVD manquantes pour la comparaison")
-        return results
-    if not st.session_state.processed_data.get(aed_type):
-        st.error(f"Données {aed_type} manquantes pour la comparaison")
-        return results
-
-    rvd = st.session_state.processed_data['RVD']
-    aed = st.session_state.processed_data[aed_type]
-
-    aed_key = 'N° série DAE' if st.session_state.dae_type == 'G5' else 'Série DSA'
-    results['serial'] = {
-        'rvd': rvd.get('Numéro de série DEFIBRILLATEUR', 'N/A'),
-        'aed': aed.get(aed_key, 'N/A'),
-        'match': normalize_serial(rvd.get('Numéro de série DEFIBRILLATEUR', '')) ==
-                 normalize_serial(aed.get(aed_key, ''))
-    }
+    if memo is not None:
+        cached = memo.get(key)
+        if cached is not None and cached[0] == depends_on:
+            return cached[1]
+    result = compute()
+    result['depends_on'] = sorted(depends_on)
+    if memo is not None:
+        memo[key] = (dict(depends_on), result)
+    return result
 
-    rvd_date, rvd_err = parse_date(rvd.get('Date-Heure rapport vérification défibrillateur', ''))
-    aed_date_key = 'Date / Heure:' if st.session_state.dae_type == 'G5' else 'Date de mise en service'
-    aed_date, aed_err = parse_date(aed.get(aed_date_key, ''))
-    results['report_date'] = {
-        'rvd': rvd.get('Date-Heure rapport vérification défibrillateur', 'N/A'),
-        'aed': aed.get(aed_date_key, 'N/A'),
-        'match': rvd_date == aed_date if not (rvd_err or aed_err) else False,
-        'errors': [e for e in [rvd_err, aed_err] if e]
-    }
+def _serial_comparison(rvd: Dict, rvd_field: str, other: Dict, other_field: str, side: str) -> FieldComparison:
+    """Compare a serial number from the RVD with one from another source."""
+    return FieldComparison({
+        'rvd': rvd.get(rvd_field, 'N/A'),
+        side: other.get(other_field) or 'N/A',
+        'match': normalize_serial(rvd.get(rvd_field, '')) ==
+                 normalize_serial(other.get(other_field) or '')
+    })
+
+def _fuzzy_serial_comparison(rvd: Dict, rvd_field: str, other: Dict, other_field: str,
+                             side: str) -> FieldComparison:
+    """Compare an RVD serial with one read by OCR, tolerating confusable characters."""
+    matched, confidence = match_serials(rvd.get(rvd_field, ''), other.get(other_field) or '')
+    return FieldComparison({
+        'rvd': rvd.get(rvd_field, 'N/A'),
+        side: other.get(other_field) or 'N/A',
+        'match': matched,
+        'confidence': round(confidence, 3)
+    })
 
-    rvd_batt_date, rvd_batt_err = parse_date(rvd.get('Date mise en service BATTERIE', ''))
-    aed_batt_key = "Date d'installation :" if st.session_state.dae_type == 'G5' else 'Date de mise en service batterie'
-    aed_batt_date, aed_batt_err = parse_date(aed.get(aed_batt_key, ''))
-    results['battery_install_date'] = {
-        'rvd': rvd.get('Date mise en service BATTERIE', 'N/A'),
-        'aed': aed.get(aed_batt_key, 'N/A'),
-        'match': rvd_batt_date == aed_batt_date if not (rvd_batt_err or aed_batt_err) else False,
-        'errors': [e for e in [rvd_batt_err, aed_batt_err] if e]
+def _date_comparison(rvd: Dict, rvd_field: str, other: Dict, other_field: str, side: str) -> FieldComparison:
+    """Compare a date from the RVD with one from another source."""
+    rvd_date, rvd_err = parse_date(rvd.get(rvd_field, ''))
+    other_date, other_err = parse_date(other.get(other_field) or '')
+    return FieldComparison({
+        'rvd': rvd.get(rvd_field, 'N/A'),
+        side: other.get(other_field) or 'N/A',
+        'match': rvd_date == other_date if not (rvd_err or other_err) else False,
+        'errors': [e for e in [rvd_err, other_err] if e]
+    })
+
+def _field_comparison(memo: Optional[Dict], key: str, compare: Callable,
+                      rvd: Dict, rvd_field: str, other: Dict, other_label: str,
+                      other_field: str, side: str) -> FieldComparison:
+    """Memoize a field comparison on the two values it reads."""
+    depends_on = {
+        f"RVD.{rvd_field}": rvd.get(rvd_field),
+        f"{other_label}.{other_field}": other.get(other_field),
     }
+    return _memoized(
+        memo, key, depends_on,
+        lambda: compare(rvd, rvd_field, other, other_field, side)
+    )
 
+def _battery_level_comparison(rvd: Dict, aed: Dict) -> FieldComparison:
+    """Compare the battery charge level of the RVD and the AED report."""
     try:
         rvd_batt = float(rvd.get('Niveau de charge de la batterie en %', 0))
-        aed_batt_text = (
-            aed.get('Capacité restante de la batterie', '0')
-            if st.session_state.dae_type == 'G5'
-            else aed.get('Capacité restante de la batterie 12V', '0')
+        if aed.get('battery_capacity') is None:
+            raise ValueError("capacité restante absente du rapport AED")
+        aed_batt = float(aed['battery_capacity'])
+        return FieldComparison(
+            rvd=f"{rvd_batt}%",
+            aed=f"{aed_batt}%",
+            match=abs(rvd_batt - aed_batt) <= 2
+        )
+    except (ValueError, TypeError) as e:
+        return FieldComparison(
+            error=f"Données de batterie invalides : {str(e)}",
+            match=False
         )
-        aed_batt = float(re.search(r'\d+', aed_batt_text).group())
-        results['battery_level'] = {
-            'rvd': f"{rvd_batt}%",
-            'aed': f"{aed_batt}%",
-            'match': abs(rvd_batt - aed_batt) <= 2
-        }
-    except (ValueError, AttributeError) as e:
-        results['battery_level'] = {
-            'error': f"Données de batterie invalides : {str(e)}",
-            'match': False
-        }
 
-    st.session_state.processed_data['comparisons']['rvd_vs_aed'] = results
-    return results
+def aed_record(processed_data: Dict, dae_type: str) -> Dict:
+    """Return the unified AED record of an inspection.
 
-def compare_rvd_images() -> Dict[str, Dict[str, str]]:
-    """Compare data from RVD and image analyses.
+    Data processed before AED records existed only hold the report of the
+    generation selected in the sidebar; their record is built from it.
+
+    Args:
+        processed_data: Processed inspection data.
+        dae_type: AED generation selected in the sidebar, used as fallback.
+
+    Returns:
+        The unified AED record, or an empty dict if no AED report was processed.
+    """
+    if processed_data.get('AED'):
+        return processed_data['AED']
+    legacy = processed_data.get(f'AEDG{dae_type[-1]}')
+    if not legacy:
+        return {}
+    from .extraction import build_aed_record
+    return build_aed_record(legacy, dae_type)
+
+def missing_comparison_inputs() -> List[str]:
+    """List the documents missing from the session for the comparisons.
+
+    Returns:
+        Human-readable descriptions of the missing documents.
+    """
+    missing = []
+    if not st.session_state.processed_data.get('RVD'):
+        missing.append("Données RVD manquantes pour la comparaison")
+    if not aed_record(st.session_state.processed_data, st.session_state.dae_type):
+        missing.append("Données AED manquantes pour la comparaison")
+    return missing
+
+def compare_rvd_aed_data(rvd: Dict, aed: Dict,
+                         memo: Optional[Dict] = None) -> Dict[str, Dict[str, str]]:
+    """Compare RVD and AED report data, reusing memoized results whose inputs are unchanged.
+
+    Args:
+        rvd: Data extracted from the RVD.
+        aed: Unified AED record (see extraction.build_aed_record).
+        memo: Memo of previous results, or None to compute everything.
 
     Returns:
         Comparison results.
     """
+    aed_label = f"AED{aed.get('generation', '')}"
     results = {}
-    if not st.session_state.processed_data.get('RVD'):
-        st.error("Données RVD manquantes pour la comparaison")
-        return results
+    results['serial'] = _field_comparison(
+        memo, 'rvd_vs_aed.serial', _serial_comparison,
+        rvd, 'Numéro de série DEFIBRILLATEUR', aed, aed_label, 'serial', 'aed'
+    )
+    results['report_date'] = _field_comparison(
+        memo, 'rvd_vs_aed.report_date', _date_comparison,
+        rvd, 'Date-Heure rapport vérification défibrillateur', aed, aed_label, 'report_date', 'aed'
+    )
+    results['battery_install_date'] = _field_comparison(
+        memo, 'rvd_vs_aed.battery_install_date', _date_comparison,
+        rvd, 'Date mise en service BATTERIE', aed, aed_label, 'battery_install_date', 'aed'
+    )
+    results['battery_level'] = _memoized(
+        memo, 'rvd_vs_aed.battery_level',
+        {
+            'RVD.Niveau de charge de la batterie en %': rvd.get('Niveau de charge de la batterie en %'),
+            f'{aed_label}.battery_capacity': aed.get('battery_capacity'),
+        },
+        lambda: _battery_level_comparison(rvd, aed)
+    )
+    return results
+
+def compare_rvd_aed() -> Dict[str, Dict[str, str]]:
+    """Compare data from RVD and AED reports.
 
-    rvd = st.session_state.processed_data['RVD']
-    images = st.session_state.processed_data['images']
+    Returns:
+        Comparison results.
+    """
+    if missing_comparison_inputs():
+        return {}
+    memo = st.session_state.setdefault('comparison_memo', {})
+    results = compare_rvd_aed_data(
+        st.session_state.processed_data['RVD'],
+        aed_record(st.session_state.processed_data, st.session_state.dae_type),
+        memo
+    )
+    st.session_state.processed_data['comparisons']['rvd_vs_aed'] = results
+    return results
 
+def _image_field_mapping(rvd: Dict) -> Dict[str, Dict[str, str]]:
+    """Map each image type to the RVD fields it is compared with."""
     field_mapping = {
         "batterie": {
             "serial": (
@@ -119,90 +212,106 @@ def compare_rvd_images() -> Dict[str, Dict[str, str]]:
             "serial": "N° série nouvelles électrodes pédiatriques",
             "date": "Date péremption des nouvelles éléctrodes pédiatriques"
         }
+    return field_mapping
+
+def compare_rvd_images_data(rvd: Dict, images: List[Dict],
+                            memo: Optional[Dict] = None) -> Dict[str, Dict[str, str]]:
+    """Compare RVD and image data, reusing memoized results whose inputs are unchanged.
+
+    Args:
+        rvd: Data extracted from the RVD.
+        images: Results of the image analyses.
+        memo: Memo of previous results, or None to compute everything.
+
+    Returns:
+        Comparison results.
+    """
+    results = {}
+    field_mapping = _image_field_mapping(rvd)
 
     battery_data = next((i for i in images if i['type'] == 'Batterie'), None)
     if battery_data:
-        results.update(_compare_battery(rvd, battery_data, field_mapping))
+        results.update(_compare_battery(rvd, battery_data, field_mapping, memo))
 
     electrode_data = next((i for i in images if i['type'] == 'Electrodes'), None)
     if electrode_data:
-        results.update(_compare_electrodes(rvd, electrode_data, field_mapping))
+        results.update(_compare_electrodes(rvd, electrode_data, field_mapping, memo))
 
     defibrillator_data = next((i for i in images if i['type'] == 'Defibrillateur G5'), None)
     if defibrillator_data:
-        results.update(_compare_defibrillator(rvd, defibrillator_data, field_mapping))
+        results.update(_compare_defibrillator(rvd, defibrillator_data, field_mapping, memo))
 
+    return results
+
+def compare_rvd_images() -> Dict[str, Dict[str, str]]:
+    """Compare data from RVD and image analyses.
+
+    Returns:
+        Comparison results.
+    """
+    if not st.session_state.processed_data.get('RVD'):
+        return {}
+    memo = st.session_state.setdefault('comparison_memo', {})
+    results = compare_rvd_images_data(
+        st.session_state.processed_data['RVD'],
+        st.session_state.processed_data['images'],
+        memo
+    )
     st.session_state.processed_data['comparisons']['rvd_vs_images'] = results
     return results
 
-def _compare_battery(rvd: Dict, battery_data: Dict, field_mapping: Dict) -> Dict[str, Dict[str, str]]:
+def _compare_battery(rvd: Dict, battery_data: Dict, field_mapping: Dict,
+                     memo: Optional[Dict] = None) -> Dict[str, Dict[str, str]]:
     """Helper function to compare battery data."""
-    results = {}
-    results['battery_serial'] = {
-        'rvd': rvd.get(field_mapping["batterie"]["serial"], 'N/A'),
-        'image': battery_data.get('serial', 'N/A'),
-        'match': normalize_serial(rvd.get(field_mapping["batterie"]["serial"], '')) ==
-                 normalize_serial(battery_data.get('serial', ''))
+    fields = field_mapping["batterie"]
+    return {
+        'battery_serial': _field_comparison(
+            memo, 'rvd_vs_images.battery_serial', _fuzzy_serial_comparison,
+            rvd, fields["serial"], battery_data, 'image.Batterie', 'serial', 'image'
+        ),
+        'battery_date': _field_comparison(
+            memo, 'rvd_vs_images.battery_date', _date_comparison,
+            rvd, fields["date"], battery_data, 'image.Batterie', 'date', 'image'
+        ),
     }
-    rvd_date, rvd_err = parse_date(rvd.get(field_mapping["batterie"]["date"], ''))
-    img_date, img_err = parse_date(battery_data.get('date', ''))
-    results['battery_date'] = {
-        'rvd': rvd.get(field_mapping["batterie"]["date"], 'N/A'),
-        'image': battery_data.get('date', 'N/A'),
-        'match': rvd_date == img_date if not (rvd_err or img_err) else False,
-        'errors': [e for e in [rvd_err, img_err] if e]
-    }
-    return results
 
-def _compare_electrodes(rvd: Dict, electrode_data: Dict, field_mapping: Dict) -> Dict[str, Dict[str, str]]:
+def _compare_electrodes(rvd: Dict, electrode_data: Dict, field_mapping: Dict,
+                        memo: Optional[Dict] = None) -> Dict[str, Dict[str, str]]:
     """Helper function to compare electrode data."""
-    results = {}
-    results['electrode_serial'] = {
-        'rvd': rvd.get(field_mapping["electrodes_adultes"]["serial"], 'N/A'),
-        'image': electrode_data.get('serial', 'N/A'),
-        'match': normalize_serial(rvd.get(field_mapping["electrodes_adultes"]["serial"], '')) ==
-                 normalize_serial(electrode_data.get('serial', ''))
-    }
-    rvd_date, rvd_err = parse_date(rvd.get(field_mapping["electrodes_adultes"]["date"], ''))
-    img_date, img_err = parse_date(electrode_data.get('date', ''))
-    results['electrode_date'] = {
-        'rvd': rvd.get(field_mapping["electrodes_adultes"]["date"], 'N/A'),
-        'image': electrode_data.get('date', 'N/A'),
-        'match': rvd_date == img_date if not (rvd_err or img_err) else False,
-        'errors': [e for e in [rvd_err, img_err] if e]
+    fields = field_mapping["electrodes_adultes"]
+    results = {
+        'electrode_serial': _field_comparison(
+            memo, 'rvd_vs_images.electrode_serial', _fuzzy_serial_comparison,
+            rvd, fields["serial"], electrode_data, 'image.Electrodes', 'serial', 'image'
+        ),
+        'electrode_date': _field_comparison(
+            memo, 'rvd_vs_images.electrode_date', _date_comparison,
+            rvd, fields["date"], electrode_data, 'image.Electrodes', 'date', 'image'
+        ),
     }
     if rvd.get("Changement électrodes pédiatriques") == "Oui":
-        results['pediatric_electrode_serial'] = {
-            'rvd': rvd.get(field_mapping["electrodes_pediatriques"]["serial"], 'N/A'),
-            'image': electrode_data.get('serial', 'N/A'),
-            'match': normalize_serial(rvd.get(field_mapping["electrodes_pediatriques"]["serial"], '')) ==
-                     normalize_serial(electrode_data.get('serial', ''))
-        }
-        rvd_ped_date, rvd_ped_err = parse_date(rvd.get(field_mapping["electrodes_pediatriques"]["date"], ''))
-        img_ped_date, img_ped_err = parse_date(electrode_data.get('date', ''))
-        results['pediatric_electrode_date'] = {
-            'rvd': rvd.get(field_mapping["electrodes_pediatriques"]["date"], 'N/A'),
-            'image': electrode_data.get('date', 'N/A'),
-            'match': rvd_ped_date == img_ped_date if not (rvd_ped_err or img_ped_err) else False,
-            'errors': [e for e in [rvd_ped_err, img_ped_err] if e]
-        }
+        pediatric_fields = field_mapping["electrodes_pediatriques"]
+        results['pediatric_electrode_serial'] = _field_comparison(
+            memo, 'rvd_vs_images.pediatric_electrode_serial', _fuzzy_serial_comparison,
+            rvd, pediatric_fields["serial"], electrode_data, 'image.Electrodes', 'serial', 'image'
+        )
+        results['pediatric_electrode_date'] = _field_comparison(
+            memo, 'rvd_vs_images.pediatric_electrode_date', _date_comparison,
+            rvd, pediatric_fields["date"], electrode_data, 'image.Electrodes', 'date', 'image'
+        )
     return results
 
-def _compare_defibrillator(rvd: Dict, defibrillator_data: Dict, field_mapping: Dict) -> Dict[str, Dict[str, str]]:
+def _compare_defibrillator(rvd: Dict, defibrillator_data: Dict, field_mapping: Dict,
+                           memo: Optional[Dict] = None) -> Dict[str, Dict[str, str]]:
     """Helper function to compare defibrillator data."""
-    results = {}
-    results['defibrillator_serial'] = {
-        'rvd': rvd.get(field_mapping["defibrillateur"]["serial"], 'N/A'),
-        'image': defibrillator_data.get('serial', 'N/A'),
-        'match': normalize_serial(rvd.get(field_mapping["defibrillateur"]["serial"], '')) ==
-                 normalize_serial(defibrillator_data.get('serial', ''))
-    }
-    rvd_date, rvd_err = parse_date(rvd.get(field_mapping["defibrillateur"]["date"], ''))
-    img_date, img_err = parse_date(defibrillator_data.get('date', ''))
-    results['defibrillator_date'] = {
-        'rvd': rvd.get(field_mapping["defibrillateur"]["date"], 'N/A'),
-        'image': defibrillator_data.get('date', 'N/A'),
-        'match': rvd_date == img_date if not (rvd_err or img_err) else False,
-        'errors': [e for e in [rvd_err, img_err] if e]
+    fields = field_mapping["defibrillateur"]
+    return {
+        'defibrillator_serial': _field_comparison(
+            memo, 'rvd_vs_images.defibrillator_serial', _fuzzy_serial_comparison,
+            rvd, fields["serial"], defibrillator_data, 'image.Defibrillateur G5', 'serial', 'image'
+        ),
+        'defibrillator_date': _field_comparison(
+            memo, 'rvd_vs_images.defibrillator_date', _date_comparison,
+            rvd, fields["date"], defibrillator_data, 'image.Defibrillateur G5', 'date', 'image'
+        ),
     }
-    return results 
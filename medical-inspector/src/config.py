@@ -1,5 +1,7 @@
 """Configuration settings for the Comparateur_PDF project."""
 
+import os
+
 API_URL = "https://detect.roboflow.com"
 MODEL_ID = "medical-object-classifier/3"
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
@@ -70,3 +72,134 @@ CSS_STYLE = """
         }
     </style>
 """
+
+HISTORY_DB_PATH = "inspection_history.sqlite3"
+HISTORY_QUERY_LIMIT = 500
+
+# Local pre-classification (skips the remote classifier when confident)
+PREFILTER_MIN_CONFIDENCE = 0.9
+PREFILTER_AUDIT_RATE = 0.1
+PREFILTER_THUMBNAIL_SIZE = 800
+PREFILTER_REFERENCE_DIR = "reference_photos"
+PREFILTER_PHASH_MAX_DISTANCE = 6
+PREFILTER_FILENAME_RULES = [
+    (r"electrode", "Electrodes"),
+    (r"batter", "Batterie"),
+    (r"(?:defib|dae|aed)[^/\\]*g5|g5[^/\\]*(?:defib|dae|aed)", "Defibrillateur G5"),
+    (r"(?:defib|dae|aed)[^/\\]*g3|g3[^/\\]*(?:defib|dae|aed)", "Defibrillateur G3"),
+]
+
+# Two-tier OCR: fast restricted pass first, full pass only when extraction fails
+OCR_TIERED = True
+OCR_FAST_MAX_SIDE = 1024
+OCR_FAST_CANVAS_SIZE = 1280
+OCR_FAST_ALLOWLIST = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-"
+OCR_FAST_MIN_CONFIDENCE = 0.4
+
+# CPU inference tuning for the EasyOCR reader
+OCR_CPU_OPTIMIZED = True
+OCR_INTRA_OP_THREADS = None  # None: all available cores
+OCR_INTER_OP_THREADS = 1
+
+# OCR worker pool (fewer than 2 workers: OCR runs in the app process).
+# One pool serves every session of the server, so its size is fixed here.
+OCR_POOL_WORKERS = int(os.environ.get("OCR_POOL_WORKERS", 0))
+OCR_POOL_THREADS_PER_WORKER = None  # None: cores divided by workers
+
+# Near-duplicate photo grouping (bursts of the same label)
+DEDUP_HASH_SIZE = 16
+DEDUP_MAX_DISTANCE = 12
+# Longest gap between two shots of a burst: an upload may hold several sites,
+# whose identical-looking labels must not be grouped
+DEDUP_BURST_S = 30.0
+
+# HTTP inspection service
+SERVICE_HOST = "0.0.0.0"
+SERVICE_PORT = 8080
+SERVICE_MAX_CONCURRENT = 4
+SERVICE_MAX_PENDING = 16
+SERVICE_WORKERS = 4
+SERVICE_MAX_UPLOAD_MB = 200
+
+# Remote inference mode: "live", "record" (live + cassette) or "replay" (cassette only)
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "live")
+CASSETTE_PATH = os.environ.get("INFERENCE_CASSETTE", "cassettes/inference.jsonl")
+REPLAY_LATENCY = "recorded"  # "recorded", "none" or seconds
+REPLAY_ERROR_RATE = 0.0
+
+# Content-based splitting of merged PDF reports (lower-case page markers)
+PDF_PAGE_MARKERS = {
+    'RVD': ["rapport de vérification", "code site", "numéro de série defibrillateur",
+            "date-heure rapport vérification"],
+    'AEDG5': ["rapport dae", "n° série dae", "date d'installation"],
+    'AEDG3': ["série dsa", "dernier échec de dsa", "capacité restante de la batterie 12v"],
+}
+# Title of the first page of each report, matched against the first non-empty
+# line of a page (lower-case): a page opening with it starts a new report.
+# Field labels reusing these words ("Rapport DAE - Erreurs en cours") do not match.
+PDF_REPORT_HEADERS = {
+    'RVD': r"rapport de vérification\b",
+    'AEDG5': r"rapport dae\s*$",
+    'AEDG3': r"série dsa\b",
+}
+PDF_PARALLEL_MIN_PAGES = 8
+PDF_WORKERS = None  # None: one process per core
+
+# Columnar export
+EXPORT_PARQUET_DIR = "exports/parquet"
+
+# Watch-folder ingestion
+INGEST_DEBOUNCE_S = 10.0  # Quiet time before a folder is processed
+INGEST_OUTPUT_DIR = "_resultats"
+INGEST_STATE_FILE = ".inspection_state.json"
+
+# OCR-tolerant serial matching
+SERIAL_CONFUSIONS = ("O0DQ", "I1L", "S5", "B8", "Z2", "G6")  # Characters OCR mistakes for one another
+SERIAL_CONFUSION_COST = 0.25  # Edit cost of a confusable substitution (other edits cost 1)
+SERIAL_MATCH_MAX_DISTANCE = 0.5  # Image serial still matching the RVD: two confusions, no real edit
+SERIAL_SUGGESTION_MAX_DISTANCE = 1.5  # One real edit plus two confusions
+SERIAL_INDEX_MAX_EDITS = 1  # Real edits searched by the fleet serial index
+
+# Pipelined stage scheduler
+SCHEDULER_QUEUE_SIZE = 8  # Items waiting between two stages
+SCHEDULER_POLL_S = 0.1  # How often blocked workers check whether the pipeline was stopped
+SCHEDULER_DECODE_WORKERS = 4
+SCHEDULER_CLASSIFY_WORKERS = 4  # Concurrent remote classification calls
+
+# Shared image pixels
+SCRATCH_POOL_MAX_BUFFERS = 16  # Free scratch buffers kept for reuse
+SCRATCH_POOL_MAX_BYTES = 192 * 1024 * 1024  # Total size of the free scratch buffers kept
+SCRATCH_POOL_MAX_BUFFER_BYTES = 64 * 1024 * 1024  # Larger buffers are freed, not kept
+TRACE_MEMORY = False  # Trace peak memory of image batches with tracemalloc (slows allocations)
+
+# Checkpoint journal of batch runs
+CHECKPOINT_DIR = "checkpoints"
+
+# Load test harness
+LOADTEST_SESSIONS = [1, 2, 4, 8]  # Concurrent sessions tried, in increasing order
+LOADTEST_STUB_LATENCY = 0.2  # Simulated inference and OCR latency (s)
+LOADTEST_SLO_S = 30.0  # Upload p95 latency objective (s)
+LOADTEST_TIMEOUT_S = 600  # Longest script run of a session (s)
+LOADTEST_HISTORY = "loadtest_history.jsonl"
+
+# Lazy view rendering
+GALLERY_THUMBNAIL_SIDE = 480  # Longest side of the gallery thumbnails (px)
+
+# Disk spool of uploaded originals
+SPOOL_DIR = None  # Folder holding the session spools (None: system temp folder)
+SPOOL_PREFIX = "comparateur-spool-"
+SPOOL_CHUNK_SIZE = 1 << 20  # Bytes copied at a time when spooling an upload
+SPOOL_MAX_AGE_S = 24 * 3600  # Age from which a spool whose owner process is unknown is purged
+
+# Time budget of interactive inspections
+INSPECTION_TIME_BUDGET_S = 60  # Default budget of an upload in the app (0: no limit)
+BUDGET_EWMA_ALPHA = 0.3  # Weight of the latest measure in the cost model
+BUDGET_PRIOR_COSTS = {  # Seconds per megapixel of each step tier before any measure
+    'classify:full': 0.1,
+    'ocr:full': 2.0,
+    'ocr:roi': 0.6,
+    'ocr:fast': 0.1,
+    'barcode:full': 0.05,
+}
+BUDGET_ROI_MARGIN = 0.1  # Margin around the text found by the fast pass, as a share of the image side
+BUDGET_POLL_INTERVAL_S = 2  # How often the app checks for completed provisional results
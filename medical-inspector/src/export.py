@@ -0,0 +1,236 @@
+"""Columnar Parquet export of inspections for the Comparateur_PDF project.
+
+Each inspection is written as four typed tables: RVD fields, the AED
+record, image extractions and per-field comparison outcomes. A dataset is a
+folder holding one sub-folder per table; every export appends a new part
+file, so a batch run or a whole fleet is read back in one call:
+
+    pyarrow.parquet.read_table("exports/parquet/comparisons")
+"""
+
+import io
+import os
+import re
+import uuid
+import zipfile
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .config import EXPORT_PARQUET_DIR
+from .utils import normalize_serial, parse_date
+
+# Typed RVD columns: column name -> (RVD field, type)
+RVD_COLUMNS = {
+    'code_site': ("Code site", 'string'),
+    'report_date': ("Date-Heure rapport vérification défibrillateur", 'date'),
+    'defibrillator_serial': ("Numéro de série DEFIBRILLATEUR", 'string'),
+    'defibrillator_manufactured': ("Date fabrication DEFIBRILLATEUR", 'date'),
+    'battery_serial': ("Numéro de série Batterie", 'string'),
+    'battery_manufactured': ("Date fabrication BATTERIE", 'date'),
+    'battery_in_service': ("Date mise en service BATTERIE", 'date'),
+    'battery_level': ("Niveau de charge de la batterie en %", 'float'),
+    'battery_replaced': ("Changement batterie", 'bool'),
+    'new_battery_serial': ("N° série nouvelle batterie", 'string'),
+    'electrode_serial': ("Numéro de série ELECTRODES ADULTES", 'string'),
+    'electrode_expiry': ("Date de péremption ELECTRODES ADULTES", 'date'),
+    'electrodes_replaced': ("Changement électrodes adultes", 'bool'),
+    'new_electrode_serial': ("N° série nouvelles électrodes", 'string'),
+    'new_electrode_expiry': ("Date péremption des nouvelles éléctrodes", 'date'),
+}
+
+_ARROW_TYPES = {'string': pa.string(), 'date': pa.date32(), 'float': pa.float64(), 'bool': pa.bool_()}
+
+_KEY_FIELDS = [
+    pa.field('inspection_uid', pa.string()),
+    pa.field('exported_at', pa.timestamp('s')),
+    pa.field('code_site', pa.string()),
+]
+
+SCHEMAS = {
+    'rvd': pa.schema(
+        _KEY_FIELDS
+        + [pa.field(name, _ARROW_TYPES[kind]) for name, (_, kind) in RVD_COLUMNS.items() if name != 'code_site']
+        + [pa.field('fields', pa.map_(pa.string(), pa.string()))]
+    ),
+    'aed': pa.schema(_KEY_FIELDS + [
+        pa.field('generation', pa.string()),
+        pa.field('serial', pa.string()),
+        pa.field('serial_norm', pa.string()),
+        pa.field('report_date', pa.date32()),
+        pa.field('battery_install_date', pa.date32()),
+        pa.field('battery_capacity', pa.float64()),
+        pa.field('fields', pa.map_(pa.string(), pa.string())),
+    ]),
+    'images': pa.schema(_KEY_FIELDS + [
+        pa.field('filename', pa.string()),
+        pa.field('type', pa.string()),
+        pa.field('serial', pa.string()),
+        pa.field('serial_norm', pa.string()),
+        pa.field('date', pa.date32()),
+        pa.field('date_text', pa.string()),
+        pa.field('duplicates', pa.list_(pa.string())),
+    ]),
+    'comparisons': pa.schema(_KEY_FIELDS + [
+        pa.field('comparison', pa.string()),
+        pa.field('field', pa.string()),
+        pa.field('rvd_value', pa.string()),
+        pa.field('other_value', pa.string()),
+        pa.field('match', pa.bool_()),
+        pa.field('error', pa.string()),
+    ]),
+}
+
+def _text(value) -> Optional[str]:
+    """Return a value as text, None for missing values."""
+    if value is None or value in ('', 'N/A', 'Non trouvé'):
+        return None
+    return str(value)
+
+def _date(value) -> Optional[date]:
+    """Parse a date value, None if it cannot be parsed."""
+    if not _text(value):
+        return None
+    parsed, error = parse_date(value)
+    return None if error else parsed
+
+def _float(value) -> Optional[float]:
+    """Parse the first number of a value, None if there is none."""
+    match = re.search(r'-?\d+(?:[.,]\d+)?', _text(value) or '')
+    return float(match.group().replace(',', '.')) if match else None
+
+def _bool(value) -> Optional[bool]:
+    """Parse an Oui/Non answer, None otherwise."""
+    answer = (_text(value) or '').strip().lower()
+    return {'oui': True, 'non': False}.get(answer)
+
+_CONVERTERS: Dict[str, Callable] = {'string': _text, 'date': _date, 'float': _float, 'bool': _bool}
+
+def _raw_fields(data: Dict) -> List[tuple]:
+    """Return the raw report fields as map entries."""
+    return [(str(k), _text(v)) for k, v in data.items()]
+
+def build_tables(processed_data: Dict, inspection_uid: str, dae_type: str = 'G5',
+                 exported_at: Optional[datetime] = None) -> Dict[str, pa.Table]:
+    """Convert one inspection into typed Arrow tables.
+
+    Args:
+        processed_data: Processed inspection data.
+        inspection_uid: Identifier of the inspection, repeated on every row.
+        dae_type: AED generation selected for data without an AED record.
+        exported_at: Export time (defaults to now).
+
+    Returns:
+        The 'rvd', 'aed', 'images' and 'comparisons' tables.
+    """
+    from .comparison import aed_record
+    rvd = processed_data.get('RVD') or {}
+    aed = aed_record(processed_data, dae_type)
+    key = {
+        'inspection_uid': inspection_uid,
+        'exported_at': (exported_at or datetime.now()).replace(microsecond=0),
+        'code_site': _text(rvd.get('Code site')),
+    }
+
+    rows = {name: [] for name in SCHEMAS}
+    if rvd:
+        row = dict(key)
+        for name, (field, kind) in RVD_COLUMNS.items():
+            if name != 'code_site':
+                row[name] = _CONVERTERS[kind](rvd.get(field))
+        row['fields'] = _raw_fields(rvd)
+        rows['rvd'].append(row)
+    if aed:
+        rows['aed'].append({
+            **key,
+            'generation': aed.get('generation'),
+            'serial': _text(aed.get('serial')),
+            'serial_norm': aed.get('serial_norm') or None,
+            'report_date': _date(aed.get('report_date')),
+            'battery_install_date': _date(aed.get('battery_install_date')),
+            'battery_capacity': aed.get('battery_capacity'),
+            'fields': _raw_fields(aed.get('raw', {})),
+        })
+    for img in processed_data.get('images', []):
+        serial = _text(img.get('serial'))
+        rows['images'].append({
+            **key,
+            'filename': img.get('filename'),
+            'type': img.get('type'),
+            'serial': serial,
+            'serial_norm': normalize_serial(serial) if serial else None,
+            'date': _date(img.get('date')),
+            'date_text': _text(img.get('date')),
+            'duplicates': img.get('duplicates', []),
+        })
+    for comparison, results in (processed_data.get('comparisons') or {}).items():
+        for field, result in results.items():
+            other = next((result[side] for side in ('aed', 'image') if side in result), None)
+            errors = result.get('errors') or ([result['error']] if result.get('error') else [])
+            rows['comparisons'].append({
+                **key,
+                'comparison': comparison,
+                'field': field,
+                'rvd_value': _text(result.get('rvd')),
+                'other_value': _text(other),
+                'match': bool(result.get('match', False)),
+                'error': "; ".join(errors) or None,
+            })
+    return {name: pa.Table.from_pylist(rows[name], schema=schema) for name, schema in SCHEMAS.items()}
+
+def append_parquet(tables: Dict[str, pa.Table], dataset_dir: str = EXPORT_PARQUET_DIR) -> List[str]:
+    """Append tables to a Parquet dataset, one new part file per table.
+
+    Args:
+        tables: Tables returned by build_tables.
+        dataset_dir: Dataset folder, holding one sub-folder per table.
+
+    Returns:
+        Paths of the part files written.
+    """
+    part = f"part-{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+    paths = []
+    for name, table in tables.items():
+        if table.num_rows == 0:
+            continue
+        table_dir = os.path.join(dataset_dir, name)
+        os.makedirs(table_dir, exist_ok=True)
+        path = os.path.join(table_dir, part)
+        pq.write_table(table, path, compression='zstd')
+        paths.append(path)
+    return paths
+
+def write_parquet_tables(tables: Dict[str, pa.Table], output_dir: str) -> List[str]:
+    """Write tables as one Parquet file each, replacing previous files.
+
+    Args:
+        tables: Tables returned by build_tables.
+        output_dir: Folder receiving <table>.parquet files.
+
+    Returns:
+        Paths of the files written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for name, table in tables.items():
+        path = os.path.join(output_dir, f"{name}.parquet")
+        pq.write_table(table, path, compression='zstd')
+        paths.append(path)
+    return paths
+
+def parquet_archive(tables: Dict[str, pa.Table]) -> bytes:
+    """Package tables as a zip archive of Parquet files, one per table.
+
+    Args:
+        tables: Tables returned by build_tables.
+
+    Returns:
+        Content of the zip archive.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zipf:
+        for name, table in tables.items():
+            sink = io.BytesIO()
+            pq.write_table(table, sink, compression='zstd')
+            zipf.writestr(f"{name}.parquet", sink.getvalue())
+    return buffer.getvalue()
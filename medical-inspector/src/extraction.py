@@ -1,49 +1,27 @@
 """Data extraction functions for the Comparateur_PDF project."""
 
 import re
-from typing import Dict, List, Tuple, Optional
-from PIL import Image, ImageEnhance, ImageFilter
+from typing import Callable, Dict, List, Tuple, Optional
 from pyzbar.pyzbar import decode
 import streamlit as st
+from .config import PDF_PAGE_MARKERS
+from .pixels import ImageLike, as_pixels, enhanced_for_barcode
+from .records import AedRecord, RvdFields
+from .utils import normalize_serial, parse_date
 
-def extract_rvd_data(text: str) -> Dict[str, str]:
+def extract_rvd_data(text: str) -> RvdFields:
     """Extract relevant data from the RVD text.
 
     Args:
         text: Text extracted from the RVD PDF.
 
     Returns:
-        Extracted data with keywords as keys.
+        Extracted data with the report labels (see records.RvdFields) as keys.
     """
-    keywords = [
-        "Commentaire fin d'intervention et recommandations",
-        "Numéro de série DEFIBRILLATEUR",
-        "Date-Heure rapport vérification défibrillateur",
-        "Changement batterie",
-        "Changement électrodes adultes",
-        "Code site",
-        "Numéro de série Batterie",
-        "Date mise en service BATTERIE",
-        "Niveau de charge de la batterie en %",
-        "N° série nouvelle batterie",
-        "Date mise en service",
-        "Niveau de charge nouvelle batterie",
-        "Numéro de série ELECTRODES ADULTES",
-        "Numéro de série ELECTRODES ADULTES relevé",
-        "Numéro de série relevé 2",
-        "Date fabrication DEFIBRILLATEUR",
-        "Date fabrication BATTERIE",
-        "Date fabrication relevée",
-        "Date fabrication nouvelle batterie",
-        "Date de péremption ELECTRODES ADULTES",
-        "Date de péremption ELECTRODES ADULTES relevée",
-        "N° série nouvelles électrodes",
-        "Date péremption des nouvelles éléctrodes",
-    ]
-    results = {}
+    results = RvdFields()
     lines = text.splitlines()
 
-    for keyword in keywords:
+    for keyword in RvdFields.KEYS:
         value = "Non trouvé"
         if any(x in keyword.lower() for x in ["n° série", "numéro de série"]):
             pattern = re.compile(re.escape(keyword) + r"[\s:]*([A-Za-z0-9\-]+)(?=\s|$)", re.IGNORECASE)
@@ -146,6 +124,86 @@ def extract_aed_g3_data(text: str) -> Dict[str, str]:
                 results[keyword] = value
     return results
 
+# Report fields feeding each entry of the unified AED record, per generation
+AED_RECORD_FIELDS = {
+    'G5': {
+        'serial': "N° série DAE",
+        'report_date': "Date / Heure:",
+        'battery_install_date': "Date d'installation :",
+        'battery_capacity': "Capacité restante de la batterie",
+    },
+    'G3': {
+        'serial': "Série DSA",
+        'report_date': "Date de mise en service",
+        'battery_install_date': "Date de mise en service batterie",
+        'battery_capacity': "Capacité restante de la batterie 12V",
+    },
+}
+
+def detect_aed_generation(text: str) -> Optional[str]:
+    """Detect the generation of an AED report from its text.
+
+    Args:
+        text: Text extracted from the AED PDF.
+
+    Returns:
+        "G5" or "G3", or None if the markers are missing or ambiguous.
+    """
+    lowered = text.lower()
+    scores = {
+        generation: sum(marker in lowered for marker in PDF_PAGE_MARKERS[f'AED{generation}'])
+        for generation in ('G5', 'G3')
+    }
+    if scores['G5'] == scores['G3']:
+        return None
+    return max(scores, key=scores.get)
+
+def _normalized_date(value: Optional[str]) -> Optional[str]:
+    """Return a report date in ISO format, or as written if it cannot be parsed."""
+    if not value:
+        return None
+    parsed, error = parse_date(value)
+    return value if error else parsed.isoformat()
+
+def build_aed_record(raw: Dict[str, str], generation: str) -> AedRecord:
+    """Build the generation-independent record of a parsed AED report.
+
+    Args:
+        raw: Data returned by extract_aed_g5_data or extract_aed_g3_data.
+        generation: AED generation of the report ("G5" or "G3").
+
+    Returns:
+        Record with the generation, serial, normalized serial, ISO dates,
+        remaining battery capacity in percent and the raw report data.
+    """
+    fields = AED_RECORD_FIELDS[generation]
+    serial = raw.get(fields['serial'], '')
+    capacity = re.search(r'\d+(?:[.,]\d+)?', raw.get(fields['battery_capacity'], ''))
+    return AedRecord(
+        generation=generation,
+        serial=serial,
+        serial_norm=normalize_serial(serial),
+        report_date=_normalized_date(raw.get(fields['report_date'])),
+        battery_install_date=_normalized_date(raw.get(fields['battery_install_date'])),
+        battery_capacity=float(capacity.group().replace(',', '.')) if capacity else None,
+        raw=raw,
+    )
+
+def parse_aed_report(text: str, generation: Optional[str] = None, default_generation: str = 'G5') -> AedRecord:
+    """Parse an AED report once into its unified record.
+
+    Args:
+        text: Text extracted from the AED PDF.
+        generation: Known generation, detected from the text when None.
+        default_generation: Generation used when detection is inconclusive.
+
+    Returns:
+        The unified AED record (see build_aed_record).
+    """
+    generation = generation or detect_aed_generation(text) or default_generation
+    raw = extract_aed_g5_data(text) if generation == 'G5' else extract_aed_g3_data(text)
+    return build_aed_record(raw, generation)
+
 def extract_important_info_g3(results: List[Tuple]) -> Tuple[Optional[str], Optional[str]]:
     """Extract important information from OCR results for G3 devices.
 
@@ -229,38 +287,43 @@ def extract_important_info_batterie(results: List[Tuple]) -> Tuple[Optional[str]
             date_of_fabrication = re.search(date_pattern, text).group(0)
     return serial_number, date_of_fabrication
 
-def extract_important_info_electrodes(image: Image.Image) -> Tuple[Optional[str], Optional[str]]:
+def extract_important_info_electrodes(image: ImageLike,
+                                      on_message: Optional[Callable[[str, str], None]] = None
+                                      ) -> Tuple[Optional[str], Optional[str]]:
     """Extract important information from electrode images.
 
+    The label region is cropped from the shared grey levels as a view, and
+    enhanced in pooled scratch buffers.
+
     Args:
         image: The image of the electrodes.
+        on_message: Called with a level ('warning' or 'error') and a message;
+            messages are shown on the page when not given.
 
     Returns:
         Serial number and expiration date.
     """
+    on_message = on_message or (lambda level, message: getattr(st, level)(message))
     try:
-        width, height = image.size
+        pixels = as_pixels(image)
+        width, height = pixels.size
         crop_box = (width * 0.2, height * 0.10, width * 1, height * 1)
-        cropped_image = image.crop(crop_box)
-
-        enhancer = ImageEnhance.Contrast(cropped_image)
-        enhanced_image = enhancer.enhance(2.5)
-        enhanced_image = enhanced_image.filter(ImageFilter.SHARPEN)
-
-        barcodes = decode(enhanced_image)
+        with enhanced_for_barcode(pixels.crop(crop_box, gray=True), contrast=2.5) as enhanced_image:
+            barcodes = decode(enhanced_image)
         if barcodes:
             if len(barcodes) >= 2:
                 return (
                     barcodes[0].data.decode('utf-8'),
                     barcodes[1].data.decode('utf-8')
                 )
-            st.warning(
+            on_message(
+                'warning',
                 f"Nombre inattendu de codes-barres trouvés : {len(barcodes)}. "
                 "Attendait au moins 2."
             )
             return None, None
-        st.warning("Aucun code-barres détecté dans l'image des électrodes.")
+        on_message('warning', "Aucun code-barres détecté dans l'image des électrodes.")
         return None, None
     except ValueError as e:
-        st.error(f"Erreur de valeur lors du traitement de l'image : {e}")
+        on_message('error', f"Erreur de valeur lors du traitement de l'image : {e}")
         return None, None
@@ -0,0 +1,332 @@
+"""Persistent inspection history for the Comparateur_PDF project."""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+import streamlit as st
+from .config import HISTORY_DB_PATH, HISTORY_QUERY_LIMIT
+from .records import json_default
+from .serial_match import SerialIndex
+from .utils import parse_date, normalize_serial, strip_images
+
+MISSING_VALUE = "Non trouvé"
+
+# RVD fields holding a serial number, mapped to the component they identify.
+RVD_SERIAL_FIELDS = {
+    "Numéro de série DEFIBRILLATEUR": "defibrillateur",
+    "Numéro de série Batterie": "batterie",
+    "N° série nouvelle batterie": "batterie",
+    "Numéro de série ELECTRODES ADULTES": "electrodes",
+    "Numéro de série ELECTRODES ADULTES relevé": "electrodes",
+    "Numéro de série relevé 2": "releve",
+    "N° série nouvelles électrodes": "electrodes",
+}
+
+# RVD fields holding an expiry date, mapped to the component they concern.
+RVD_EXPIRY_FIELDS = {
+    "Date de péremption ELECTRODES ADULTES": "electrodes",
+    "Date de péremption ELECTRODES ADULTES relevée": "electrodes",
+    "Date péremption des nouvelles éléctrodes": "electrodes",
+}
+
+AED_SERIAL_FIELDS = ("N° série DAE", "Série DSA")
+
+# RVD field dating the inspection
+RVD_REPORT_DATE_FIELD = "Date-Heure rapport vérification défibrillateur"
+
+# Image types, by the word they contain, mapped to the component they show.
+IMAGE_COMPONENTS = (
+    ("Defibrillateur", "defibrillateur"),
+    ("Batterie", "batterie"),
+    ("Electrodes", "electrodes"),
+)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS inspections (
+        id INTEGER PRIMARY KEY,
+        uid TEXT NOT NULL UNIQUE,
+        created_at TEXT NOT NULL,
+        report_date TEXT,
+        code_site TEXT,
+        dae_type TEXT,
+        payload TEXT NOT NULL,
+        payload_hash TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS serials (
+        inspection_id INTEGER NOT NULL REFERENCES inspections(id) ON DELETE CASCADE,
+        component TEXT NOT NULL,
+        source TEXT NOT NULL,
+        serial TEXT NOT NULL,
+        serial_norm TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS expiries (
+        inspection_id INTEGER NOT NULL REFERENCES inspections(id) ON DELETE CASCADE,
+        component TEXT NOT NULL,
+        source TEXT NOT NULL,
+        expiry_date TEXT NOT NULL,
+        latest INTEGER NOT NULL DEFAULT 1
+    );
+    CREATE INDEX IF NOT EXISTS idx_inspections_site ON inspections(code_site, report_date, id);
+    CREATE INDEX IF NOT EXISTS idx_serials_norm ON serials(serial_norm, inspection_id);
+    CREATE INDEX IF NOT EXISTS idx_serials_inspection ON serials(inspection_id);
+    CREATE INDEX IF NOT EXISTS idx_expiries_date ON expiries(component, latest, expiry_date);
+    CREATE INDEX IF NOT EXISTS idx_expiries_inspection ON expiries(inspection_id);
+"""
+
+# Order of the inspections of a site, most recent RVD report first
+_MOST_RECENT = "report_date IS NULL, report_date DESC, id DESC"
+
+def _is_present(value) -> bool:
+    """Return True if an extracted value carries actual data."""
+    return bool(value) and value not in (MISSING_VALUE, 'N/A')
+
+def image_component(image_type: str) -> str:
+    """Return the component shown by an image type, named as in RVD_SERIAL_FIELDS."""
+    for word, component in IMAGE_COMPONENTS:
+        if word in image_type:
+            return component
+    return image_type.lower()
+
+def report_date(processed_data: Dict) -> Optional[date]:
+    """Return the date of the RVD report of an inspection, if it can be parsed."""
+    value = (processed_data.get('RVD') or {}).get(RVD_REPORT_DATE_FIELD)
+    if not _is_present(value):
+        return None
+    parsed, err = parse_date(value)
+    return None if err else parsed
+
+def collect_serials(processed_data: Dict) -> List[Tuple[str, str, str]]:
+    """Collect every serial number found in an inspection.
+
+    Args:
+        processed_data: Processed inspection data.
+
+    Returns:
+        List of (component, source, serial) tuples.
+    """
+    serials = []
+    rvd = processed_data.get('RVD') or {}
+    for field, component in RVD_SERIAL_FIELDS.items():
+        if _is_present(rvd.get(field)):
+            serials.append((component, 'RVD', rvd[field]))
+    for aed_key in ('AEDG5', 'AEDG3'):
+        aed = processed_data.get(aed_key) or {}
+        for field in AED_SERIAL_FIELDS:
+            if _is_present(aed.get(field)):
+                serials.append(('defibrillateur', aed_key, aed[field]))
+    for img in processed_data.get('images', []):
+        if _is_present(img.get('serial')):
+            serials.append((image_component(img.get('type', '')), 'image', img['serial']))
+    return serials
+
+def collect_expiries(processed_data: Dict) -> List[Tuple[str, str, date]]:
+    """Collect every parseable expiry date found in an inspection.
+
+    Args:
+        processed_data: Processed inspection data.
+
+    Returns:
+        List of (component, source, expiry date) tuples.
+    """
+    expiries = []
+    rvd = processed_data.get('RVD') or {}
+    for field, component in RVD_EXPIRY_FIELDS.items():
+        if _is_present(rvd.get(field)):
+            parsed, err = parse_date(rvd[field])
+            if not err:
+                expiries.append((component, 'RVD', parsed))
+    for img in processed_data.get('images', []):
+        if image_component(img.get('type', '')) == 'electrodes' and _is_present(img.get('date')):
+            parsed, err = parse_date(img['date'])
+            if not err:
+                expiries.append(('electrodes', 'image', parsed))
+    return expiries
+
+class InspectionHistory:
+    """SQLite-backed store of processed inspections.
+
+    Serials are stored normalized and indexed, as are site codes and expiry
+    dates, so fleet lookups stay index-bound regardless of history size.
+    """
+
+    def __init__(self, path: str = HISTORY_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._serial_index: Optional[SerialIndex] = None
+
+    def _mark_latest(self, code_site: str) -> None:
+        """Flag the expiries of the latest inspection of a site as its current ones.
+
+        The latest inspection is the one with the most recent RVD report
+        date, whatever the order inspections were saved in; inspections
+        without a report date come after dated ones, the last saved first.
+        """
+        self._conn.execute(
+            "UPDATE expiries SET latest = (inspection_id = ("
+            f"SELECT id FROM inspections WHERE code_site = ? ORDER BY {_MOST_RECENT} LIMIT 1"
+            ")) WHERE inspection_id IN (SELECT id FROM inspections WHERE code_site = ?)",
+            (code_site, code_site)
+        )
+
+    def save_inspection(self, uid: str, processed_data: Dict, dae_type: str) -> Optional[int]:
+        """Insert or replace an inspection and its indexed serials and expiries.
+
+        Args:
+            uid: Stable identifier of the inspection.
+            processed_data: Processed inspection data.
+            dae_type: AED generation selected for the inspection.
+
+        Returns:
+            Row id of the stored inspection, or None if it was already stored unchanged.
+        """
+        rvd = processed_data.get('RVD') or {}
+        code_site = rvd['Code site'].strip().upper() if _is_present(rvd.get('Code site')) else None
+        payload = json.dumps(strip_images(processed_data), ensure_ascii=False, default=json_default)
+        payload_hash = hashlib.sha1(f"{dae_type}|{payload}".encode('utf-8')).hexdigest()
+        reported = report_date(processed_data)
+        with self._lock, self._conn:
+            stored = self._conn.execute(
+                "SELECT code_site, payload_hash FROM inspections WHERE uid = ?", (uid,)
+            ).fetchone()
+            if stored and stored['payload_hash'] == payload_hash:
+                return None
+            self._conn.execute("DELETE FROM inspections WHERE uid = ?", (uid,))
+            cursor = self._conn.execute(
+                "INSERT INTO inspections (uid, created_at, report_date, code_site, dae_type, payload, payload_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (uid, datetime.now().isoformat(timespec='seconds'),
+                 reported.isoformat() if reported else None, code_site, dae_type, payload, payload_hash)
+            )
+            inspection_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO serials (inspection_id, component, source, serial, serial_norm) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (inspection_id, component, source, str(serial), normalize_serial(serial))
+                    for component, source, serial in collect_serials(processed_data)
+                ]
+            )
+            if self._serial_index is not None:
+                for _, _, serial in collect_serials(processed_data):
+                    self._serial_index.add(serial)
+            self._conn.executemany(
+                "INSERT INTO expiries (inspection_id, component, source, expiry_date) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (inspection_id, component, source, expiry.isoformat())
+                    for component, source, expiry in collect_expiries(processed_data)
+                ]
+            )
+            # Only the latest inspection of a site describes its current equipment
+            for site in {code_site, stored['code_site'] if stored else None} - {None}:
+                self._mark_latest(site)
+        return inspection_id
+
+    def _query(self, sql: str, params: Tuple) -> List[Dict]:
+        """Run a read query and return rows as dicts."""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def find_by_serial(self, serial: str, limit: int = HISTORY_QUERY_LIMIT) -> List[Dict]:
+        """List every inspection in which a serial number appeared.
+
+        Args:
+            serial: Serial number, in any formatting.
+            limit: Maximum number of rows to return.
+
+        Returns:
+            Matching rows, most recent RVD report first.
+        """
+        return self._query(
+            "SELECT i.report_date, i.created_at, i.code_site, s.component, s.source, s.serial, i.uid "
+            "FROM serials s JOIN inspections i ON i.id = s.inspection_id "
+            f"WHERE s.serial_norm = ? ORDER BY {_MOST_RECENT} LIMIT ?",
+            (normalize_serial(serial), limit)
+        )
+
+    def serial_index(self) -> SerialIndex:
+        """Return the index of every known serial, built on first use."""
+        with self._lock:
+            if self._serial_index is None:
+                self._serial_index = SerialIndex(
+                    row[0] for row in self._conn.execute("SELECT DISTINCT serial_norm FROM serials")
+                )
+            return self._serial_index
+
+    def suggest_serials(self, serial: str, limit: int = 5) -> List[Dict]:
+        """Find the known serials closest to a serial, tolerating OCR confusions.
+
+        Args:
+            serial: Serial number, in any formatting.
+            limit: Maximum number of suggestions.
+
+        Returns:
+            Known serials with their distance and confidence, closest first.
+        """
+        return self.serial_index().nearest(serial, limit=limit)
+
+    def find_by_site(self, code_site: str, limit: int = HISTORY_QUERY_LIMIT) -> List[Dict]:
+        """List the inspections of a site.
+
+        Args:
+            code_site: Site code as found in the RVD.
+            limit: Maximum number of rows to return.
+
+        Returns:
+            Matching inspections, most recent RVD report first.
+        """
+        return self._query(
+            "SELECT report_date, created_at, code_site, dae_type, uid FROM inspections "
+            f"WHERE code_site = ? ORDER BY {_MOST_RECENT} LIMIT ?",
+            (code_site.strip().upper(), limit)
+        )
+
+    def find_expiring(self, start: date, end: date, component: str = 'electrodes',
+                      limit: int = HISTORY_QUERY_LIMIT) -> List[Dict]:
+        """List sites whose latest inspection reports an expiry within a date range.
+
+        Args:
+            start: First day of the range (inclusive).
+            end: Last day of the range (inclusive).
+            component: Component whose expiry dates are searched.
+            limit: Maximum number of rows to return.
+
+        Returns:
+            Matching rows, soonest expiry first.
+        """
+        return self._query(
+            "SELECT DISTINCT i.code_site, e.expiry_date, e.source, i.created_at, i.uid "
+            "FROM expiries e JOIN inspections i ON i.id = e.inspection_id "
+            "WHERE e.component = ? AND e.latest = 1 AND e.expiry_date BETWEEN ? AND ? "
+            "ORDER BY e.expiry_date LIMIT ?",
+            (component, start.isoformat(), end.isoformat(), limit)
+        )
+
+    def get_payload(self, uid: str) -> Optional[Dict]:
+        """Load the stored data of an inspection.
+
+        Args:
+            uid: Identifier of the inspection.
+
+        Returns:
+            Stored inspection data, or None if unknown.
+        """
+        rows = self._query("SELECT payload FROM inspections WHERE uid = ?", (uid,))
+        return json.loads(rows[0]['payload']) if rows else None
+
+    def count(self) -> int:
+        """Return the number of stored inspections."""
+        return self._query("SELECT COUNT(*) AS n FROM inspections", ())[0]['n']
+
+@st.cache_resource
+def get_history(path: str = HISTORY_DB_PATH) -> InspectionHistory:
+    """Return the process-wide inspection history store."""
+    return InspectionHistory(path)
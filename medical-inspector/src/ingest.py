@@ -0,0 +1,295 @@
+"""Watch-folder ingestion for the Comparateur_PDF project.
+
+Every folder of the watched tree holding reports or photos is one
+inspection. A state file in the folder records the size, modification time,
+content hash and extracted results of each file, so only new or changed
+files are processed again; the inspection is then reassembled from the
+stored results and written next to the inputs. While a folder is being
+processed, completed stages are checkpointed, so an interrupted backfill
+resumes where it stopped. Files whose processing failed (unreadable photo,
+inference or PDF error) are left pending, and retried by the next run on
+their folder.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from .config import (
+    ALLOWED_EXTENSIONS, INGEST_DEBOUNCE_S, INGEST_OUTPUT_DIR, INGEST_STATE_FILE, PDF_WORKERS
+)
+from .checkpoint import CheckpointJournal, batch_job_id
+from .comparison import aed_record, compare_rvd_aed_data, compare_rvd_images_data
+from .inspections import add_reports, duplicate_report_message
+from .processing import IMAGE_ERROR_TYPES, analyze_images, analyze_pdfs, decode_images, new_pipeline_stats
+from .records import json_default
+from .scheduler import run_in_background
+from .utils import strip_images
+
+def is_ingestable(path: str) -> bool:
+    """Tell whether a file is an inspection input (not a temporary or output file)."""
+    name = os.path.basename(path)
+    if name.startswith(('.', '~$')) or INGEST_OUTPUT_DIR in path.split(os.sep):
+        return False
+    return os.path.splitext(name)[1][1:].lower() in ALLOWED_EXTENSIONS
+
+def file_digest(path: str) -> str:
+    """Return the SHA-256 of a file content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_state(folder: str) -> Dict:
+    """Load the ingestion state of a folder."""
+    try:
+        with open(os.path.join(folder, INGEST_STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'files': {}}
+
+def _write_json(path: str, data: Dict) -> None:
+    """Write a JSON file atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=json_default)
+    os.replace(tmp_path, path)
+
+def _changed_files(folder: str, state: Dict) -> Dict[str, Dict]:
+    """Fingerprint the inputs of a folder, hashing only files whose size or time changed.
+
+    Returns:
+        The state entry of each input; entries flagged 'pending' are new,
+        changed or failed last time and must be processed, the others keep
+        their results.
+    """
+    entries = {}
+    for item in os.scandir(folder):
+        if not item.is_file() or not is_ingestable(item.path):
+            continue
+        stat = item.stat()
+        old = state['files'].get(item.name, {})
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        # Entries without a hash failed last time and are processed again
+        if old.get('sha256') and old.get('size') == entry['size'] and old.get('mtime_ns') == entry['mtime_ns']:
+            entries[item.name] = old
+            continue
+        entry['sha256'] = file_digest(item.path)
+        if old.get('sha256') == entry['sha256']:
+            entries[item.name] = {**old, **entry}
+        else:
+            entries[item.name] = {**entry, 'pending': True}
+    return entries
+
+def assemble_inspection(entries: Dict[str, Dict], dae_type: str,
+                        on_message: Optional[Callable[[str, str], None]] = None) -> Dict:
+    """Rebuild the processed data of an inspection from per-file results.
+
+    Args:
+        entries: State entry of each input file, holding its results.
+        dae_type: AED generation used when it cannot be detected.
+        on_message: Called with 'error' and a message for each report
+            rejected because the inspection already holds one of its type.
+
+    Returns:
+        Processed inspection data, comparisons included.
+    """
+    processed_data = {
+        'RVD': {}, 'AEDG5': {}, 'AEDG3': {}, 'AED': {},
+        'images': [],
+        'files': sorted(entries),
+        'comparisons': {'rvd_vs_aed': {}, 'rvd_vs_images': {}}
+    }
+    for name in sorted(entries):
+        entry = entries[name]
+        rejected = add_reports(processed_data, entry.get('reports', []))
+        if rejected and on_message:
+            on_message('error', duplicate_report_message(name, rejected))
+        if entry.get('image'):
+            processed_data['images'].append(entry['image'])
+    rvd = processed_data['RVD']
+    aed = aed_record(processed_data, dae_type)
+    if rvd and aed:
+        processed_data['comparisons']['rvd_vs_aed'] = compare_rvd_aed_data(rvd, aed)
+    if rvd:
+        processed_data['comparisons']['rvd_vs_images'] = compare_rvd_images_data(rvd, processed_data['images'])
+    return processed_data
+
+def ingest_folder(folder: str, client, reader, dae_type: str = 'G5', ocr_pool=None,
+                  stats: Optional[Dict] = None, history=None) -> Optional[Dict]:
+    """Process the new or changed files of an inspection folder.
+
+    Results are written to the output folder next to the inputs: the
+    inspection JSON and one Parquet file per export table.
+
+    Args:
+        folder: Inspection folder.
+        client: Initialized InferenceHTTPClient.
+        reader: Initialized EasyOCR reader.
+        dae_type: AED generation used when it cannot be detected.
+        ocr_pool: OcrWorkerPool used for the OCR stage, if any.
+        stats: Pipeline counters updated in place.
+        history: InspectionHistory the inspection is recorded in, if any.
+
+    Returns:
+        The inspection result, or None if no input changed.
+    """
+    if not os.path.isdir(folder):
+        return None
+    state = load_state(folder)
+    entries = _changed_files(folder, state)
+    pending = [name for name, entry in entries.items() if entry.pop('pending', False)]
+    if not pending and set(entries) == set(state['files']):
+        return None
+
+    # Files completed before an interruption are read back from the folder journal
+    journal = CheckpointJournal(batch_job_id([(os.path.abspath(folder), '')], dae_type))
+    try:
+        result = _process_pending(folder, entries, sorted(pending), client, reader, dae_type,
+                                  ocr_pool, stats, history, journal)
+    except BaseException:
+        journal.close()  # Keep the completed stages for the next attempt
+        raise
+    journal.finish()
+    return result
+
+def _process_pending(folder: str, entries: Dict[str, Dict], pending: List[str], client, reader,
+                     dae_type: str, ocr_pool, stats: Optional[Dict], history, journal) -> Dict:
+    """Process the pending files of a folder and write its outputs and state, see ingest_folder."""
+    from .export import build_tables, write_parquet_tables
+    messages = []
+
+    def on_message(level: str, text: str) -> None:
+        messages.append({'level': level, 'message': text})
+
+    pdf_names = [name for name in pending if name.lower().endswith('.pdf')]
+    image_names = [name for name in pending if not name.lower().endswith('.pdf')]
+    # PDFs are parsed in the background while the images flow through their pipeline
+    pdf_future = run_in_background(analyze_pdfs, [
+        (name, os.path.join(folder, name)) for name in pdf_names
+    ], dae_type, PDF_WORKERS, journal) if pdf_names else None
+    named_images = decode_images(
+        [(name, os.path.join(folder, name)) for name in image_names], on_message=on_message
+    )
+    images = analyze_images(
+        named_images, client, reader,
+        dedup_interval=None,  # A folder holds a single inspection
+        ocr_pool=ocr_pool,
+        stats=stats if stats is not None else new_pipeline_stats(),
+        on_message=on_message,
+        journal=journal
+    )
+    decoded = {name for name, _ in named_images}
+    failed = {name for name in image_names if name not in decoded}
+    for name, reports, error in pdf_future.result() if pdf_future else []:
+        if error is not None:
+            on_message('error', f"Erreur lors de la lecture de {name} : {error}")
+            failed.add(name)
+            continue
+        if not reports:
+            on_message('warning', f"Type de PDF non reconnu : {name}")
+        entries[name]['reports'] = reports
+
+    for img_data in strip_images({'images': images})['images']:
+        if img_data['type'] in IMAGE_ERROR_TYPES:
+            failed.update([img_data['filename']] + img_data.get('duplicates', []))
+            continue
+        entries[img_data['filename']]['image'] = img_data
+        for duplicate in img_data.get('duplicates', []):
+            entries[duplicate]['duplicate_of'] = img_data['filename']
+    for name in failed:
+        # Without its hash, the file is pending again on the next run
+        entries[name] = {key: value for key, value in entries[name].items() if key in ('size', 'mtime_ns')}
+
+    processed_data = assemble_inspection(entries, dae_type, on_message)
+    output_dir = os.path.join(folder, INGEST_OUTPUT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    result = {
+        'folder': folder,
+        'processed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'processed_files': pending,
+        'failed_files': sorted(failed),
+        'data': processed_data,
+        'messages': messages,
+        'checkpoint': journal.report(),
+    }
+    _write_json(os.path.join(output_dir, 'inspection.json'), result)
+    uid = hashlib.sha1(os.path.abspath(folder).encode('utf-8')).hexdigest()
+    generation = processed_data['AED'].get('generation', dae_type)
+    write_parquet_tables(build_tables(processed_data, uid, generation), output_dir)
+    if history is not None and processed_data['RVD']:
+        history.save_inspection(uid, processed_data, generation)
+    _write_json(os.path.join(folder, INGEST_STATE_FILE), {'files': entries})
+    return result
+
+def inspection_folders(root: str) -> List[str]:
+    """List the folders of a tree holding inspection inputs."""
+    folders = []
+    for folder, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d != INGEST_OUTPUT_DIR and not d.startswith('.')]
+        if any(is_ingestable(os.path.join(folder, name)) for name in files):
+            folders.append(folder)
+    return folders
+
+class FolderDebouncer:
+    """Collect file events per folder and release folders once they are quiet.
+
+    A folder is released when no event touched it for the debounce delay,
+    so files still being copied are not processed half-written.
+    """
+
+    def __init__(self, debounce: float = INGEST_DEBOUNCE_S):
+        self.debounce = debounce
+        self._last_event: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, path: str) -> None:
+        """Record an event on an input file."""
+        if is_ingestable(path):
+            with self._lock:
+                self._last_event[os.path.dirname(path)] = time.monotonic()
+
+    def ready(self) -> List[str]:
+        """Return and forget the folders that have been quiet long enough."""
+        now = time.monotonic()
+        with self._lock:
+            folders = [f for f, t in self._last_event.items() if now - t >= self.debounce]
+            for folder in folders:
+                del self._last_event[folder]
+        return folders
+
+def start_observer(root: str, on_path: Callable[[str], None], polling: bool = False):
+    """Watch a tree for file changes, with inotify or by polling.
+
+    Args:
+        root: Watched tree.
+        on_path: Called with the path of each created, modified, moved or deleted file.
+        polling: Whether to poll instead of using native notifications
+            (needed on some network shares). Polling is also used when
+            native notifications cannot be started.
+
+    Returns:
+        The started watchdog observer.
+    """
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    from watchdog.observers.polling import PollingObserver
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory or event.event_type not in ('created', 'modified', 'moved', 'closed', 'deleted'):
+                return
+            on_path(getattr(event, 'dest_path', '') or event.src_path)
+
+    for observer_class in ([] if polling else [Observer]) + [PollingObserver]:
+        observer = observer_class()
+        try:
+            observer.schedule(Handler(), root, recursive=True)
+            observer.start()
+            return observer
+        except OSError:
+            continue
+    raise RuntimeError(f"Impossible de surveiller {root}")
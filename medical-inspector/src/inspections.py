@@ -0,0 +1,230 @@
+"""Grouping of a multi-inspection upload for the Comparateur_PDF project.
+
+Each RVD opens one inspection, keyed by its Code site. AED reports join the
+inspection whose RVD holds their defibrillator serial, and photos the one
+whose RVD holds their battery, electrode or defibrillator serial, OCR
+confusions tolerated. When a single inspection is uploaded, everything that
+cannot be matched joins it; otherwise unmatched files are gathered under
+UNASSIGNED for review, each unmatched AED report in its own group. Several
+RVDs of the same Code site each keep their own inspection, numbered after
+the first, and the conflict is reported; a second AED report matching an
+inspection is rejected and reported, never overwriting the first.
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+from .comparison import aed_record, compare_rvd_aed_data, compare_rvd_images_data
+from .config import SERIAL_MATCH_MAX_DISTANCE
+from .history import RVD_SERIAL_FIELDS, MISSING_VALUE
+from .serial_match import SerialIndex
+from .utils import normalize_serial
+
+UNASSIGNED = "Non attribué"
+
+def new_processed_data() -> Dict:
+    """Return the empty processed data of an inspection."""
+    return {
+        'RVD': {},
+        'AEDG5': {},
+        'AEDG3': {},
+        'AED': {},
+        'images': [],
+        'files': [],
+        'comparisons': {'rvd_vs_aed': {}, 'rvd_vs_images': {}}
+    }
+
+def report_documents(reports: List[Tuple[str, Dict]]) -> List[Dict[str, Dict]]:
+    """Cut the reports returned by analyze_pdf for a PDF into documents.
+
+    Args:
+        reports: (slot, data) of each report of the PDF, as returned by analyze_pdf.
+
+    Returns:
+        The slots of each report: an RVD alone, or an AED report with its
+        unified record under 'AED'.
+    """
+    documents = []
+    for slot, data in reports:
+        if slot == 'AED' and documents:
+            documents[-1]['AED'] = data
+        else:
+            documents.append({slot: data})
+    return documents
+
+def add_reports(processed_data: Dict, reports: List[Tuple[str, Dict]]) -> List[str]:
+    """Add the reports of a PDF to the data of a single inspection.
+
+    A report whose type the inspection already holds is rejected rather
+    than overwriting it.
+
+    Args:
+        processed_data: Processed data of the inspection, updated in place.
+        reports: (slot, data) of each report of the PDF, as returned by analyze_pdf.
+
+    Returns:
+        The slots of the rejected reports.
+    """
+    rejected = []
+    for document in report_documents(reports):
+        if any(processed_data.get(slot) for slot in document):
+            rejected.extend(slot for slot in document if slot != 'AED')
+        else:
+            processed_data.update(document)
+    return rejected
+
+def duplicate_report_message(filename: str, slots: List[str]) -> str:
+    """Tell the user that reports of a PDF were rejected by add_reports."""
+    return (
+        f"Plusieurs rapports {', '.join(sorted(set(slots)))} pour la même inspection "
+        f"({filename}) : seul le premier est utilisé"
+    )
+
+def _rvd_serials(rvd: Dict) -> List[str]:
+    """Return the normalized serials recorded in an RVD."""
+    return [
+        normalize_serial(rvd[field]) for field in RVD_SERIAL_FIELDS
+        if rvd.get(field) and rvd[field] not in (MISSING_VALUE, 'N/A')
+    ]
+
+def duplicate_site_message(site: str, filenames: List[str]) -> str:
+    """Tell the user that several RVDs share a Code site."""
+    return (
+        f"Plusieurs RVD pour le Code site {site} ({', '.join(filenames)}) : "
+        "chacun est comparé dans sa propre inspection"
+    )
+
+def group_inspections(pdf_reports: List[Tuple[str, List[Tuple[str, Dict]]]],
+                      images: List[Dict],
+                      on_message: Optional[Callable[[str, str], None]] = None) -> List[Dict]:
+    """Split the files of an upload into inspections.
+
+    Args:
+        pdf_reports: File name and reports returned by analyze_pdf for each PDF.
+        images: Image results returned by analyze_images.
+        on_message: Called with a level and a message for each Code site
+            shared by several RVDs, and for each AED report rejected because
+            its inspection already holds one.
+
+    Returns:
+        Inspections with their key (Code site or UNASSIGNED), file names and
+        processed data, in order of appearance.
+    """
+    groups: Dict[str, Dict] = {}
+
+    def group(key: str) -> Dict:
+        if key not in groups:
+            groups[key] = {'key': key, 'processed_data': new_processed_data()}
+        return groups[key]
+
+    def add_file(target: Dict, filename: str) -> None:
+        if filename not in target['files']:
+            target['files'].append(filename)
+
+    # Each report of a bundle is placed on its own, so a PDF may feed several inspections
+    aed_documents = []
+    site_files: Dict[str, List[str]] = {}
+    for filename, reports in pdf_reports:
+        for document in report_documents(reports):
+            if 'RVD' not in document:
+                aed_documents.append((filename, document))
+                continue
+            site = (document['RVD'].get('Code site') or '').strip().upper()
+            if not site or site == MISSING_VALUE.upper():
+                site = filename
+            site_files.setdefault(site, []).append(filename)
+            key = site if len(site_files[site]) == 1 else f"{site} ({len(site_files[site])})"
+            target = group(key)['processed_data']
+            target['RVD'] = document['RVD']
+            add_file(target, filename)
+    for site, filenames in site_files.items():
+        if len(filenames) > 1 and on_message is not None:
+            on_message('warning', duplicate_site_message(site, filenames))
+
+    serial_index = {
+        serial: key
+        for key, inspection in groups.items()
+        for serial in _rvd_serials(inspection['processed_data']['RVD'])
+    }
+    single = next(iter(groups)) if len(groups) == 1 else None
+    fuzzy_index = SerialIndex(serial_index)
+
+    def match(serial: Optional[str]) -> str:
+        key = serial_index.get(normalize_serial(serial or ''))
+        if key is None:
+            nearest = fuzzy_index.nearest(serial or '', SERIAL_MATCH_MAX_DISTANCE, limit=1)
+            key = serial_index[nearest[0]['serial']] if nearest else None
+        return key or single or UNASSIGNED
+
+    unassigned_aeds = 0
+    for filename, document in aed_documents:
+        key = match(document.get('AED', {}).get('serial'))
+        if key == UNASSIGNED:
+            # Unmatched AED reports are distinct devices: one group each
+            unassigned_aeds += 1
+            if unassigned_aeds > 1:
+                key = f"{UNASSIGNED} ({unassigned_aeds})"
+        target = group(key)['processed_data']
+        rejected = add_reports(target, list(document.items()))
+        if rejected:
+            if on_message is not None:
+                on_message('error', duplicate_report_message(filename, rejected))
+            continue
+        add_file(target, filename)
+    for img_data in images:
+        target = group(match(img_data.get('serial')))['processed_data']
+        target['images'].append(img_data)
+        target['files'].extend([img_data.get('filename')] + img_data.get('duplicates', []))
+    return list(groups.values())
+
+def _compare(processed_data: Dict, dae_type: str) -> None:
+    """Run the comparisons of one inspection."""
+    rvd = processed_data['RVD']
+    aed = aed_record(processed_data, dae_type)
+    if rvd and aed:
+        processed_data['comparisons']['rvd_vs_aed'] = compare_rvd_aed_data(rvd, aed)
+    if rvd:
+        processed_data['comparisons']['rvd_vs_images'] = compare_rvd_images_data(rvd, processed_data['images'])
+
+def compare_inspections(inspections: List[Dict], dae_type: str) -> None:
+    """Run the comparisons of several inspections, one after the other.
+
+    The comparisons are pure Python and hold the GIL, so threads would only
+    add overhead.
+
+    Args:
+        inspections: Inspections returned by group_inspections, updated in place.
+        dae_type: AED generation used when it cannot be detected.
+    """
+    for inspection in inspections:
+        _compare(inspection['processed_data'], dae_type)
+
+def inspection_summary(inspection: Dict, dae_type: str) -> Dict:
+    """Summarize an inspection as one row of the per-site table.
+
+    Args:
+        inspection: Inspection returned by group_inspections.
+        dae_type: AED generation used when it cannot be detected.
+
+    Returns:
+        Row with the site, devices found and comparison outcome.
+    """
+    processed_data = inspection['processed_data']
+    aed = aed_record(processed_data, dae_type)
+    outcomes = [
+        result.get('match', False)
+        for comparison in processed_data['comparisons'].values()
+        for result in comparison.values()
+    ]
+    if not processed_data['RVD']:
+        status = "RVD manquant"
+    elif not outcomes:
+        status = "Incomplet"
+    else:
+        status = "✅ Conforme" if all(outcomes) else "❌ Écarts"
+    return {
+        'Code site': inspection['key'],
+        'DAE': f"{aed.get('generation', '')} {aed.get('serial', '')}".strip() or "—",
+        'Fichiers': len(processed_data['files']),
+        'Photos': len(processed_data['images']),
+        'Contrôles conformes': f"{sum(outcomes)}/{len(outcomes)}",
+        'Statut': status,
+    }
@@ -0,0 +1,343 @@
+"""Concurrent-session load test of the Comparateur_PDF Streamlit app.
+
+Drives render_ui headlessly through Streamlit's app-testing API, with
+stubbed inference and OCR clients answering after a simulated latency.
+The app-testing API sets up a process-wide runtime for each script run,
+so every simulated session runs in its own spawned interpreter: the
+sessions are independent app processes, not sessions of one Streamlit
+server. They compete for the CPU and memory of the host, but share none
+of the process-wide resources of a server (cached resources, OCR pool,
+history store), so the figures tell how many single-session app
+processes the host sustains. Resources are measured over the whole
+process tree.
+Each simulated technician opens the app, uploads an inspection bundle and
+clicks through the inspections, the views and the export. The test is repeated
+for increasing numbers of concurrent sessions and reports, for each level,
+the latency percentiles of every step, the process RSS growth and the CPU
+utilization. The capacity of the host is the largest number of
+sessions whose upload p95 stays within the latency objective; every report
+is appended to a history file to track it over time.
+
+A bundle is a folder holding the reports and photos of one inspection;
+without one, a bundle of synthetic photos is generated.
+
+Usage:
+    python -m src.loadtest [bundle_dir ...] [--sessions 1,2,4,8] [--latency S]
+                           [--slo S] [--history FILE] [--output report.json]
+"""
+
+import argparse
+import importlib
+import io
+import json
+import mimetypes
+import os
+import multiprocessing as mp
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from .config import (
+    ALLOWED_EXTENSIONS, LOADTEST_HISTORY, LOADTEST_SESSIONS, LOADTEST_SLO_S, LOADTEST_STUB_LATENCY,
+    LOADTEST_TIMEOUT_S
+)
+
+def _stub_app(latency: float) -> None:
+    """Streamlit script of one simulated session (run by AppTest)."""
+    from src.stubs import StubInferenceClient, StubOcrReader
+    from src.ui import render_ui
+    render_ui(StubInferenceClient(latency=latency), StubOcrReader(latency=latency))
+
+def load_bundle(bundle_dir: str) -> List[Tuple[str, bytes, str]]:
+    """Read the files of an inspection bundle folder.
+
+    Args:
+        bundle_dir: Folder holding the reports and photos of one inspection.
+
+    Returns:
+        (file name, content, MIME type) of each file, as uploaded.
+    """
+    bundle = []
+    for name in sorted(os.listdir(bundle_dir)):
+        if name.rsplit('.', 1)[-1].lower() not in ALLOWED_EXTENSIONS:
+            continue
+        with open(os.path.join(bundle_dir, name), 'rb') as f:
+            bundle.append((name, f.read(), mimetypes.guess_type(name)[0] or 'application/octet-stream'))
+    return bundle
+
+def synthetic_bundle(photos: int = 4, size: Tuple[int, int] = (1600, 1200)) -> List[Tuple[str, bytes, str]]:
+    """Generate a bundle of noisy photos the size of a phone picture."""
+    bundle = []
+    for idx in range(photos):
+        pixels = (np.random.RandomState(idx).rand(size[1], size[0], 3) * 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+        bundle.append((f"photo_{idx + 1}.jpg", buffer.getvalue(), 'image/jpeg'))
+    return bundle
+
+def _session_bundle(bundle: List[Tuple[str, bytes, str]], session: int) -> List[Tuple[str, bytes, str]]:
+    """Make a bundle unique to a session, so sessions share no cache or checkpoint."""
+    files = []
+    for name, content, mime in bundle:
+        if mime.startswith('image/'):
+            image = Image.open(io.BytesIO(content)).convert('RGB')
+            image.putpixel((0, 0), (session % 256, session // 256 % 256, 0))
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=95)
+            content = buffer.getvalue()
+        files.append((f"s{session}-{name}", content, mime))
+    return files
+
+def _process_tree() -> List[int]:
+    """Return the ids of this process and of all its descendants."""
+    parents: Dict[int, List[int]] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue  # Exited while listing
+        parents.setdefault(ppid, []).append(int(entry))
+    tree = [os.getpid()]
+    for pid in tree:
+        tree.extend(parents.get(pid, []))
+    return tree
+
+def _tree_usage() -> Tuple[int, float]:
+    """Return the resident set size (bytes) and CPU time (s) of the process tree."""
+    page_size, ticks = os.sysconf('SC_PAGE_SIZE'), os.sysconf('SC_CLK_TCK')
+    rss, cpu = 0, 0.0
+    for pid in _process_tree():
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                rss += int(f.read().split()[1]) * page_size
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / ticks  # utime and stime
+        except (OSError, IndexError, ValueError):
+            continue
+    return rss, cpu
+
+class ResourceSampler:
+    """Sample the RSS and CPU utilization of the process tree in the background."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.rss: List[int] = []
+        self.cpu: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        cores = os.cpu_count() or 1
+        last_cpu, last_wall = _tree_usage()[1], time.monotonic()
+        while not self._stop.wait(self.interval):
+            (rss, cpu), wall = _tree_usage(), time.monotonic()
+            # A process leaving the tree takes its CPU time with it
+            self.cpu.append(max(cpu - last_cpu, 0.0) / ((wall - last_wall) * cores))
+            self.rss.append(rss)
+            last_cpu, last_wall = cpu, wall
+
+    def __enter__(self) -> 'ResourceSampler':
+        self.rss.append(_tree_usage()[0])
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.rss.append(_tree_usage()[0])
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Summarize latencies by their median, p90, p95 and maximum."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    pick = lambda q: ordered[int(q * (len(ordered) - 1))]
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p95': pick(0.95), 'max': ordered[-1]}
+
+def _selectbox(at, label: str):
+    """Return the selectbox of the current page with a label, if shown."""
+    return next((s for s in at.selectbox if s.label == label), None)
+
+def _navigate(at, view: str) -> None:
+    """Switch the app to one of its views."""
+    next(r for r in at.radio if r.key == "active_view").set_value(view).run()
+
+def _export(at) -> None:
+    """Generate the ZIP export package from the export view."""
+    _navigate(at, "📤 Export automatisé")
+    _selectbox(at, "Format de sortie").set_value("ZIP")
+    next(b for b in at.button if b.label == "Générer un package d'export").click().run()
+
+def run_session(bundle: List[Tuple[str, bytes, str]], latency: float,
+                timeout: float = LOADTEST_TIMEOUT_S) -> Dict:
+    """Simulate one technician session.
+
+    Args:
+        bundle: Files uploaded by the session.
+        latency: Simulated latency of the inference and OCR stubs.
+        timeout: Longest time a script run may take.
+
+    Returns:
+        Latency of each step ('open', 'upload', 'select' for each inspection
+        when there are several, 'navigate' to each view, 'export') and the
+        error that stopped the session, if any.
+    """
+    from streamlit.testing.v1 import AppTest
+    steps: Dict[str, List[float]] = {}
+
+    def timed(step: str, action) -> None:
+        start = time.perf_counter()
+        action()
+        steps.setdefault(step, []).append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+
+    at = AppTest.from_function(_stub_app, args=(latency,), default_timeout=timeout)
+    try:
+        timed('open', at.run)
+        timed('upload', lambda: at.file_uploader[0].set_value(bundle).run())
+        selector = _selectbox(at, "Inspection affichée dans les autres vues")
+        for idx in range(len(selector.options) if selector else 0):
+            timed('select', lambda: _selectbox(at, "Inspection affichée dans les autres vues").select_index(idx).run())
+        for view in next(r for r in at.radio if r.key == "active_view").options:
+            timed('navigate', lambda: _navigate(at, view))
+        timed('export', lambda: _export(at))
+        error = None
+    except Exception as e:
+        error = str(e)
+    return {'steps': steps, 'error': error}
+
+def _start_worker(ready) -> None:
+    """Import the app in a new worker process, then wait for the others."""
+    # Warm-up only: the imports are paid before the sessions are timed
+    importlib.import_module('src.ui')
+    importlib.import_module('streamlit.testing.v1')
+    ready.wait()
+
+def _timed_session(task: Tuple[List[Tuple[str, bytes, str]], float]) -> Dict:
+    """Run one session inside a worker process and time it as a whole."""
+    bundle, latency = task
+    start = time.perf_counter()
+    result = run_session(bundle, latency)
+    result['total_s'] = time.perf_counter() - start
+    return result
+
+def run_level(bundle: List[Tuple[str, bytes, str]], sessions: int, latency: float) -> Dict:
+    """Run concurrent sessions and measure latency and resource usage.
+
+    Args:
+        bundle: Inspection bundle, made unique per session.
+        sessions: Number of concurrent sessions, each an independent app
+            process (see the module docstring).
+        latency: Simulated latency of the inference and OCR stubs.
+
+    Returns:
+        Latency percentiles per step and per session, RSS and CPU figures.
+    """
+    tasks = [(_session_bundle(bundle, idx), latency) for idx in range(sessions)]
+    context = mp.get_context('spawn')
+    ready = context.Barrier(sessions + 1)
+    # Workers are started before sampling, so the RSS growth is not the interpreters starting up
+    with context.Pool(sessions, initializer=_start_worker, initargs=(ready,)) as pool:
+        ready.wait()
+        start = time.perf_counter()
+        with ResourceSampler() as sampler:
+            results = pool.map(_timed_session, tasks, chunksize=1)
+    steps: Dict[str, List[float]] = {}
+    for result in results:
+        for step, latencies in result['steps'].items():
+            steps.setdefault(step, []).extend(latencies)
+    return {
+        'sessions': sessions,
+        'processes': sessions,
+        'wall_s': time.perf_counter() - start,
+        'errors': [r['error'] for r in results if r['error']],
+        'latency_s': {step: percentiles(latencies) for step, latencies in steps.items()},
+        'session_s': percentiles([r['total_s'] for r in results]),
+        'rss_mb': {
+            'start': sampler.rss[0] / 2**20,
+            'peak': max(sampler.rss) / 2**20,
+            'growth': (sampler.rss[-1] - sampler.rss[0]) / 2**20,
+        },
+        'cpu': {
+            'mean': sum(sampler.cpu) / len(sampler.cpu) if sampler.cpu else 0.0,
+            'max': max(sampler.cpu, default=0.0),
+            'saturated': sum(c >= 0.9 for c in sampler.cpu) / len(sampler.cpu) if sampler.cpu else 0.0,
+        },
+    }
+
+def _commit() -> Optional[str]:
+    """Return the current git commit, if known."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_test(bundle: List[Tuple[str, bytes, str]], levels: List[int] = LOADTEST_SESSIONS,
+              latency: float = LOADTEST_STUB_LATENCY, slo: float = LOADTEST_SLO_S) -> Dict:
+    """Find how many concurrent sessions, each in its own app process, the host supports.
+
+    Args:
+        bundle: Inspection bundle uploaded by every session.
+        levels: Numbers of concurrent sessions to try, in increasing order.
+        latency: Simulated latency of the inference and OCR stubs.
+        slo: Upload p95 latency objective, in seconds.
+
+    Returns:
+        Report of every level and the capacity: the largest number of
+        sessions meeting the objective without errors (0 if none does).
+    """
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _commit(),
+        'cpu_count': os.cpu_count(),
+        'bundle': {'files': len(bundle), 'mb': sum(len(c) for _, c, _ in bundle) / 2**20},
+        # Sessions do not share a server: see the module docstring
+        'session_isolation': 'process',
+        'stub_latency_s': latency,
+        'slo_s': slo,
+        'levels': [],
+        'capacity': 0,
+    }
+    for sessions in levels:
+        level = run_level(bundle, sessions, latency)
+        report['levels'].append(level)
+        upload_p95 = level['latency_s'].get('upload', {}).get('p95')
+        if level['errors'] or upload_p95 is None or upload_p95 > slo:
+            break  # Latency only gets worse with more sessions
+        report['capacity'] = sessions
+    return report
+
+def main():
+    """Run the load test from the command line."""
+    parser = argparse.ArgumentParser(description="Load test the Streamlit app with concurrent sessions, one app process each")
+    parser.add_argument('bundles', nargs='*', help="Inspection bundle folders (merged into one upload)")
+    parser.add_argument('--sessions', default=','.join(map(str, LOADTEST_SESSIONS)),
+                        help="Comma-separated numbers of concurrent sessions")
+    parser.add_argument('--latency', type=float, default=LOADTEST_STUB_LATENCY,
+                        help="Simulated inference and OCR latency, in seconds")
+    parser.add_argument('--slo', type=float, default=LOADTEST_SLO_S, help="Upload p95 objective, in seconds")
+    parser.add_argument('--history', default=LOADTEST_HISTORY, help="Append the report to this JSON lines file")
+    parser.add_argument('--output', help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    bundle = [f for bundle_dir in args.bundles for f in load_bundle(bundle_dir)] or synthetic_bundle()
+    report = load_test(bundle, [int(n) for n in args.sessions.split(',')], args.latency, args.slo)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.history:
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(report) + "\n")
+
+if __name__ == "__main__":
+    main()
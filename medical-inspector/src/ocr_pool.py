@@ -0,0 +1,96 @@
+"""Multi-process OCR worker pool for the Comparateur_PDF project.
+
+Each worker process loads its own copy of the EasyOCR model; nothing is
+shared between workers but the task queue. The app keeps a single pool,
+sized from the configuration, for all of its sessions.
+"""
+
+import multiprocessing as mp
+import os
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+import streamlit as st
+from .config import OCR_POOL_WORKERS, OCR_POOL_THREADS_PER_WORKER, OCR_CPU_OPTIMIZED
+
+# Reader used inside worker processes, loaded by their initializer
+_WORKER_READER = None
+
+def _start_method() -> str:
+    """Start workers from a clean process: the server may already run torch, OpenMP and threads."""
+    return 'forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn'
+
+def _init_worker(threads: int, cpu_optimized: bool) -> None:
+    """Bound torch threading in a worker and load its reader before the first task."""
+    global _WORKER_READER
+    from .clients import configure_torch_threads, create_ocr_reader
+    configure_torch_threads(threads, 1)
+    _WORKER_READER = create_ocr_reader(False, cpu_optimized, intra_op=threads)
+
+def _readtext(task: Tuple[np.ndarray, dict]) -> List[Tuple]:
+    """Run OCR on one image inside a worker."""
+    array, options = task
+    return _WORKER_READER.readtext(array, **options)
+
+class OcrWorkerPool:
+    """Pool of OCR worker processes, each with its own preloaded EasyOCR model.
+
+    Workers are never forked from the server, whose torch, OpenMP and
+    Streamlit threads would not survive the fork; each starts from a clean
+    process and loads its reader before taking tasks. Images are distributed
+    to the workers through the pool task queue, one image per task, and
+    results are returned in submission order.
+    """
+
+    def __init__(self, workers: int = OCR_POOL_WORKERS,
+                 threads_per_worker: Optional[int] = OCR_POOL_THREADS_PER_WORKER,
+                 cpu_optimized: bool = OCR_CPU_OPTIMIZED):
+        """Start the worker processes.
+
+        Args:
+            workers: Number of worker processes.
+            threads_per_worker: Torch intra-op threads per worker (None: cores / workers).
+            cpu_optimized: Whether workers bound their torch threads.
+        """
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self._pool = mp.get_context(_start_method()).Pool(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker, cpu_optimized)
+        )
+
+    def readtext_many(self, arrays: Sequence[np.ndarray], **options) -> List[List[Tuple]]:
+        """Run OCR on several images in parallel.
+
+        Args:
+            arrays: Images to read, as arrays.
+            **options: Keyword arguments forwarded to Reader.readtext.
+
+        Returns:
+            OCR results of each image, in the order of the input.
+        """
+        return self._pool.map(_readtext, [(array, options) for array in arrays], chunksize=1)
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        self._pool.close()
+        self._pool.join()
+
+@st.cache_resource
+def get_ocr_pool(_reader) -> Optional[OcrWorkerPool]:
+    """Return the process-wide OCR pool, or None when pooling is disabled.
+
+    The pool is created once, with OCR_POOL_WORKERS workers, and used by
+    every session; its size is not a session setting, so no other pool is
+    ever started.
+
+    Args:
+        _reader: Loaded EasyOCR reader of the app, telling whether OCR runs
+            on the CPU (excluded from cache key).
+
+    Returns:
+        The OCR worker pool, or None.
+    """
+    if OCR_POOL_WORKERS < 2 or getattr(_reader, 'device', 'cpu') != 'cpu':
+        return None
+    return OcrWorkerPool(OCR_POOL_WORKERS)
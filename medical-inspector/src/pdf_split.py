@@ -0,0 +1,154 @@
+"""Content-based splitting of merged PDF reports for the Comparateur_PDF project.
+
+Each page is classified from the markers found in its text. A page without
+markers continues the report of the previous page, so a merged bundle is cut
+into its RVD and AED reports whatever its file name. A page opening with the
+title of its report type starts a new report, so a bundle holding two reports
+of the same type yields both. Page text is extracted in worker processes for
+large bundles.
+"""
+
+import io
+import multiprocessing as mp
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import pdfplumber
+import streamlit as st
+from .config import PDF_PAGE_MARKERS, PDF_PARALLEL_MIN_PAGES, PDF_REPORT_HEADERS, PDF_WORKERS
+from .spool import map_file
+
+# A PDF given by its content or by the path of a file
+PdfSource = Union[bytes, str, os.PathLike]
+
+@contextmanager
+def open_pdf(source: PdfSource) -> Iterator[pdfplumber.PDF]:
+    """Open a PDF, memory-mapping it read-only when given a path.
+
+    Args:
+        source: Content of the PDF or path of the file.
+
+    Yields:
+        The opened document.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with map_file(source) as content:
+            # An empty file is not mapped: pdfplumber needs a file object to report it
+            with pdfplumber.open(content if content else io.BytesIO(content)) as pdf:
+                yield pdf
+    else:
+        with pdfplumber.open(io.BytesIO(source)) as pdf:
+            yield pdf
+
+def _extract_pages(task: Tuple[PdfSource, Sequence[int]]) -> List[str]:
+    """Extract the text of some pages of a PDF inside a worker."""
+    source, pages = task
+    with open_pdf(source) as pdf:
+        return [pdf.pages[i].extract_text() or "" for i in pages]
+
+@st.cache_resource
+def get_pdf_executor(workers: int) -> ProcessPoolExecutor:
+    """Return the process-wide executor extracting PDF pages.
+
+    Args:
+        workers: Number of worker processes.
+
+    Returns:
+        The process pool executor.
+    """
+    # Forking the Streamlit server (threads, sockets) is unsafe: workers start clean
+    method = 'forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context(method))
+
+def extract_page_texts(uploaded_file, workers: Optional[int] = PDF_WORKERS,
+                       min_parallel_pages: int = PDF_PARALLEL_MIN_PAGES) -> List[str]:
+    """Extract the text of each page of a PDF.
+
+    Pages are split into one contiguous range per worker process when the
+    document has at least min_parallel_pages pages.
+
+    Args:
+        uploaded_file: The PDF file (path or file-like object).
+        workers: Number of worker processes (None: one per core).
+        min_parallel_pages: Page count from which extraction runs in parallel.
+
+    Returns:
+        Text of each page, in page order.
+    """
+    if isinstance(uploaded_file, (str, os.PathLike)):
+        source = uploaded_file  # Mapped by each reader rather than copied to every worker
+    else:
+        uploaded_file.seek(0)
+        source = uploaded_file.read()
+
+    with open_pdf(source) as pdf:
+        page_count = len(pdf.pages)
+        workers = min(workers or os.cpu_count() or 1, page_count)
+        if workers < 2 or page_count < min_parallel_pages:
+            return [page.extract_text() or "" for page in pdf.pages]
+
+    size = -(-page_count // workers)
+    tasks = [(source, range(start, min(start + size, page_count))) for start in range(0, page_count, size)]
+    texts = []
+    for chunk in get_pdf_executor(workers).map(_extract_pages, tasks):
+        texts.extend(chunk)
+    return texts
+
+def classify_page(text: str, markers: Dict[str, List[str]] = PDF_PAGE_MARKERS) -> Optional[str]:
+    """Find the report a page starts or belongs to from its markers.
+
+    Args:
+        text: Text of the page.
+        markers: Lower-case markers of each report slot.
+
+    Returns:
+        The best matching slot ('RVD', 'AEDG5' or 'AEDG3'), or None when no
+        marker is found or the best score is tied.
+    """
+    lowered = text.lower()
+    scores = sorted(
+        ((sum(marker in lowered for marker in slot_markers), slot) for slot, slot_markers in markers.items()),
+        reverse=True
+    )
+    if not scores or scores[0][0] == 0 or (len(scores) > 1 and scores[1][0] == scores[0][0]):
+        return None
+    return scores[0][1]
+
+def _opens_report(text: str, header: Optional[str]) -> bool:
+    """Tell whether the first non-empty line of a page is the title of a report."""
+    if not header:
+        return False
+    title = next((line.strip().lower() for line in text.splitlines() if line.strip()), "")
+    return re.match(header, title) is not None
+
+def split_reports(page_texts: List[str],
+                  headers: Dict[str, str] = PDF_REPORT_HEADERS) -> List[Tuple[str, List[int], str]]:
+    """Group the pages of a PDF into logical reports.
+
+    A page starts a new report when it belongs to another report type than
+    the previous page, or opens with the title of its report type. Other pages,
+    with or without markers, continue the current report; leading pages
+    without markers are dropped. Several reports of the same type are kept
+    apart, in order.
+
+    Args:
+        page_texts: Text of each page, in page order.
+        headers: Title pattern of each report slot, matched against the
+            lower-case first non-empty line of a page.
+
+    Returns:
+        (slot, page indices, text) of each report, in order of appearance.
+    """
+    reports: List[Tuple[str, List[int]]] = []
+    for i, text in enumerate(page_texts):
+        slot = classify_page(text)
+        if slot and (not reports or reports[-1][0] != slot or _opens_report(text, headers.get(slot))):
+            reports.append((slot, [i]))
+        elif reports:
+            reports[-1][1].append(i)
+    return [
+        (slot, pages, "\n".join(page_texts[i] for i in pages))
+        for slot, pages in reports
+    ]
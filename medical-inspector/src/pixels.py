@@ -0,0 +1,310 @@
+"""Shared image pixels for the Comparateur_PDF project.
+
+Each photo is decoded once into a read-only RGB array that every stage of
+the image pipeline reads through views and crops. Derived images (grey
+levels, thumbnails) are computed at most once per photo and shared, and the
+intermediates of the barcode enhancement come from a pool of reusable
+scratch buffers instead of fresh allocations.
+"""
+
+import hashlib
+import threading
+from datetime import datetime
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from PIL import Image
+from .config import SCRATCH_POOL_MAX_BUFFERS, SCRATCH_POOL_MAX_BUFFER_BYTES, SCRATCH_POOL_MAX_BYTES
+
+# Buffer allocations done by the module, reported by measure_memory
+_counters = {'decoded': 0, 'derived': 0, 'scratch_allocated': 0, 'scratch_reused': 0}
+_counters_lock = threading.Lock()
+
+def _count(name: str) -> None:
+    with _counters_lock:
+        _counters[name] += 1
+
+class ScratchPool:
+    """Pool of reusable flat arrays handed out as buffers of any shape.
+
+    A request is served by the smallest free buffer of the same dtype large
+    enough to hold it, so images of similar sizes share the same memory.
+    The free buffers kept are bounded in number and in total size, and
+    buffers of outsized photos are freed instead of kept.
+    """
+
+    def __init__(self, max_buffers: int = SCRATCH_POOL_MAX_BUFFERS,
+                 max_bytes: int = SCRATCH_POOL_MAX_BYTES,
+                 max_buffer_bytes: int = SCRATCH_POOL_MAX_BUFFER_BYTES):
+        """
+        Args:
+            max_buffers: Free buffers kept for reuse.
+            max_bytes: Total size of the free buffers kept, in bytes.
+            max_buffer_bytes: Size above which a released buffer is not kept, in bytes.
+        """
+        self.max_buffers = max_buffers
+        self.max_bytes = max_bytes
+        self.max_buffer_bytes = max_buffer_bytes
+        self._free: List[np.ndarray] = []
+        self._free_bytes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, shape: Tuple[int, ...], dtype=np.float32) -> np.ndarray:
+        """Take a buffer out of the pool, allocating one if none fits.
+
+        Args:
+            shape: Shape of the buffer.
+            dtype: Element type of the buffer.
+
+        Returns:
+            Uninitialized array of the requested shape, to be released after use.
+        """
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        with self._lock:
+            fits = [i for i, b in enumerate(self._free) if b.dtype == dtype and b.size >= size]
+            if fits:
+                flat = self._free.pop(min(fits, key=lambda i: self._free[i].size))
+                self._free_bytes -= flat.nbytes
+                _count('scratch_reused')
+                return flat[:size].reshape(shape)
+        _count('scratch_allocated')
+        return np.empty(size, dtype=dtype).reshape(shape)
+
+    def release(self, *buffers: np.ndarray) -> None:
+        """Give buffers back to the pool."""
+        with self._lock:
+            for buffer in buffers:
+                flat = buffer.base if buffer.base is not None else buffer
+                if (len(self._free) < self.max_buffers
+                        and flat.nbytes <= self.max_buffer_bytes
+                        and self._free_bytes + flat.nbytes <= self.max_bytes
+                        and not any(b is flat for b in self._free)):
+                    self._free.append(flat)
+                    self._free_bytes += flat.nbytes
+
+    @contextmanager
+    def borrow(self, shape: Tuple[int, ...], dtype=np.float32) -> Iterator[np.ndarray]:
+        """Hold a buffer for the duration of a with block."""
+        buffer = self.acquire(shape, dtype)
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+SCRATCH = ScratchPool()
+
+# EXIF tags of the shooting time: DateTimeOriginal in the Exif IFD, else DateTime
+_EXIF_IFD = 0x8769
+_EXIF_DATETIME_ORIGINAL = 36867
+_EXIF_DATETIME = 306
+
+def capture_time(image: Image.Image) -> Optional[float]:
+    """Return when a photo was taken, from its EXIF data.
+
+    Returns:
+        Camera local time as seconds since the epoch, comparable between
+        photos of one camera, or None when the photo does not tell.
+    """
+    try:
+        exif = image.getexif()
+        value = exif.get_ifd(_EXIF_IFD).get(_EXIF_DATETIME_ORIGINAL) or exif.get(_EXIF_DATETIME)
+        if not value:
+            return None
+        return datetime.strptime(str(value).strip('\x00 '), '%Y:%m:%d %H:%M:%S').timestamp()
+    except (AttributeError, OSError, TypeError, ValueError):
+        return None
+
+class ImagePixels:
+    """Decoded pixels of one photo, shared read-only by every stage.
+
+    The RGB array is never written; crops are views of it, and derived
+    images are cached on first use.
+    """
+
+    def __init__(self, array: np.ndarray, captured_at: Optional[float] = None):
+        """
+        Args:
+            array: Height x width x 3 uint8 RGB pixels, owned by this object from now on.
+            captured_at: When the photo was taken, see capture_time.
+        """
+        array.flags.writeable = False
+        self.array = array
+        self.captured_at = captured_at
+        self._derived: Dict[Tuple, np.ndarray] = {}
+        self._digest: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_image(cls, image: Image.Image) -> 'ImagePixels':
+        """Copy the pixels of a PIL image, converted to RGB if needed, with its capture time."""
+        captured_at = capture_time(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        _count('decoded')
+        return cls(np.asarray(image), captured_at)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Width and height, like PIL.Image.size."""
+        return self.array.shape[1], self.array.shape[0]
+
+    @property
+    def digest(self) -> str:
+        """Content hash of the pixels, computed once."""
+        if self._digest is None:
+            self._digest = hashlib.sha1(np.ascontiguousarray(self.array).data).hexdigest()
+        return self._digest
+
+    def crop(self, box: Tuple[float, float, float, float], gray: bool = False) -> np.ndarray:
+        """Return a view of a region, without copying.
+
+        Args:
+            box: Left, top, right and bottom bounds, as in PIL.Image.crop.
+            gray: Whether to crop the grey levels instead of the RGB pixels.
+        """
+        left, top, right, bottom = (int(v) for v in box)
+        source = self.gray() if gray else self.array
+        return source[max(top, 0):bottom, max(left, 0):right]
+
+    def _cached(self, key: Tuple, build) -> np.ndarray:
+        """Return a derived array, building it on first use."""
+        with self._lock:
+            if key not in self._derived:
+                derived = build()
+                derived.flags.writeable = False
+                self._derived[key] = derived
+                _count('derived')
+            return self._derived[key]
+
+    def gray(self) -> np.ndarray:
+        """Grey levels of the photo, as PIL computes them for mode 'L'."""
+        return self._cached(('gray',), lambda: _luminance(self.array))
+
+    def thumbnail(self, max_side: int, gray: bool = False) -> np.ndarray:
+        """Downscaled copy fitting max_side, as PIL.Image.thumbnail computes it.
+
+        Args:
+            max_side: Longest side of the thumbnail.
+            gray: Whether to downscale the grey levels instead of the RGB pixels.
+
+        Returns:
+            The downscaled pixels, or the full pixels if they already fit.
+        """
+        source = self.gray() if gray else self.array
+        if max(self.size) <= max_side:
+            return source
+
+        def build():
+            image = Image.fromarray(source)
+            image.thumbnail((max_side, max_side))
+            return np.asarray(image)
+
+        return self._cached(('thumbnail', max_side, gray), build)
+
+    def gray_image(self) -> Image.Image:
+        """PIL view of the grey levels, sharing their memory."""
+        return Image.fromarray(self.gray())
+
+    def to_image(self) -> Image.Image:
+        """Copy the pixels into a PIL image, for encoders that need one."""
+        return Image.fromarray(self.array)
+
+# Image accepted by the pipeline functions: a PIL image or already decoded pixels
+ImageLike = Union[Image.Image, ImagePixels]
+
+def as_pixels(image: ImageLike) -> ImagePixels:
+    """Return the shared pixels of an image, decoding a PIL image once."""
+    return image if isinstance(image, ImagePixels) else ImagePixels.from_image(image)
+
+def _luminance(rgb: np.ndarray) -> np.ndarray:
+    """Convert RGB pixels to grey levels with PIL's integer ITU-R 601 weights."""
+    height, width = rgb.shape[:2]
+    gray = np.empty((height, width), dtype=np.uint8)
+    with SCRATCH.borrow((height, width), np.uint32) as acc, SCRATCH.borrow((height, width), np.uint32) as tmp:
+        np.multiply(rgb[..., 0], 19595, out=acc, dtype=np.uint32)
+        np.multiply(rgb[..., 1], 38470, out=tmp, dtype=np.uint32)
+        acc += tmp
+        np.multiply(rgb[..., 2], 7471, out=tmp, dtype=np.uint32)
+        acc += tmp
+        acc += 0x8000
+        acc >>= 16
+        np.copyto(gray, acc, casting='unsafe')
+    return gray
+
+@contextmanager
+def enhanced_for_barcode(gray: np.ndarray, contrast: float = 2.5) -> Iterator[np.ndarray]:
+    """Boost the contrast of grey levels and sharpen them, for barcode decoding.
+
+    Matches ImageEnhance.Contrast followed by ImageFilter.SHARPEN, computed
+    in pooled scratch buffers. The result is only valid inside the with block.
+
+    Args:
+        gray: Grey levels to enhance, left untouched.
+        contrast: Contrast factor.
+
+    Yields:
+        The enhanced grey levels.
+    """
+    height, width = gray.shape
+    mean = int(gray.mean() + 0.5)
+    work = SCRATCH.acquire((height, width), np.float32)
+    out = SCRATCH.acquire((height, width), np.uint8)
+    try:
+        np.subtract(gray, mean, out=work, dtype=np.float32)
+        work *= contrast
+        work += mean
+        np.clip(work, 0, 255, out=work)
+        np.rint(work, out=work)
+        np.copyto(out, work, casting='unsafe')
+        if height > 2 and width > 2:
+            # 3x3 sharpen kernel: 32 at the centre, -2 around it, divided by 16
+            sharp = SCRATCH.acquire((height - 2, width - 2), np.float32)
+            try:
+                np.multiply(work[1:-1, 1:-1], 32, out=sharp)
+                for dy in range(3):
+                    for dx in range(3):
+                        if dy != 1 or dx != 1:
+                            neighbour = work[dy:height - 2 + dy, dx:width - 2 + dx]
+                            sharp -= neighbour
+                            sharp -= neighbour
+                sharp /= 16
+                np.clip(sharp, 0, 255, out=sharp)
+                np.rint(sharp, out=sharp)
+                np.copyto(out[1:-1, 1:-1], sharp, casting='unsafe')
+            finally:
+                SCRATCH.release(sharp)
+        yield out
+    finally:
+        SCRATCH.release(work, out)
+
+@contextmanager
+def measure_memory(trace: bool = True) -> Iterator[Dict]:
+    """Measure the buffers allocated and the peak traced memory of a block.
+
+    Args:
+        trace: Whether to trace the peak with tracemalloc, which slows
+            allocations down; buffer counts are always measured.
+
+    Yields:
+        Dict filled on exit with the 'decoded', 'derived', 'scratch_allocated'
+        and 'scratch_reused' buffer counts and 'peak_bytes' (None when not traced).
+    """
+    with _counters_lock:
+        start = dict(_counters)
+    started = trace and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    if trace:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    report: Dict = {}
+    try:
+        yield report
+    finally:
+        report['peak_bytes'] = tracemalloc.get_traced_memory()[1] - base if trace else None
+        if started:
+            tracemalloc.stop()
+        with _counters_lock:
+            report.update({name: _counters[name] - start[name] for name in _counters})
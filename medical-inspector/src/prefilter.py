@@ -0,0 +1,155 @@
+"""Local pre-classification heuristics for the Comparateur_PDF project."""
+
+import functools
+import os
+import random
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
+from pyzbar.pyzbar import decode, ZBarSymbol
+from .config import (
+    PREFILTER_MIN_CONFIDENCE, PREFILTER_AUDIT_RATE, PREFILTER_THUMBNAIL_SIZE,
+    PREFILTER_REFERENCE_DIR, PREFILTER_PHASH_MAX_DISTANCE, PREFILTER_FILENAME_RULES,
+    ALLOWED_EXTENSIONS
+)
+from .pixels import ImageLike, as_pixels
+from .processing import classify_image, perceptual_hash, hamming_distance
+
+LINEAR_SYMBOLS = [
+    ZBarSymbol.CODE128, ZBarSymbol.CODE39, ZBarSymbol.CODE93, ZBarSymbol.EAN13,
+    ZBarSymbol.EAN8, ZBarSymbol.UPCA, ZBarSymbol.UPCE, ZBarSymbol.I25, ZBarSymbol.DATABAR,
+]
+
+_FILENAME_RULES = [(re.compile(pattern, re.IGNORECASE), label) for pattern, label in PREFILTER_FILENAME_RULES]
+
+def _classify_by_filename(filename: str) -> Optional[Tuple[str, float]]:
+    """Assign a type from device keywords in the file name."""
+    for pattern, label in _FILENAME_RULES:
+        if pattern.search(filename):
+            return label, 0.95
+    return None
+
+def _classify_by_barcodes(image: ImageLike) -> Optional[Tuple[str, float]]:
+    """Assign the electrode type when a thumbnail shows two or more 1D barcodes."""
+    thumbnail = as_pixels(image).thumbnail(PREFILTER_THUMBNAIL_SIZE, gray=True)
+    if len(decode(thumbnail, symbols=LINEAR_SYMBOLS)) >= 2:
+        return 'Electrodes', 0.9
+    return None
+
+@functools.lru_cache(maxsize=None)
+def load_reference_hashes(reference_dir: str = PREFILTER_REFERENCE_DIR) -> List[Tuple[int, str]]:
+    """Hash the known device photos, stored in one sub-folder per device type.
+
+    Cached for the process rather than by Streamlit, as it is also called
+    by the background completion, outside of any script run.
+
+    Args:
+        reference_dir: Folder holding the reference photos.
+
+    Returns:
+        List of (perceptual hash, device type) pairs.
+    """
+    references = []
+    if not os.path.isdir(reference_dir):
+        return references
+    for label in sorted(os.listdir(reference_dir)):
+        label_dir = os.path.join(reference_dir, label)
+        if not os.path.isdir(label_dir):
+            continue
+        for name in sorted(os.listdir(label_dir)):
+            if name.rsplit('.', 1)[-1].lower() not in ALLOWED_EXTENSIONS:
+                continue
+            with Image.open(os.path.join(label_dir, name)) as ref:
+                references.append((perceptual_hash(ref), label))
+    return references
+
+def _classify_by_reference(image: ImageLike) -> Optional[Tuple[str, float]]:
+    """Assign the type of the closest known device photo, if close enough."""
+    references = load_reference_hashes()
+    if not references:
+        return None
+    image_hash = perceptual_hash(image)
+    distance, label = min((hamming_distance(image_hash, ref), label) for ref, label in references)
+    if distance <= PREFILTER_PHASH_MAX_DISTANCE:
+        return label, 1 - distance / 64
+    return None
+
+def prefilter_image(image: ImageLike, filename: str) -> Optional[Dict]:
+    """Try to classify an image with cheap local heuristics.
+
+    Args:
+        image: The image to classify.
+        filename: Original name of the uploaded file.
+
+    Returns:
+        Classification with 'class', 'confidence' and 'source' keys, or None
+        if no heuristic is confident enough.
+    """
+    heuristics = (
+        ('filename', lambda: _classify_by_filename(filename)),
+        ('barcode', lambda: _classify_by_barcodes(image)),
+        ('phash', lambda: _classify_by_reference(image)),
+    )
+    for source, heuristic in heuristics:
+        found = heuristic()
+        if found and found[1] >= PREFILTER_MIN_CONFIDENCE:
+            return {'class': found[0], 'confidence': found[1], 'source': source}
+    return None
+
+# Classification workers share the counters of a batch
+_stats_lock = threading.Lock()
+
+def _count(stats: Dict, name: str, key: Optional[str] = None) -> None:
+    """Increment a counter of the stats, or one of the counters of a breakdown such as 'by_source'."""
+    with _stats_lock:
+        if key is None:
+            stats[name] += 1
+        else:
+            stats[name][key] = stats[name].get(key, 0) + 1
+
+def new_prefilter_stats() -> Dict:
+    """Return empty pre-classification counters."""
+    return {'total': 0, 'short_circuited': 0, 'by_source': {}, 'audited': 0, 'agreed': 0}
+
+def classify_with_prefilter(client, image: ImageLike, image_path: str, filename: str,
+                            stats: Optional[Dict] = None) -> Dict:
+    """Classify an image, skipping the remote model when a local heuristic is confident.
+
+    A fraction of short-circuited images is still sent to the remote model
+    to measure how often the heuristics agree with it; the remote answer is
+    used for those images.
+
+    Args:
+        client: Initialized InferenceHTTPClient.
+        image: The image to classify.
+        image_path: Path to the image file.
+        filename: Original name of the uploaded file.
+        stats: Counters updated in place, see new_prefilter_stats.
+
+    Returns:
+        Classification results, in the format of classify_image.
+    """
+    stats = stats if stats is not None else new_prefilter_stats()
+    _count(stats, 'total')
+    local = prefilter_image(image, filename)
+    if local is None:
+        return classify_image(client, image_path)
+
+    _count(stats, 'by_source', local['source'])
+    if random.random() < PREFILTER_AUDIT_RATE:
+        remote = classify_image(client, image_path)
+        remote_classes = [
+            pred['class'] for pred in remote.get('predictions', [])
+            if pred['confidence'] > 0.3
+        ]
+        _count(stats, 'audited')
+        if remote_classes and remote_classes[0] == local['class']:
+            _count(stats, 'agreed')
+        # The remote answer was paid for, so it wins over the heuristic.
+        return remote
+    _count(stats, 'short_circuited')
+    return {
+        'predictions': [{'class': local['class'], 'confidence': local['confidence']}],
+        'prefilter': local['source']
+    }
@@ -1,12 +1,22 @@
 """Image and PDF processing functions for the Comparateur_PDF project."""
 
+import io
 import os
 import tempfile
+import time
+from contextlib import closing
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter, ExifTags
-from typing import Dict, List, Tuple, Optional
+from PIL import Image, ExifTags
+from typing import Callable, Dict, List, Tuple, Optional
 import pdfplumber
 import streamlit as st
+from .config import (
+    OCR_TIERED, OCR_FAST_MAX_SIDE, OCR_FAST_CANVAS_SIZE, OCR_FAST_ALLOWLIST, OCR_FAST_MIN_CONFIDENCE,
+    DEDUP_BURST_S, DEDUP_HASH_SIZE, DEDUP_MAX_DISTANCE, PDF_WORKERS, SCHEDULER_CLASSIFY_WORKERS, SCHEDULER_DECODE_WORKERS,
+    TRACE_MEMORY, BUDGET_ROI_MARGIN, INSPECTION_TIME_BUDGET_S
+)
+from .pixels import ImageLike, ImagePixels, as_pixels, measure_memory
+from .scheduler import Pipeline, Stage, merge_stage_stats, run_in_background
 
 def fix_orientation(img: Image.Image) -> Image.Image:
     """Adjust image orientation based on EXIF data.
@@ -33,18 +43,274 @@ def fix_orientation(img: Image.Image) -> Image.Image:
         pass  # Consider logging this in production
     return img
 
+def perceptual_hash(image: ImageLike, hash_size: int = 8) -> int:
+    """Compute the difference hash (dHash) of an image.
+
+    Args:
+        image: The image to hash.
+        hash_size: Width and height of the hash grid.
+
+    Returns:
+        The hash as an integer of hash_size * hash_size bits.
+    """
+    gray = as_pixels(image).gray_image().resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming_distance(hash_a: int, hash_b: int) -> int:
+    """Count the differing bits between two perceptual hashes."""
+    return bin(hash_a ^ hash_b).count('1')
+
+def _ocr_array(image: ImagePixels, max_side: Optional[int] = None) -> np.ndarray:
+    """Return the read-only array read by OCR, downscaled to max_side if set."""
+    return image.thumbnail(max_side) if max_side else image.array
+
+def _readtext_options(allowlist: Optional[str] = None, canvas_size: Optional[int] = None) -> Dict:
+    """Build the Reader.readtext keyword arguments of an OCR pass."""
+    options = {'paragraph': False}
+    if allowlist:
+        options['allowlist'] = allowlist
+    if canvas_size:
+        options['canvas_size'] = canvas_size
+    return options
+
+def sharpness(image: ImageLike, max_side: int = 512) -> float:
+    """Estimate image sharpness as the variance of its Laplacian.
+
+    Args:
+        image: The image to score.
+        max_side: Longest side of the thumbnail the score is computed on.
+
+    Returns:
+        Sharpness score, higher for sharper images.
+    """
+    pixels = as_pixels(image).thumbnail(max_side, gray=True).astype(np.float32)
+    laplacian = (
+        4 * pixels[1:-1, 1:-1]
+        - pixels[:-2, 1:-1] - pixels[2:, 1:-1] - pixels[1:-1, :-2] - pixels[1:-1, 2:]
+    )
+    return float(laplacian.var()) if laplacian.size else 0.0
+
+def group_near_duplicates(images: List[ImageLike], hash_size: int = DEDUP_HASH_SIZE,
+                          max_distance: int = DEDUP_MAX_DISTANCE,
+                          max_interval: Optional[float] = DEDUP_BURST_S) -> List[List[int]]:
+    """Group near-identical images of a burst by perceptual hash.
+
+    Labels of the same model look alike from one site to the next, so the
+    images of a batch holding several inspections are only grouped when
+    they were taken in the same burst: each within max_interval of the
+    previous shot of its group, by EXIF capture time. Images without a
+    capture time are then never grouped.
+
+    Args:
+        images: The images to group.
+        hash_size: Width and height of the perceptual hash grid.
+        max_distance: Maximum number of differing hash bits within a group.
+        max_interval: Longest time between two shots of a group, in seconds
+            (None: the images are of one inspection, grouped whatever their
+            capture times).
+
+    Returns:
+        Groups of image indices, in order of first appearance.
+    """
+    def same_burst(taken: Optional[float], last_taken: Optional[float]) -> bool:
+        if max_interval is None:
+            return True
+        return taken is not None and last_taken is not None and abs(taken - last_taken) <= max_interval
+
+    groups = []
+    for idx, image in enumerate(images):
+        pixels = as_pixels(image)
+        image_hash = perceptual_hash(pixels, hash_size)
+        for group in groups:
+            group_hash, last_taken, members = group
+            if same_burst(pixels.captured_at, last_taken) and hamming_distance(image_hash, group_hash) <= max_distance:
+                members.append(idx)
+                group[1] = pixels.captured_at
+                break
+        else:
+            groups.append([image_hash, pixels.captured_at, [idx]])
+    return [members for _, _, members in groups]
+
 @st.cache_data
-def process_ocr(_reader, image: Image.Image) -> List[Tuple]:
+def process_ocr(_reader, _image: ImagePixels, image_digest: str, max_side: Optional[int] = None,
+                allowlist: Optional[str] = None, canvas_size: Optional[int] = None) -> List[Tuple]:
     """Perform OCR on the given image.
 
     Args:
         _reader: Initialized EasyOCR reader (excluded from cache key).
-        image: The image to process.
+        _image: The image to process (excluded from cache key).
+        image_digest: Content hash of the image, keying the cache.
+        max_side: Downscale the image so its longest side fits, if set.
+        allowlist: Restrict recognition to these characters, if set.
+        canvas_size: Maximum size of the text detection canvas, if set.
 
     Returns:
         A list of tuples containing the recognized text and its position.
     """
-    return _reader.readtext(np.array(image))
+    return _readtext(_reader, _image, max_side, allowlist, canvas_size)
+
+def _readtext(reader, image: ImagePixels, max_side: Optional[int] = None,
+              allowlist: Optional[str] = None, canvas_size: Optional[int] = None) -> List[Tuple]:
+    """Perform OCR on the given image, without the cache of process_ocr."""
+    return reader.readtext(_ocr_array(image, max_side), **_readtext_options(allowlist, canvas_size))
+
+def _process_ocr_many(reader, images: List[ImagePixels], pool=None, max_side: Optional[int] = None,
+                      allowlist: Optional[str] = None, canvas_size: Optional[int] = None,
+                      cache: bool = True) -> List[List[Tuple]]:
+    """Perform OCR on several images, through the worker pool when one is given.
+
+    Without cache, results bypass the Streamlit cache of process_ocr, e.g.
+    for reads made outside of a script run.
+    """
+    if pool is None:
+        if not cache:
+            return [_readtext(reader, image, max_side, allowlist, canvas_size) for image in images]
+        return [process_ocr(reader, image, image.digest, max_side, allowlist, canvas_size) for image in images]
+    return pool.readtext_many(
+        [_ocr_array(image, max_side) for image in images],
+        **_readtext_options(allowlist, canvas_size)
+    )
+
+def new_ocr_stats() -> Dict:
+    """Return empty two-tier OCR counters."""
+    return {'fast_hits': 0, 'escalated': 0, 'full_hits': 0}
+
+def _text_region(image: ImagePixels, results: List[Tuple], read_side: int,
+                 margin: float = BUDGET_ROI_MARGIN) -> Optional[ImagePixels]:
+    """Crop the region of a photo holding the text found on a downscaled read.
+
+    Args:
+        image: The photo.
+        results: OCR results of the downscaled read.
+        read_side: Longest side of the downscaled read.
+        margin: Margin around the text, as a share of the photo sides.
+
+    Returns:
+        Full-resolution pixels of the region, or None if no text was found.
+    """
+    points = [point for result in results for point in result[0]]
+    if not points:
+        return None
+    width, height = image.size
+    scale = max(width, height) / read_side if max(width, height) > read_side else 1.0
+    xs, ys = [p[0] * scale for p in points], [p[1] * scale for p in points]
+    box = (
+        max(min(xs) - margin * width, 0), max(min(ys) - margin * height, 0),
+        min(max(xs) + margin * width, width), min(max(ys) + margin * height, height)
+    )
+    return ImagePixels(np.ascontiguousarray(image.crop(box)))
+
+def _run_ocr_tiers(reader, images: List[ImageLike], extractors: List[Callable[[List[Tuple]], Tuple]],
+                   tiered: bool, fast_max_side: int, stats: Dict, pool=None,
+                   escalation: str = 'full', timings: Optional[Dict[str, float]] = None,
+                   cache: bool = True) -> Tuple[List[Tuple[Optional[str], Optional[str]]], List[int]]:
+    """Run the OCR tiers of run_ocr_extraction_batch.
+
+    Args:
+        escalation: What images failing the fast tier go through: 'full'
+            (the whole photo at full resolution), 'roi' (the region of the
+            text found by the fast tier, at full resolution) or 'none'.
+        timings: Filled with the duration in seconds of each pass that
+            actually ran: 'fast', then 'full' or 'roi' for the escalation.
+        cache: Whether OCR results go through the Streamlit cache.
+        Other arguments: see run_ocr_extraction_batch.
+
+    Returns:
+        Serial number and date of each image, and the indices of the images
+        whose escalation was limited by the escalation mode.
+    """
+    images = [as_pixels(image) for image in images]
+    extracted = [(None, None)] * len(images)
+    pending = list(range(len(images)))
+    fast_results = []
+    timings = timings if timings is not None else {}
+    if (tiered or escalation != 'full') and images:
+        start = time.perf_counter()
+        fast_results = _process_ocr_many(
+            reader, images, pool, max_side=fast_max_side,
+            allowlist=OCR_FAST_ALLOWLIST, canvas_size=OCR_FAST_CANVAS_SIZE, cache=cache
+        )
+        timings['fast'] = time.perf_counter() - start
+        pending = []
+        for idx, results in enumerate(fast_results):
+            extracted[idx] = extractors[idx](results)
+            confidence = sum(r[2] for r in results) / len(results) if results else 0.0
+            if all(extracted[idx]) and confidence >= OCR_FAST_MIN_CONFIDENCE:
+                stats['fast_hits'] += 1
+            else:
+                stats['escalated'] += 1
+                pending.append(idx)
+
+    limited = pending if escalation != 'full' else []
+    if escalation == 'none':
+        pending = []
+    elif escalation == 'roi':
+        regions = {idx: _text_region(images[idx], fast_results[idx], fast_max_side) for idx in pending}
+        pending = [idx for idx in pending if regions[idx] is not None]
+        images = [regions.get(idx) or image for idx, image in enumerate(images)]
+
+    if not pending:
+        return extracted, limited
+    start = time.perf_counter()
+    full_results = _process_ocr_many(reader, [images[idx] for idx in pending], pool, cache=cache)
+    timings[escalation] = time.perf_counter() - start
+    for idx, results in zip(pending, full_results):
+        serial, date = extractors[idx](results)
+        if serial and date:
+            stats['full_hits'] += 1
+        extracted[idx] = (serial or extracted[idx][0], date or extracted[idx][1])
+    return extracted, limited
+
+def run_ocr_extraction_batch(reader, images: List[ImageLike],
+                             extractors: List[Callable[[List[Tuple]], Tuple]],
+                             tiered: bool = OCR_TIERED, fast_max_side: int = OCR_FAST_MAX_SIDE,
+                             stats: Optional[Dict] = None,
+                             pool=None) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Run OCR on several images and extract their serial numbers and dates.
+
+    The fast tier reads downscaled images restricted to serial and date
+    characters. Only images whose fast result is not confident enough, or
+    whose extractor cannot find both a serial and a date, go through the
+    full-resolution default pass.
+
+    Args:
+        reader: Initialized EasyOCR reader.
+        images: The images to process.
+        extractors: The extract_important_info_* function of each image.
+        tiered: Whether to try the fast tier first.
+        fast_max_side: Longest image side used by the fast tier.
+        stats: Counters updated in place, see new_ocr_stats.
+        pool: OcrWorkerPool spreading the images over processes, if any.
+
+    Returns:
+        Serial number and date of each image, in input order.
+    """
+    stats = stats if stats is not None else new_ocr_stats()
+    return _run_ocr_tiers(reader, images, extractors, tiered, fast_max_side, stats, pool)[0]
+
+def run_ocr_extraction(reader, image: ImageLike, extractor: Callable[[List[Tuple]], Tuple],
+                       tiered: bool = OCR_TIERED, fast_max_side: int = OCR_FAST_MAX_SIDE,
+                       stats: Optional[Dict] = None) -> Tuple[Optional[str], Optional[str]]:
+    """Run OCR on one image and extract its serial number and date.
+
+    See run_ocr_extraction_batch for the tiering.
+
+    Args:
+        reader: Initialized EasyOCR reader.
+        image: The image to process.
+        extractor: One of the extract_important_info_* functions.
+        tiered: Whether to try the fast tier first.
+        fast_max_side: Longest image side used by the fast tier.
+        stats: Counters updated in place, see new_ocr_stats.
+
+    Returns:
+        Serial number and date.
+    """
+    return run_ocr_extraction_batch(
+        reader, [image], [extractor], tiered, fast_max_side, stats
+    )[0]
 
 def classify_image(client, image_path: str) -> Dict:
     """Classify an image using the machine learning model.
@@ -74,106 +340,710 @@ def extract_text_from_pdf(uploaded_file) -> str:
             text += page.extract_text() or ""
     return text
 
-def process_uploaded_file(uploaded_file, progress_bar, status_text, error_container, i, total_files, client, reader):
-    """Process a single uploaded file."""
-    progress = (i + 1) / total_files
-    progress_bar.progress(progress)
+def _show_progress(progress_bar, status_text, i: int, total_files: int, name: str) -> None:
+    """Display the progress of the upload processing."""
+    progress_bar.progress((i + 1) / total_files)
     status_text.markdown(
         f"""
         <div style="padding: 1rem; background: rgba(0,102,153,0.05); border-radius: 8px;">
-            🔍 Analyse du fichier {i+1}/{total_files} : <strong>{uploaded_file.name}</strong>
+            🔍 Analyse du fichier {i+1}/{total_files} : <strong>{name}</strong>
         </div>
         """,
         unsafe_allow_html=True
     )
 
-    if uploaded_file.type == "application/pdf":
-        text = extract_text_from_pdf(uploaded_file)
-        if 'rapport de vérification' in uploaded_file.name.lower():
-            from .extraction import extract_rvd_data
-            st.session_state.processed_data['RVD'] = extract_rvd_data(text)
-            st.success(f"RVD traité : {uploaded_file.name}")
-        elif 'aed' in uploaded_file.name.lower():
-            from .extraction import extract_aed_g5_data, extract_aed_g3_data
-            if st.session_state.dae_type == "G5":
-                st.session_state.processed_data['AEDG5'] = extract_aed_g5_data(text)
-            else:
-                st.session_state.processed_data['AEDG3'] = extract_aed_g3_data(text)
-            st.success(f"Rapport AED {st.session_state.dae_type} traité : {uploaded_file.name}")
+def _streamlit_messages(error_container) -> Callable[[str, str], None]:
+    """Route pipeline messages to Streamlit, errors going to the error container."""
+    def on_message(level: str, text: str) -> None:
+        if level == 'error':
+            error_container.error(text)
+        elif level == 'warning':
+            st.warning(text)
+        else:
+            st.success(text)
+    return on_message
+
+def _ignore_message(level: str, text: str) -> None:
+    """Discard a pipeline message."""
+
+def load_uploaded_image(uploaded_file) -> Image.Image:
+    """Open an uploaded image, upright and in RGB.
+
+    Args:
+        uploaded_file: The uploaded image file.
+
+    Returns:
+        The decoded image.
+    """
+    image = Image.open(uploaded_file)
+    image.load()
+    image = fix_orientation(image)
+    return image if image.mode == 'RGB' else image.convert('RGB')
+
+def load_uploaded_pixels(uploaded_file) -> ImagePixels:
+    """Decode an uploaded image once into the pixels shared by the pipeline stages.
+
+    Args:
+        uploaded_file: The uploaded image file.
+
+    Returns:
+        The read-only decoded pixels.
+    """
+    return ImagePixels.from_image(load_uploaded_image(uploaded_file))
+
+def decode_images(named_files: List[Tuple[str, object]], workers: int = SCHEDULER_DECODE_WORKERS,
+                  on_message: Optional[Callable[[str, str], None]] = None) -> List[Tuple[str, ImagePixels]]:
+    """Decode uploaded images in parallel.
+
+    Args:
+        named_files: (file name, file path or file-like object) pairs.
+        workers: Images decoded at the same time.
+        on_message: Called with 'error' and a message for each unreadable image.
+
+    Returns:
+        (file name, decoded pixels) pairs of the readable images, in input order.
+    """
+    on_message = on_message or _ignore_message
+    pipeline = Pipeline([Stage('decode', lambda item: (item[0], load_uploaded_pixels(item[1])), workers)])
+    decoded = [None] * len(named_files)
+    for index, item, error in pipeline.run(named_files):
+        if error is not None:
+            on_message('error', f"Erreur lors de la lecture de {named_files[index][0]} : {error}")
+        else:
+            decoded[index] = item
+    return [item for item in decoded if item is not None]
+
+def classify_uploaded_image(client, image: ImageLike, filename: str, use_prefilter: bool = True,
+                            prefilter_stats: Optional[Dict] = None) -> List[str]:
+    """Classify an image, through the local prefilter when enabled.
+
+    Args:
+        client: Initialized InferenceHTTPClient.
+        image: The decoded image.
+        filename: Original name of the uploaded file.
+        use_prefilter: Whether to try local heuristics before the remote model.
+        prefilter_stats: Prefilter counters updated in place.
+
+    Returns:
+        Detected classes above the confidence threshold, best first.
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
+        as_pixels(image).to_image().save(temp_file, format='JPEG')
+        temp_file_path = temp_file.name
+    try:
+        if use_prefilter:
+            from .prefilter import classify_with_prefilter
+            result = classify_with_prefilter(client, image, temp_file_path, filename, prefilter_stats)
         else:
-            st.warning(f"Type de PDF non reconnu : {uploaded_file.name}")
-    else:
-        image = Image.open(uploaded_file)
-        image = fix_orientation(image)
-        image = image.convert('RGB')
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            image.save(temp_file, format='JPEG')
-            temp_file_path = temp_file.name
-        try:
-            from .extraction import (
-                extract_important_info_g3, extract_important_info_g5,
-                extract_important_info_batterie, extract_important_info_electrodes
-            )
             result = classify_image(client, temp_file_path)
-            detected_classes = [
-                pred['class'] for pred in result.get('predictions', [])
-                if pred['confidence'] > 0.3
-            ]
-            
+    finally:
+        if os.path.exists(temp_file_path):
+            os.unlink(temp_file_path)
+    return [
+        pred['class'] for pred in result.get('predictions', [])
+        if pred['confidence'] > 0.3
+    ]
+
+def ocr_extractor(image_type: str) -> Optional[Callable[[List[Tuple]], Tuple]]:
+    """Return the OCR extraction function of an image type, if it is read by OCR."""
+    from .extraction import (
+        extract_important_info_g3, extract_important_info_g5, extract_important_info_batterie
+    )
+    if "Defibrillateur" in image_type:
+        return extract_important_info_g3 if "G3" in image_type else extract_important_info_g5
+    if "Batterie" in image_type:
+        return extract_important_info_batterie
+    return None
+
+# Types given to images whose processing failed
+IMAGE_ERROR_TYPES = ('Erreur de classification', 'Erreur de traitement')
+
+def _record_image_error(img_data: Dict, filename: str, on_message: Callable, error: Exception) -> None:
+    """Flag an image whose processing failed and report the error."""
+    if isinstance(error, ValueError):
+        on_message('error', f"Erreur de valeur lors de la classification de {filename} : {error}")
+        img_data['type'] = IMAGE_ERROR_TYPES[0]
+    else:
+        on_message('error', f"Erreur inattendue lors du traitement de {filename} : {error}")
+        img_data['type'] = IMAGE_ERROR_TYPES[1]
+    img_data['serial'], img_data['date'] = None, None
+
+def new_memory_stats() -> Dict:
+    """Return empty image memory counters, see pixels.measure_memory."""
+    return {
+        'images': 0, 'decoded': 0, 'derived': 0, 'scratch_allocated': 0, 'scratch_reused': 0,
+        'peak_bytes': None,
+    }
+
+def _merge_memory_stats(total: Dict, memory: Dict, images: int) -> None:
+    """Add the memory measured on a batch to running totals; peak_bytes keeps the largest batch peak."""
+    total['images'] += images
+    for name in ('decoded', 'derived', 'scratch_allocated', 'scratch_reused'):
+        total[name] += memory[name]
+    if memory['peak_bytes'] is not None:
+        total['peak_bytes'] = max(total['peak_bytes'] or 0, memory['peak_bytes'])
+
+def new_pipeline_stats() -> Dict:
+    """Return empty counters for every stage of the image pipeline."""
+    from .budget import new_budget_stats
+    from .prefilter import new_prefilter_stats
+    return {
+        'prefilter': new_prefilter_stats(),
+        'ocr': new_ocr_stats(),
+        'dedup': {'images': 0, 'groups': 0},
+        'stages': {},
+        'memory': new_memory_stats(),
+        'budget': new_budget_stats(),
+    }
+
+def complete_provisional(named_images: List[Tuple[str, ImagePixels]], results: List[Dict],
+                         client, reader, **options) -> Tuple[List[Tuple[Dict, Dict]], List[Tuple[str, str]]]:
+    """Compute provisional image results again at full quality.
+
+    Runs outside of any Streamlit script run: it makes no st call, OCR
+    results bypass the Streamlit cache, and the provisional results, still
+    shown by the page, are left untouched. The caller swaps in the final
+    results on its next rerun.
+
+    Args:
+        named_images: (file name, pixels) of each provisional result.
+        results: The provisional results, flagged 'provisional'.
+        client: Initialized InferenceHTTPClient.
+        reader: Initialized EasyOCR reader.
+        **options: Options of analyze_images.
+
+    Returns:
+        (provisional, final) result pairs, and the (level, message) pairs
+        reported on the way, to be shown by the caller.
+    """
+    from .records import ImageResult
+
+    messages = []
+    final = analyze_images(named_images, client, reader, dedup=False, ocr_cache=False,
+                           on_message=lambda level, message: messages.append((level, message)),
+                           **options)
+    pairs = []
+    for img_data, final_data in zip(results, final):
+        completed = ImageResult(img_data)
+        completed.pop('provisional', None)
+        completed.update({key: final_data[key] for key in ('type', 'serial', 'date')})
+        pairs.append((img_data, completed))
+    return pairs, messages
+
+def analyze_images(named_images: List[Tuple[str, ImageLike]], client, reader,
+                   use_prefilter: bool = True, dedup: bool = True,
+                   dedup_interval: Optional[float] = DEDUP_BURST_S,
+                   ocr_tiered: bool = OCR_TIERED, ocr_fast_max_side: int = OCR_FAST_MAX_SIDE,
+                   ocr_pool=None, ocr_cache: bool = True, stats: Optional[Dict] = None,
+                   on_progress: Optional[Callable[[int, str], None]] = None,
+                   on_message: Optional[Callable[[str, str], None]] = None,
+                   journal=None, budget=None) -> List[Dict]:
+    """Run the image pipeline on a batch of decoded images.
+
+    Every stage reads the same read-only pixels of each photo. Near-duplicate
+    photos of a burst are grouped first and only the sharpest photo of each group is
+    processed, its result standing for the whole group. Images then flow through a pipeline of classification, OCR and barcode
+    stages, so the remote classification of an image overlaps with the OCR
+    of the previous ones. OCR is spread over the worker pool when one is given.
+    With a checkpoint journal, the classification and final result of each
+    image are recorded as they complete, and images already recorded by an
+    interrupted run skip the stages they completed.
+    With a time budget, each step of an image runs at the best quality tier
+    the remaining time allows, or is deferred. Such results are flagged
+    'provisional' and computed again at full quality in the background.
+
+    Args:
+        named_images: (file name, decoded image or pixels) pairs.
+        client: Initialized InferenceHTTPClient.
+        reader: Initialized EasyOCR reader.
+        use_prefilter: Whether to try local heuristics before the remote model.
+        dedup: Whether to group near-duplicate photos.
+        dedup_interval: Longest time between two grouped shots, see
+            group_near_duplicates (None: the batch is one inspection).
+        ocr_tiered: Whether to try the fast OCR tier first.
+        ocr_fast_max_side: Longest image side used by the fast OCR tier.
+        ocr_pool: OcrWorkerPool used for the OCR stage, if any.
+        ocr_cache: Whether OCR results go through the Streamlit cache.
+        stats: Counters updated in place, see new_pipeline_stats.
+        on_progress: Called with the number of images done and the current file name.
+        on_message: Called with a level ('success', 'warning' or 'error') and a message.
+        journal: CheckpointJournal the stage outputs are recorded in and
+            resumed from, if any.
+        budget: budget.TimeBudget of the inspection, if any. Its completion
+            is set to the Future of the background completion, if one is needed.
+
+    Returns:
+        One image result (records.ImageResult) per group of near-duplicate
+        photos, in upload order.
+    """
+    from .budget import COSTS, megapixels, new_budget_stats
+    from .extraction import extract_important_info_electrodes
+    from .records import ImageResult
+
+    stats = stats if stats is not None else new_pipeline_stats()
+    on_message = on_message or _ignore_message
+    ocr_options = {
+        'tiered': ocr_tiered, 'fast_max_side': ocr_fast_max_side, 'stats': stats['ocr'], 'cache': ocr_cache
+    }
+    ocr_workers = ocr_pool.workers if ocr_pool is not None else 1
+
+    def jobs():
+        for members in groups:
+            best = max(members, key=lambda idx: sharpness(pixels[idx])) if len(members) > 1 else members[0]
+            filename = named_images[best][0]
             # Always create img_data, even if no classification
-            img_data = {
-                'type': detected_classes[0] if detected_classes else 'Non classifié',
-                'serial': None,
-                'date': None,
-                'image': image
+            img_data = ImageResult(
+                type='Non classifié', serial=None, date=None,
+                image=pixels[best].array, filename=filename
+            )
+            if len(members) > 1:
+                img_data['duplicates'] = [named_images[idx][0] for idx in members if idx != best]
+            job = {
+                'img_data': img_data, 'pixels': pixels[best], 'members': len(members),
+                'classified': False, 'error': None, 'resumed': False, 'provisional': False,
+                'messages': []
             }
-            
-            # Process further if classified
+            recorded = journal.get(filename, pixels[best].digest, 'image') if journal is not None else None
+            if recorded is not None:
+                # The journal keeps the recorded entry; it is read, not consumed
+                job['classified'] = recorded['classified']
+                img_data.update({key: value for key, value in recorded.items() if key != 'classified'})
+                job['resumed'] = True
+            yield job
+
+    def tier(step: str, job: Dict, workers: int = 1) -> Optional[str]:
+        """Pick the quality tier of a step of an image; None defers it."""
+        if budget is None:
+            return 'full'
+        chosen = budget.choose(step, megapixels(job['pixels'].size), workers)
+        if chosen != 'full':
+            job['provisional'] = True
+        return chosen
+
+    def skip(step: str) -> None:
+        if budget is not None:
+            budget.skip(step)
+
+    def classify(job: Dict) -> Dict:
+        img_data = job['img_data']
+        if job['resumed']:
+            skip('classify')
+            return job
+        if journal is not None:
+            recorded = journal.get(img_data['filename'], job['pixels'].digest, 'classify')
+            if recorded is not None:
+                img_data['type'], job['classified'] = recorded['type'], recorded['classified']
+                skip('classify')
+                return job
+        if tier('classify', job, SCHEDULER_CLASSIFY_WORKERS) is None:
+            return job
+        try:
+            with COSTS.measure('classify', 'full', megapixels(job['pixels'].size)):
+                detected_classes = classify_uploaded_image(
+                    client, job['pixels'], img_data['filename'], use_prefilter, stats['prefilter']
+                )
             if detected_classes:
-                if "Defibrillateur" in detected_classes[0]:
-                    results = process_ocr(reader, image)
-                    if "G3" in detected_classes[0]:
-                        img_data['serial'], img_data['date'] = extract_important_info_g3(results)
-                    else:
-                        img_data['serial'], img_data['date'] = extract_important_info_g5(results)
-                elif "Batterie" in detected_classes[0]:
-                    results = process_ocr(reader, image)
-                    img_data['serial'], img_data['date'] = extract_important_info_batterie(results)
-                elif "Electrodes" in detected_classes[0]:
-                    img_data['serial'], img_data['date'] = extract_important_info_electrodes(image)
-                st.success(f"Image {detected_classes[0]} traitée : {uploaded_file.name}")
-            else:
-                st.warning(f"Aucune classification trouvée pour : {uploaded_file.name}")
-            
-            # Always append the image data, classified or not
-            st.session_state.processed_data['images'].append(img_data)
-        
-        except ValueError as e:
-            error_container.error(
-                f"Erreur de valeur lors de la classification de {uploaded_file.name} : {e}"
+                img_data['type'] = detected_classes[0]
+            job['classified'] = bool(detected_classes)
+        except Exception as e:
+            job['error'] = e
+            return job
+        if journal is not None:
+            journal.record(img_data['filename'], job['pixels'].digest, 'classify',
+                           {'type': img_data['type'], 'classified': job['classified']})
+        return job
+
+    def read_ocr(job: Dict) -> Dict:
+        img_data = job['img_data']
+        extractor = ocr_extractor(img_data['type'])
+        if not (job['classified'] and extractor and not job['resumed']):
+            skip('ocr')
+            return job
+        ocr_tier = tier('ocr', job, ocr_workers)
+        if ocr_tier is None:
+            return job
+        try:
+            timings = {}
+            extracted, limited = _run_ocr_tiers(
+                reader, [job['pixels']], [extractor], pool=ocr_pool,
+                escalation={'full': 'full', 'roi': 'roi', 'fast': 'none'}[ocr_tier], timings=timings,
+                **ocr_options
             )
-            # Append image even on error, with an error type
-            img_data = {
-                'type': 'Erreur de classification',
-                'serial': None,
-                'date': None,
-                'image': image
-            }
-            st.session_state.processed_data['images'].append(img_data)
-        
+            # Each tier is costed only from reads that went through it: a fast hit
+            # during a 'full' read says nothing about the cost of the full pass
+            size = megapixels(job['pixels'].size)
+            if 'fast' in timings:
+                COSTS.observe('ocr', 'fast', size, timings['fast'])
+            for escalated in ('full', 'roi'):
+                if escalated in timings:
+                    COSTS.observe('ocr', escalated, size, timings.get('fast', 0.0) + timings[escalated])
+            img_data['serial'], img_data['date'] = extracted[0]
+            # A limited read only stays provisional if the fast tier was not enough
+            job['provisional'] = job['provisional'] and bool(limited)
+        except Exception as e:
+            job['error'] = e
+        return job
+
+    def read_barcode(job: Dict) -> Dict:
+        img_data = job['img_data']
+        if not (job['classified'] and job['error'] is None and not job['resumed']
+                and "Electrodes" in img_data['type']):
+            skip('barcode')
+            return job
+        if tier('barcode', job) is None:
+            return job
+        try:
+            with COSTS.measure('barcode', 'full', megapixels(job['pixels'].size)):
+                img_data['serial'], img_data['date'] = extract_important_info_electrodes(
+                    job['pixels'], on_message=lambda level, message: job['messages'].append((level, message))
+                )
         except Exception as e:
-            error_container.error(
-                f"Erreur inattendue lors du traitement de {uploaded_file.name} : {e}"
+            job['error'] = e
+        return job
+
+    pipeline = Pipeline([
+        Stage('classify', classify, workers=SCHEDULER_CLASSIFY_WORKERS),
+        Stage('ocr', read_ocr, workers=ocr_workers),
+        Stage('barcode', read_barcode),
+    ])
+    with measure_memory(trace=TRACE_MEMORY) as memory:
+        # Every stage reads the same decoded pixels; PIL images are converted once here
+        pixels = [as_pixels(image) for _, image in named_images]
+        if dedup:
+            groups = group_near_duplicates(pixels, max_interval=dedup_interval)
+        else:
+            groups = [[idx] for idx in range(len(named_images))]
+        stats['dedup']['images'] += len(named_images)
+        stats['dedup']['groups'] += len(groups)
+        if budget is not None:
+            for step in ('classify', 'ocr', 'barcode'):
+                budget.plan(step, len(groups))
+
+        results = [None] * len(groups)
+        provisional = []
+        done = 0
+        # Stages run in worker threads; progress and messages are reported from here.
+        # The run is closed on error, so its threads stop instead of blocking on full queues
+        with closing(pipeline.run(jobs())) as outputs:
+            for index, job, error in outputs:
+                if error is not None:
+                    raise error
+                img_data = job['img_data']
+                filename = img_data['filename']
+                done += job['members']
+                if on_progress:
+                    on_progress(done, filename)
+                for level, message in job['messages']:
+                    on_message(level, message)
+                if job['error'] is not None:
+                    _record_image_error(img_data, filename, on_message, job['error'])
+                elif job['provisional']:
+                    # Not journaled: a resumed run computes it again at full quality
+                    img_data['provisional'] = True
+                    provisional.append((index, job))
+                else:
+                    if journal is not None and not job['resumed']:
+                        journal.record(filename, job['pixels'].digest, 'image', {
+                            'type': img_data['type'], 'serial': img_data['serial'], 'date': img_data['date'],
+                            'classified': job['classified']
+                        })
+                    if job['classified']:
+                        on_message('success', f"Image {img_data['type']} traitée : {filename}")
+                    elif img_data['type'] == 'Non classifié':
+                        on_message('warning', f"Aucune classification trouvée pour : {filename}")
+                # Always keep the image data, classified or not
+                results[index] = img_data
+    merge_stage_stats(stats.setdefault('stages', {}), pipeline.stats)
+    _merge_memory_stats(stats.setdefault('memory', new_memory_stats()), memory, len(named_images))
+    if budget is not None:
+        budget.report(stats.setdefault('budget', new_budget_stats()), len(provisional))
+        if provisional:
+            budget.completion = run_in_background(
+                lambda: complete_provisional(
+                    [(job['img_data']['filename'], job['pixels']) for _, job in provisional],
+                    [job['img_data'] for _, job in provisional],
+                    client, reader,
+                    use_prefilter=use_prefilter, ocr_tiered=ocr_tiered, ocr_fast_max_side=ocr_fast_max_side,
+                    ocr_pool=ocr_pool
+                ),
+                detached=True
             )
-            # Append image even on unexpected errors
-            img_data = {
-                'type': 'Erreur de traitement',
-                'serial': None,
-                'date': None,
-                'image': image
-            }
-            st.session_state.processed_data['images'].append(img_data)
-        
-        finally:
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+    return results
+
+def analyze_pdf(uploaded_file, filename: str, dae_type: str,
+                page_workers: Optional[int] = PDF_WORKERS) -> List[Tuple[str, Dict]]:
+    """Extract the data of the reports held in a PDF.
+
+    Pages are routed by their content, so a merged PDF yields each of its
+    reports. Documents without any recognized page are routed by file name.
+    AED reports are parsed once for their detected generation and also
+    returned as a unified record under the 'AED' slot.
+
+    Args:
+        uploaded_file: The PDF file (path or file-like object).
+        filename: Original name of the uploaded file.
+        dae_type: AED generation ("G5" or "G3") used when it cannot be detected.
+        page_workers: Processes extracting the pages of large documents.
+
+    Returns:
+        The processed_data slot ('RVD', 'AEDG5', 'AEDG3' or 'AED') and the
+        extracted data of each report found; empty if the PDF is not recognized.
+    """
+    from .extraction import extract_rvd_data, detect_aed_generation, parse_aed_report
+    from .pdf_split import extract_page_texts, split_reports
+
+    page_texts = extract_page_texts(uploaded_file, workers=page_workers)
+    reports = [(slot, text) for slot, _, text in split_reports(page_texts)]
+    if not reports:
+        text = "\n".join(page_texts)
+        if 'rapport de vérification' in filename.lower():
+            reports = [('RVD', text)]
+        elif 'aed' in filename.lower():
+            reports = [(f'AED{detect_aed_generation(text) or dae_type}', text)]
+
+    results = []
+    for slot, text in reports:
+        if slot == 'RVD':
+            results.append((slot, extract_rvd_data(text)))
+        else:
+            record = parse_aed_report(text, slot[-2:])
+            results.extend([(slot, record['raw']), ('AED', record)])
+    return results
+
+def _analyze_pdf_source(source, filename: str, dae_type: str) -> bytes:
+    """Analyze one PDF inside a worker process, its pages read sequentially.
+
+    Returns:
+        The reports found (see analyze_pdf), packed with records.pack.
+    """
+    from .records import pack
+    return pack(analyze_pdf(io.BytesIO(source) if isinstance(source, bytes) else source, filename, dae_type,
+                            page_workers=1))
+
+def _source_digest(source) -> str:
+    """Return the SHA-256 of a PDF given by its content or by a path, memory-mapped."""
+    from .checkpoint import content_digest
+    if isinstance(source, bytes):
+        return content_digest(source)
+    from .spool import map_file
+    with map_file(source) as content:
+        return content_digest(content)
+
+def analyze_pdfs(named_pdfs: List[Tuple[str, object]], dae_type: str,
+                 workers: Optional[int] = PDF_WORKERS,
+                 journal=None) -> List[Tuple[str, List[Tuple[str, Dict]], Optional[Exception]]]:
+    """Analyze several PDFs, one worker process per document.
+
+    Args:
+        named_pdfs: (file name, content or file path) of each PDF; files are
+            memory-mapped by the process reading them instead of being copied.
+        dae_type: AED generation used when it cannot be detected.
+        workers: Number of worker processes (None: one per core).
+        journal: CheckpointJournal the reports of each PDF are recorded in
+            and resumed from, if any.
+
+    Returns:
+        File name, reports found (see analyze_pdf) and error, if any, of each PDF.
+    """
+    digests = [_source_digest(source) for _, source in named_pdfs] if journal is not None else []
+    resumed = {}
+    for idx, (name, _) in enumerate(named_pdfs):
+        output = journal.get(name, digests[idx], 'pdf') if journal is not None else None
+        if output is not None:
+            resumed[idx] = [tuple(report) for report in output]
+
+    def done(idx: int, reports: List[Tuple[str, Dict]]) -> Tuple[str, List[Tuple[str, Dict]], None]:
+        if journal is not None:
+            journal.record(named_pdfs[idx][0], digests[idx], 'pdf', reports)
+        return named_pdfs[idx][0], reports, None
+
+    pending = [idx for idx in range(len(named_pdfs)) if idx not in resumed]
+    workers = min(workers or os.cpu_count() or 1, len(pending))
+    results = {idx: (named_pdfs[idx][0], reports, None) for idx, reports in resumed.items()}
+    if workers < 2:
+        for idx in pending:
+            name, source = named_pdfs[idx]
+            try:
+                results[idx] = done(idx, analyze_pdf(
+                    io.BytesIO(source) if isinstance(source, bytes) else source, name, dae_type
+                ))
+            except Exception as e:
+                results[idx] = (name, [], e)
+        return [results[idx] for idx in range(len(named_pdfs))]
+
+    from .pdf_split import get_pdf_executor
+    from .records import unpack
+    executor = get_pdf_executor(workers)
+    futures = [(idx, executor.submit(_analyze_pdf_source, named_pdfs[idx][1], named_pdfs[idx][0], dae_type))
+               for idx in pending]
+    for idx, future in futures:
+        try:
+            results[idx] = done(idx, [tuple(report) for report in unpack(future.result())])
+        except Exception as e:
+            results[idx] = (named_pdfs[idx][0], [], e)
+    return [results[idx] for idx in range(len(named_pdfs))]
+
+def _session_stats() -> Dict:
+    """Return the pipeline counters of the Streamlit session."""
+    from .budget import new_budget_stats
+    from .prefilter import new_prefilter_stats
+    return {
+        'prefilter': st.session_state.setdefault('prefilter_stats', new_prefilter_stats()),
+        'ocr': st.session_state.setdefault('ocr_stats', new_ocr_stats()),
+        'dedup': st.session_state.setdefault('dedup_stats', {'images': 0, 'groups': 0}),
+        'stages': st.session_state.setdefault('stage_stats', {}),
+        'memory': st.session_state.setdefault('memory_stats', new_memory_stats()),
+        'budget': st.session_state.setdefault('budget_stats', new_budget_stats()),
+    }
+
+def process_uploaded_images(uploaded_files, progress_bar, status_text, error_container, first_index,
+                            total_files, client, reader, ocr_pool=None):
+    """Process uploaded images as a batch.
+
+    Args:
+        uploaded_files: The uploaded image files.
+        progress_bar: Streamlit progress bar.
+        status_text: Placeholder for the current file name.
+        error_container: Placeholder for error messages.
+        first_index: Position of the first image among all uploaded files.
+        total_files: Number of uploaded files.
+        client: Initialized InferenceHTTPClient.
+        reader: Initialized EasyOCR reader.
+        ocr_pool: OcrWorkerPool used for the OCR stage, if any.
+    """
+    named_images = [(f.name, load_uploaded_image(f)) for f in uploaded_files]
+    st.session_state.processed_data['images'].extend(analyze_images(
+        named_images, client, reader,
+        use_prefilter=st.session_state.get('enable_prefilter', True),
+        dedup=st.session_state.get('enable_dedup', True),
+        ocr_tiered=st.session_state.get('ocr_tiered', OCR_TIERED),
+        ocr_fast_max_side=st.session_state.get('ocr_fast_max_side', OCR_FAST_MAX_SIDE),
+        ocr_pool=ocr_pool,
+        stats=_session_stats(),
+        on_progress=lambda done, name: _show_progress(
+            progress_bar, status_text, first_index + done - 1, total_files, name
+        ),
+        on_message=_streamlit_messages(error_container)
+    ))
+
+def process_uploaded_file(uploaded_file, progress_bar, status_text, error_container, i, total_files, client, reader):
+    """Process a single uploaded file."""
+    if uploaded_file.type != "application/pdf":
+        process_uploaded_images(
+            [uploaded_file], progress_bar, status_text, error_container, i, total_files, client, reader
+        )
+        return
+
+    _show_progress(progress_bar, status_text, i, total_files, uploaded_file.name)
+    from .inspections import add_reports, duplicate_report_message
+    reports = analyze_pdf(uploaded_file, uploaded_file.name, st.session_state.dae_type)
+    rejected = add_reports(st.session_state.processed_data, reports)
+    if rejected:
+        st.error(duplicate_report_message(uploaded_file.name, rejected))
+    for slot, data in reports:
+        if st.session_state.processed_data[slot] is not data:
+            continue
+        if slot == 'RVD':
+            st.success(f"RVD traité : {uploaded_file.name}")
+        elif slot == 'AED':
+            if data['generation'] != st.session_state.dae_type:
+                st.info(f"Génération détectée pour {uploaded_file.name} : {data['generation']}")
+        else:
+            st.success(f"Rapport AED {slot[-2:]} traité : {uploaded_file.name}")
+    if not reports:
+        st.warning(f"Type de PDF non reconnu : {uploaded_file.name}")
+
+def process_uploaded_inspections(uploaded_files, progress_bar, status_text, error_container,
+                                 client, reader, ocr_pool=None) -> List[Dict]:
+    """Process an upload holding one or several inspections.
+
+    PDFs are parsed in parallel worker processes while images are decoded
+    and go through the pipelined image stages; files are then grouped into
+    inspections by Code site and serial numbers, and each inspection is
+    compared. Stage outputs are checkpointed, so uploading the same files
+    again after an interruption resumes the run.
+    Images are processed within the time budget chosen in the session; when
+    some results are provisional, their background completion is kept in
+    st.session_state.background_completion with what is needed to group the
+    inspections again once it is done.
+
+    Args:
+        uploaded_files: The uploaded files, as spool.SpooledFile originals.
+        progress_bar: Streamlit progress bar.
+        status_text: Placeholder for the current file name.
+        error_container: Placeholder for error messages.
+        client: Initialized InferenceHTTPClient.
+        reader: Initialized EasyOCR reader.
+        ocr_pool: OcrWorkerPool used for the OCR stage, if any.
+
+    Returns:
+        Inspections returned by inspections.group_inspections.
+    """
+    from .budget import TimeBudget, provisional_message
+    from .checkpoint import CheckpointJournal, batch_job_id, resume_message
+    from .inspections import compare_inspections, group_inspections
+    budget = TimeBudget(st.session_state.get('time_budget', INSPECTION_TIME_BUDGET_S) or None)
+    on_message = _streamlit_messages(error_container)
+    pdf_files = [f for f in uploaded_files if f.type == "application/pdf"]
+    image_files = [f for f in uploaded_files if f.type != "application/pdf"]
+    total_files = len(uploaded_files)
+    journal = CheckpointJournal(batch_job_id(
+        [(f.name, f.digest) for f in uploaded_files], st.session_state.dae_type
+    ))
+
+    try:
+        # PDFs are parsed in the background while the images flow through their pipeline
+        pdf_future = run_in_background(
+            analyze_pdfs, [(f.name, f.path) for f in pdf_files], st.session_state.dae_type,
+            PDF_WORKERS, journal
+        ) if pdf_files else None
+
+        status_text.text(f"Lecture de {len(image_files)} image(s)...")
+        named_images = decode_images([(f.name, f.path) for f in image_files], on_message=on_message)
+        images = analyze_images(
+            named_images, client, reader,
+            use_prefilter=st.session_state.get('enable_prefilter', True),
+            dedup=st.session_state.get('enable_dedup', True),
+            ocr_tiered=st.session_state.get('ocr_tiered', OCR_TIERED),
+            ocr_fast_max_side=st.session_state.get('ocr_fast_max_side', OCR_FAST_MAX_SIDE),
+            ocr_pool=ocr_pool,
+            stats=_session_stats(),
+            on_progress=lambda done, name: _show_progress(
+                progress_bar, status_text, done - 1, total_files, name
+            ),
+            on_message=on_message,
+            journal=journal,
+            budget=budget
+        )
+
+        pdf_reports = []
+        if pdf_future is not None:
+            status_text.text(f"Lecture de {len(pdf_files)} rapport(s) PDF...")
+            for name, reports, error in pdf_future.result():
+                if error is not None:
+                    on_message('error', f"Erreur lors de la lecture de {name} : {error}")
+                elif not reports:
+                    on_message('warning', f"Type de PDF non reconnu : {name}")
+                pdf_reports.append((name, reports))
+    except BaseException:
+        journal.close()  # Keep the completed stages for the next attempt
+        raise
+    progress_bar.progress(1.0)
+    message = resume_message(journal.report())
+    if message:
+        st.info(message)
+    journal.finish()
+
+    provisional = sum(1 for img_data in images if img_data.get('provisional'))
+    message = provisional_message(provisional)
+    if message:
+        st.info(message)
+    if budget.completion is not None:
+        st.session_state.background_completion = {
+            'future': budget.completion, 'pdf_reports': pdf_reports, 'images': images,
+            'files': uploaded_files, 'provisional': provisional
+        }
+
+    inspections = group_inspections(pdf_reports, images, on_message)
+    compare_inspections(inspections, st.session_state.dae_type)
+    return inspections
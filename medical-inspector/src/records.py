@@ -0,0 +1,242 @@
+"""Typed result records for the Comparateur_PDF project.
+
+Results used to flow through the app as dicts: the fields extracted from
+the RVD, the unified AED record, the result of each image and the outcome
+of each field comparison. They are now slotted records with a fixed set of
+fields, which take a fraction of the memory of the equivalent dict and are
+serialized without repeating their keys.
+
+Records are read and written like the dicts they replace (indexing, get,
+update, pop, iteration), under the same keys, so code and stored data
+predating them keep working. A field that was never set is absent, as a
+missing dict key would be.
+
+Records cross process and disk boundaries (checkpoint journal, PDF worker
+results) as msgpack, each record packed as the positional values of its
+fields. Exports and the history store keep JSON, through plain() and
+json_default().
+"""
+
+from collections.abc import Mapping, MutableMapping
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+import msgpack
+
+# Record class of each msgpack extension type code, filled as records are declared
+_RECORD_TYPES: Dict[int, type] = {}
+
+class Record(MutableMapping):
+    """Slotted record read and written like a dict.
+
+    Subclasses declare FIELDS, the (key, attribute) pair of each field in
+    serialization order, a distinct msgpack extension CODE, and slots named
+    after the attributes.
+    """
+
+    __slots__ = ()
+    FIELDS: Tuple[Tuple[str, str], ...] = ()
+    # Fields kept in memory only, never serialized (e.g. decoded pixels)
+    TRANSIENT: frozenset = frozenset()
+    CODE: int = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.KEYS = tuple(key for key, _ in cls.FIELDS)
+        cls._ATTRS = dict(cls.FIELDS)
+        cls._SERIALIZED = tuple(
+            (key, attr) for key, attr in cls.FIELDS if key not in cls.TRANSIENT
+        )
+        if cls.CODE in _RECORD_TYPES:
+            raise TypeError(f"Extension code {cls.CODE} already used by {_RECORD_TYPES[cls.CODE].__name__}")
+        _RECORD_TYPES[cls.CODE] = cls
+
+    def __init__(self, data: Optional[Mapping] = None, **fields):
+        """
+        Args:
+            data: Initial fields, by key.
+            **fields: Initial fields whose keys are valid identifiers.
+        """
+        if data is not None:
+            self.update(data)
+        if fields:
+            self.update(fields)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, self._ATTRS[key])
+        except (KeyError, AttributeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        try:
+            attr = self._ATTRS[key]
+        except KeyError:
+            raise KeyError(f"{type(self).__name__} has no field {key!r}") from None
+        setattr(self, attr, value)
+
+    def __delitem__(self, key: str) -> None:
+        try:
+            delattr(self, self._ATTRS[key])
+        except (KeyError, AttributeError):
+            raise KeyError(key) from None
+
+    def __iter__(self) -> Iterator[str]:
+        for key, attr in self.FIELDS:
+            if hasattr(self, attr):
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _, attr in self.FIELDS if hasattr(self, attr))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def to_packed(self) -> list:
+        """Return the serialized fields as a list of values.
+
+        The first value is a bit mask of the fields present, the values of
+        the present fields follow in declaration order.
+        """
+        present, values = 0, []
+        for bit, (_, attr) in enumerate(self._SERIALIZED):
+            try:
+                values.append(getattr(self, attr))
+            except AttributeError:
+                continue
+            present |= 1 << bit
+        return [present, *values]
+
+    @classmethod
+    def from_packed(cls, packed: list) -> 'Record':
+        """Rebuild a record from the list returned by to_packed."""
+        record = cls()
+        present, values = packed[0], iter(packed[1:])
+        for bit, (_, attr) in enumerate(cls._SERIALIZED):
+            if present >> bit & 1:
+                setattr(record, attr, next(values))
+        return record
+
+class RvdFields(Record):
+    """Fields extracted from an RVD, keyed by the label they follow in the report."""
+
+    FIELDS = (
+        ("Commentaire fin d'intervention et recommandations", 'comment'),
+        ("Numéro de série DEFIBRILLATEUR", 'aed_serial'),
+        ("Date-Heure rapport vérification défibrillateur", 'report_datetime'),
+        ("Changement batterie", 'battery_changed'),
+        ("Changement électrodes adultes", 'adult_electrodes_changed'),
+        ("Code site", 'site_code'),
+        ("Numéro de série Batterie", 'battery_serial'),
+        ("Date mise en service BATTERIE", 'battery_install_date'),
+        ("Niveau de charge de la batterie en %", 'battery_level'),
+        ("N° série nouvelle batterie", 'new_battery_serial'),
+        ("Date mise en service", 'install_date'),
+        ("Niveau de charge nouvelle batterie", 'new_battery_level'),
+        ("Numéro de série ELECTRODES ADULTES", 'adult_electrodes_serial'),
+        ("Numéro de série ELECTRODES ADULTES relevé", 'adult_electrodes_serial_read'),
+        ("Numéro de série relevé 2", 'serial_read_2'),
+        ("Date fabrication DEFIBRILLATEUR", 'aed_manufacture_date'),
+        ("Date fabrication BATTERIE", 'battery_manufacture_date'),
+        ("Date fabrication relevée", 'manufacture_date_read'),
+        ("Date fabrication nouvelle batterie", 'new_battery_manufacture_date'),
+        ("Date de péremption ELECTRODES ADULTES", 'adult_electrodes_expiry'),
+        ("Date de péremption ELECTRODES ADULTES relevée", 'adult_electrodes_expiry_read'),
+        ("N° série nouvelles électrodes", 'new_electrodes_serial'),
+        ("Date péremption des nouvelles éléctrodes", 'new_electrodes_expiry'),
+    )
+    __slots__ = tuple(attr for _, attr in FIELDS)
+    CODE = 1
+
+class AedRecord(Record):
+    """Generation-independent record of an AED report, see extraction.build_aed_record."""
+
+    FIELDS = tuple((key, key) for key in (
+        'generation', 'serial', 'serial_norm', 'report_date', 'battery_install_date',
+        'battery_capacity', 'raw',
+    ))
+    __slots__ = tuple(attr for _, attr in FIELDS)
+    CODE = 2
+
+class ImageResult(Record):
+    """Result of the analysis of a photo, see processing.analyze_images."""
+
+    FIELDS = tuple((key, key) for key in (
+        'type', 'serial', 'date', 'image', 'filename', 'duplicates', 'provisional',
+    ))
+    __slots__ = tuple(attr for _, attr in FIELDS)
+    TRANSIENT = frozenset({'image'})
+    CODE = 3
+
+class FieldComparison(Record):
+    """Outcome of the comparison of a field of the RVD with another source.
+
+    The other value is held under 'aed' or 'image' depending on its source.
+    """
+
+    FIELDS = tuple((key, key) for key in (
+        'rvd', 'aed', 'image', 'match', 'confidence', 'errors', 'error', 'depends_on',
+    ))
+    __slots__ = tuple(attr for _, attr in FIELDS)
+    CODE = 4
+
+def _default(value: Any) -> Any:
+    """Pack records as extension types; other unknown values as text, as the JSON exports do."""
+    if isinstance(value, Record):
+        return msgpack.ExtType(value.CODE, pack(value.to_packed()))
+    return str(value)
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    """Rebuild the record packed in an extension type."""
+    record_type = _RECORD_TYPES.get(code)
+    if record_type is None:
+        return msgpack.ExtType(code, data)
+    return record_type.from_packed(unpack(data))
+
+def pack(value: Any) -> bytes:
+    """Serialize results, records included, to msgpack."""
+    return msgpack.packb(value, default=_default, use_bin_type=True)
+
+def unpack(data: bytes) -> Any:
+    """Deserialize results serialized by pack."""
+    return msgpack.unpackb(data, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+
+def read_packed(stream: BinaryIO) -> Tuple[List[Any], int]:
+    """Read the values packed one after the other in a binary stream.
+
+    Reading stops at the first torn or corrupt value, so a stream cut short
+    by a crash yields every value written before it.
+
+    Returns:
+        The values read and the length of the intact part of the stream.
+    """
+    unpacker = msgpack.Unpacker(stream, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+    values, intact = [], 0
+    try:
+        for value in unpacker:
+            values.append(value)
+            intact = unpacker.tell()
+    except (ValueError, msgpack.UnpackException):
+        pass
+    return values, intact
+
+def plain(value: Any) -> Any:
+    """Convert results to built-in containers, records becoming dicts without transient fields.
+
+    Args:
+        value: Record, or dict, list or tuple holding records.
+
+    Returns:
+        The same data made of dicts and lists only, e.g. for JSON or st.json.
+    """
+    if isinstance(value, Record):
+        return {key: plain(value[key]) for key, _ in value._SERIALIZED if key in value}
+    if isinstance(value, Mapping):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    return value
+
+def json_default(value: Any) -> Any:
+    """JSON encoder fallback: records as dicts, other unknown values as text."""
+    if isinstance(value, Record):
+        return plain(value)
+    return str(value)
@@ -0,0 +1,200 @@
+"""Pipelined stage scheduler for the Comparateur_PDF project.
+
+A pipeline is a chain of stages connected by bounded queues. Each stage
+has its own pool of worker threads, so an image waiting on the network in
+one stage overlaps with another image being read by OCR in the next; the
+bounded queues keep a fast stage from running far ahead of a slow one.
+CPU-heavy stages hand their work to worker processes (OCR pool) or to
+libraries releasing the GIL (torch, Pillow), so threads are enough here.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .config import SCHEDULER_POLL_S, SCHEDULER_QUEUE_SIZE
+
+_DONE = object()
+
+def _put(target: queue.Queue, task: Any, stop: threading.Event) -> bool:
+    """Put a task in a bounded queue unless the pipeline is stopped; tell whether it was put."""
+    while not stop.is_set():
+        try:
+            target.put(task, timeout=SCHEDULER_POLL_S)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(source: queue.Queue, stop: threading.Event) -> Any:
+    """Take a task from a queue, or _DONE once the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            return source.get(timeout=SCHEDULER_POLL_S)
+        except queue.Empty:
+            continue
+    return _DONE
+
+def _drain(source: queue.Queue) -> None:
+    """Drop the tasks left in a queue, releasing the items they hold."""
+    while True:
+        try:
+            source.get_nowait()
+        except queue.Empty:
+            return
+
+def _start_thread(target: Callable, *args, attach: bool = True) -> None:
+    """Start a daemon thread, attached to the Streamlit script run if any and asked for."""
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    if not attach:
+        thread.start()
+        return
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx is not None:
+            add_script_run_ctx(thread, ctx)
+    except ImportError:
+        pass
+    thread.start()
+
+def run_in_background(func: Callable, *args, detached: bool = False) -> Future:
+    """Run a call in its own thread, next to a pipeline.
+
+    Args:
+        func: Function to call.
+        *args: Arguments of the call.
+        detached: Whether the call may outlive the Streamlit script run; it
+            is then not attached to the run and must not write to the page.
+
+    Returns:
+        Future holding the result of the call.
+    """
+    future = Future()
+
+    def target():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    _start_thread(target, attach=not detached)
+    return future
+
+class Stage:
+    """One step of a pipeline, run by its own worker threads."""
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1):
+        """
+        Args:
+            name: Stage name, used in the statistics.
+            func: Called with each item, returns the item passed to the next stage.
+            workers: Worker threads of the stage.
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+
+class Pipeline:
+    """Chain of stages connected by bounded queues.
+
+    Items are processed in parallel across and within stages and come out
+    in completion order, tagged with their input position. An item whose
+    stage raised skips the remaining stages and comes out with its error.
+    An error raised by the input items is raised by run() once the items
+    already in flight came out. When the consumer stops iterating early,
+    the workers are stopped and the queues drained, so no thread is left
+    blocked on a full queue.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = SCHEDULER_QUEUE_SIZE):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stats = {stage.name: {'items': 0, 'busy_s': 0.0} for stage in stages}
+        self._lock = threading.Lock()
+
+    def _worker(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue, remaining: List[int],
+                stop: threading.Event) -> None:
+        """Process items of one stage until the input is exhausted or the pipeline stopped."""
+        while True:
+            task = _get(inbox, stop)
+            if task is _DONE:
+                _put(inbox, _DONE, stop)  # Let the sibling workers stop too
+                with self._lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    _put(outbox, _DONE, stop)
+                return
+            index, item, error = task
+            if error is None:
+                start = time.perf_counter()
+                try:
+                    item = stage.func(item)
+                except Exception as e:
+                    error = e
+                with self._lock:
+                    self.stats[stage.name]['items'] += 1
+                    self.stats[stage.name]['busy_s'] += time.perf_counter() - start
+            if not _put(outbox, (index, item, error), stop):
+                return
+
+    def _feed(self, items: Iterable, inbox: queue.Queue, stop: threading.Event, failure: List) -> None:
+        """Push the input items into the first stage, keeping the error raised by the items, if any."""
+        try:
+            for index, item in enumerate(items):
+                if not _put(inbox, (index, item, None), stop):
+                    return
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            _put(inbox, _DONE, stop)
+
+    def run(self, items: Iterable) -> Iterator[Tuple[int, Any, Optional[Exception]]]:
+        """Run items through the stages.
+
+        Args:
+            items: Items entering the first stage.
+
+        Yields:
+            Input position, output item and error (None on success) of each
+            item, as soon as it leaves the last stage.
+
+        Raises:
+            The error raised while iterating over the input items, if any.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        stop = threading.Event()
+        failure = []
+        for stage, inbox, outbox in zip(self.stages, queues, queues[1:]):
+            remaining = [stage.workers]
+            for _ in range(stage.workers):
+                _start_thread(self._worker, stage, inbox, outbox, remaining, stop)
+        _start_thread(self._feed, items, queues[0], stop, failure)
+        try:
+            while True:
+                task = queues[-1].get()
+                if task is _DONE:
+                    break
+                yield task
+        finally:
+            # Also reached when the consumer closes the generator early
+            stop.set()
+            for pending in queues:
+                _drain(pending)
+        if failure:
+            raise failure[0]
+
+def merge_stage_stats(total: Dict, stats: Dict) -> None:
+    """Add the statistics of a pipeline run to running totals.
+
+    Args:
+        total: Totals per stage, updated in place.
+        stats: Pipeline.stats of a run.
+    """
+    for name, values in stats.items():
+        entry = total.setdefault(name, {'items': 0, 'busy_s': 0.0})
+        entry['items'] += values['items']
+        entry['busy_s'] += values['busy_s']
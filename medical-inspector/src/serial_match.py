@@ -0,0 +1,150 @@
+"""OCR-tolerant serial number matching for the Comparateur_PDF project.
+
+Serials are compared with an edit distance where substituting characters
+OCR commonly confuses (O/0, I/1/L, S/5, B/8...) costs less than a real
+edit. Known fleet serials are held in a hash index answering nearest-serial
+lookups without scanning the fleet.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+from .config import (
+    SERIAL_CONFUSIONS, SERIAL_CONFUSION_COST, SERIAL_MATCH_MAX_DISTANCE, SERIAL_SUGGESTION_MAX_DISTANCE,
+    SERIAL_INDEX_MAX_EDITS
+)
+from .utils import normalize_serial
+
+_CONFUSION_GROUP = {char: i for i, group in enumerate(SERIAL_CONFUSIONS) for char in group}
+_CANONICAL = {char: group[0] for group in SERIAL_CONFUSIONS for char in group}
+
+def _substitution_cost(a: str, b: str) -> float:
+    """Cost of reading character b where a was printed."""
+    if a == b:
+        return 0.0
+    group = _CONFUSION_GROUP.get(a)
+    return SERIAL_CONFUSION_COST if group is not None and group == _CONFUSION_GROUP.get(b) else 1.0
+
+def serial_distance(a: str, b: str) -> float:
+    """Confusion-weighted edit distance between two serials.
+
+    Args:
+        a: First serial, in any formatting.
+        b: Second serial, in any formatting.
+
+    Returns:
+        Insertions and deletions cost 1, substitutions between confusable
+        characters SERIAL_CONFUSION_COST and other substitutions 1.
+    """
+    a, b = normalize_serial(a), normalize_serial(b)
+    if a == b:
+        return 0.0
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [float(i)]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1.0,
+                current[j - 1] + 1.0,
+                previous[j - 1] + _substitution_cost(char_a, char_b)
+            ))
+        previous = current
+    return previous[-1]
+
+def match_confidence(distance: float, a: str, b: str) -> float:
+    """Turn a serial distance into a confidence between 0 and 1."""
+    length = max(len(normalize_serial(a)), len(normalize_serial(b)), 1)
+    return max(0.0, 1.0 - distance / length)
+
+def match_serials(a: str, b: str, max_distance: float = SERIAL_MATCH_MAX_DISTANCE) -> Tuple[bool, float]:
+    """Compare two serials, tolerating OCR confusions.
+
+    Args:
+        a: Reference serial.
+        b: Serial read by OCR.
+        max_distance: Largest distance still counted as a match.
+
+    Returns:
+        Whether the serials match and the confidence of the match. Empty
+        serials never match.
+    """
+    if not normalize_serial(a) or not normalize_serial(b):
+        return False, 0.0
+    distance = serial_distance(a, b)
+    return distance <= max_distance, match_confidence(distance, a, b)
+
+def canonical_serial(serial: str) -> str:
+    """Map every confusable character of a serial to its group representative."""
+    return ''.join(_CANONICAL.get(char, char) for char in normalize_serial(serial))
+
+def _deletions(key: str, max_edits: int) -> set:
+    """Return every string obtained from key by deleting up to max_edits characters."""
+    variants = {key}
+    frontier = {key}
+    for _ in range(max_edits):
+        frontier = {v[:i] + v[i + 1:] for v in frontier for i in range(len(v))}
+        variants |= frontier
+    return variants
+
+class SerialIndex:
+    """Index of known serials for nearest-serial lookups.
+
+    Serials are keyed by their canonical form, where confusable characters
+    are merged, so OCR confusions cost nothing to find. Real edits are
+    found through the deletion neighbourhood of the canonical form: two keys
+    within max_edits edits share a string obtained by deleting at most
+    max_edits characters from each. Lookups are a few hash probes whatever
+    the fleet size; candidates are then ranked by serial_distance.
+    """
+
+    def __init__(self, serials: Iterable[str] = (), max_edits: int = SERIAL_INDEX_MAX_EDITS):
+        self.max_edits = max_edits
+        self._serials: Dict[str, set] = {}    # canonical key -> normalized serials
+        self._neighbours: Dict[str, List[str]] = {}  # deletion variant -> canonical keys
+        for serial in serials:
+            self.add(serial)
+
+    def __len__(self) -> int:
+        return sum(len(serials) for serials in self._serials.values())
+
+    def add(self, serial: str) -> None:
+        """Index a serial; already indexed serials are ignored."""
+        serial = normalize_serial(serial)
+        if not serial:
+            return
+        key = canonical_serial(serial)
+        if key not in self._serials:
+            self._serials[key] = set()
+            for variant in _deletions(key, self.max_edits):
+                self._neighbours.setdefault(variant, []).append(key)
+        self._serials[key].add(serial)
+
+    def nearest(self, serial: str, max_distance: float = SERIAL_SUGGESTION_MAX_DISTANCE,
+                limit: int = 5) -> List[Dict]:
+        """Find the indexed serials closest to a serial.
+
+        Args:
+            serial: Serial to look up, in any formatting.
+            max_distance: Largest distance returned; real edits beyond the
+                index max_edits are not searched.
+            limit: Maximum number of serials returned.
+
+        Returns:
+            Serials with their distance and confidence, closest first.
+        """
+        query = normalize_serial(serial)
+        if not query:
+            return []
+        edits = min(int(max_distance), self.max_edits)
+        keys = set()
+        for variant in _deletions(canonical_serial(query), edits):
+            keys.update(self._neighbours.get(variant, ()))
+        found = []
+        for key in keys:
+            for value in self._serials[key]:
+                distance = serial_distance(query, value)
+                if distance <= max_distance:
+                    found.append((distance, value))
+        found.sort()
+        return [
+            {'serial': value, 'distance': distance, 'confidence': match_confidence(distance, query, value)}
+            for distance, value in found[:limit]
+        ]
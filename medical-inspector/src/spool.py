@@ -0,0 +1,187 @@
+"""Disk spool of uploaded originals for the Comparateur_PDF project.
+
+Uploaded files are copied to a temporary folder private to the Streamlit
+session as soon as they are received, and read back through read-only
+memory maps for PDF parsing, hashing and export. The session keeps a path
+per original instead of its bytes, so its memory does not grow with the
+size of the batches. The folder is deleted when the spool is garbage
+collected with the session state, or at interpreter exit; folders left
+behind by a crashed process are purged when a new spool is created. Spool
+folders are named after the process owning them, so the spools of live
+sessions, however idle, are never purged.
+"""
+
+import mmap
+import os
+import shutil
+import tempfile
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Union
+import streamlit as st
+from .config import SPOOL_CHUNK_SIZE, SPOOL_DIR, SPOOL_MAX_AGE_S, SPOOL_PREFIX
+
+@contextmanager
+def map_file(path: str) -> Iterator[Union[mmap.mmap, bytes]]:
+    """Memory-map a file read-only for the duration of a with block.
+
+    Args:
+        path: File to map.
+
+    Yields:
+        Read-only map of the file, usable as a buffer and as a binary file
+        object; empty bytes for an empty file, which cannot be mapped.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+class SpooledFile:
+    """Original of an uploaded file, kept on disk.
+
+    Exposes the name, type and size attributes of Streamlit's UploadedFile
+    so it can stand in for it once the upload is spooled.
+    """
+
+    def __init__(self, name: str, type: str, size: int, path: str):
+        """
+        Args:
+            name: Original file name.
+            type: MIME type of the upload.
+            size: Size in bytes.
+            path: Path of the spooled copy.
+        """
+        self.name = name
+        self.type = type
+        self.size = size
+        self.path = path
+        self._digest: Optional[str] = None
+
+    def mapped(self):
+        """Memory-map the original read-only, see map_file."""
+        return map_file(self.path)
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 of the content, computed once from the memory map."""
+        if self._digest is None:
+            from .checkpoint import content_digest
+            with self.mapped() as content:
+                self._digest = content_digest(content)
+        return self._digest
+
+    def getvalue(self) -> bytes:
+        """Read the whole content, for callers that need it in memory."""
+        with self.mapped() as content:
+            return bytes(content)
+
+def _owner_alive(name: str) -> Optional[bool]:
+    """Tell whether the process that created a spool folder is still running.
+
+    Returns:
+        None when unknown: folder not named after its process, or no way to
+        probe a process without signalling it (Windows).
+    """
+    pid = name[len(SPOOL_PREFIX):].split('-', 1)[0]
+    if not pid.isdigit() or os.name == 'nt':
+        return None
+    if int(pid) == os.getpid():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def purge_stale_spools(directory: Optional[str] = SPOOL_DIR, max_age: float = SPOOL_MAX_AGE_S) -> int:
+    """Delete spool folders left behind by a process that did not exit cleanly.
+
+    A folder is stale once the process that created it is gone; when that
+    cannot be told, once it has been left untouched for max_age.
+
+    Args:
+        directory: Folder holding the spools (None: the system temp folder).
+        max_age: Age in seconds from which a spool of unknown owner is stale.
+
+    Returns:
+        Number of spools deleted.
+    """
+    directory = directory or tempfile.gettempdir()
+    purged = 0
+    for item in os.scandir(directory):
+        if item.name.startswith(SPOOL_PREFIX) and item.is_dir(follow_symlinks=False):
+            alive = _owner_alive(item.name)
+            if alive is None:
+                alive = time.time() - item.stat(follow_symlinks=False).st_mtime <= max_age
+            if not alive:
+                shutil.rmtree(item.path, ignore_errors=True)
+                purged += 1
+    return purged
+
+class SessionSpool:
+    """Temporary folder holding the uploaded originals of one session."""
+
+    def __init__(self, directory: Optional[str] = SPOOL_DIR):
+        """
+        Args:
+            directory: Folder the spool is created in (None: the system temp folder).
+        """
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=f"{SPOOL_PREFIX}{os.getpid()}-", dir=directory)
+        self.files: List[SpooledFile] = []
+        # Runs when the spool is garbage collected or at exit, whichever comes first
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.path, ignore_errors=True)
+
+    def add(self, uploaded_file) -> SpooledFile:
+        """Copy an uploaded file to the spool, chunk by chunk.
+
+        Args:
+            uploaded_file: Streamlit UploadedFile or any binary file object
+                with name, type and size attributes.
+
+        Returns:
+            The spooled original.
+        """
+        extension = os.path.splitext(uploaded_file.name)[1].lower()
+        fd, path = tempfile.mkstemp(suffix=extension, dir=self.path)
+        uploaded_file.seek(0)
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(uploaded_file, f, SPOOL_CHUNK_SIZE)
+            size = f.tell()
+        spooled = SpooledFile(uploaded_file.name, uploaded_file.type, size, path)
+        self.files.append(spooled)
+        return spooled
+
+    def clear(self) -> None:
+        """Delete the spooled originals, keeping the spool usable."""
+        for spooled in self.files:
+            try:
+                os.unlink(spooled.path)
+            except FileNotFoundError:
+                pass
+        self.files = []
+
+    def close(self) -> None:
+        """Delete the spool folder now."""
+        self._cleanup()
+
+def get_session_spool() -> SessionSpool:
+    """Return the spool of the current Streamlit session, creating it on first use.
+
+    The spool lives in the session state, so it is garbage collected, and
+    its folder deleted, when the session expires.
+    """
+    if 'spool' not in st.session_state:
+        purge_stale_spools()
+        st.session_state.spool = SessionSpool()
+    return st.session_state.spool
@@ -0,0 +1,50 @@
+"""Stubbed inference clients for local runs and tests of the Comparateur_PDF project."""
+
+import time
+from typing import Dict, List, Tuple
+
+class StubInferenceClient:
+    """Stand-in for InferenceHTTPClient returning a fixed classification."""
+
+    def __init__(self, image_class: str = 'Batterie', confidence: float = 0.99, latency: float = 0.0):
+        """
+        Args:
+            image_class: Class returned for every image.
+            confidence: Confidence returned for the class.
+            latency: Simulated network round trip, in seconds.
+        """
+        self.image_class = image_class
+        self.confidence = confidence
+        self.latency = latency
+
+    def infer(self, image_path: str, model_id: str = '') -> Dict:
+        """Return the configured classification, after the simulated latency."""
+        if self.latency:
+            time.sleep(self.latency)
+        return {'predictions': [{'class': self.image_class, 'confidence': self.confidence}]}
+
+class StubOcrReader:
+    """Stand-in for easyocr.Reader returning fixed label text."""
+
+    device = 'cpu'
+
+    def __init__(self, lines: Tuple[str, ...] = ('LOT', 'STUB00001', '2024-01-01'),
+                 confidence: float = 0.99, latency: float = 0.0):
+        """
+        Args:
+            lines: Text lines returned for every image.
+            confidence: Confidence returned for each line.
+            latency: Simulated recognition time, in seconds.
+        """
+        self.lines = lines
+        self.confidence = confidence
+        self.latency = latency
+
+    def readtext(self, image, **options) -> List[Tuple]:
+        """Return the configured lines, after the simulated latency."""
+        if self.latency:
+            time.sleep(self.latency)
+        return [
+            ([[0, 20 * i], [100, 20 * i], [100, 20 * i + 15], [0, 20 * i + 15]], line, self.confidence)
+            for i, line in enumerate(self.lines)
+        ]
@@ -1,14 +1,30 @@
 """Streamlit UI components for the Comparateur_PDF project."""
 
+import hashlib
+import io
 import json
 import os
-from datetime import datetime
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
 import zipfile
-from typing import Dict
+from typing import Dict, List, Tuple
+import numpy as np
 import streamlit as st
-from .config import ALLOWED_EXTENSIONS, CSS_STYLE
-from .processing import process_uploaded_file
-from .comparison import compare_rvd_aed, compare_rvd_images
+from PIL import Image
+from .config import (
+    ALLOWED_EXTENSIONS, BUDGET_POLL_INTERVAL_S, CSS_STYLE, EXPORT_PARQUET_DIR, GALLERY_THUMBNAIL_SIDE,
+    INSPECTION_TIME_BUDGET_S, OCR_POOL_WORKERS
+)
+from .processing import process_uploaded_inspections
+from .inspections import compare_inspections, group_inspections, inspection_summary, new_processed_data
+from .ocr_pool import get_ocr_pool
+from .comparison import aed_record, compare_rvd_aed, compare_rvd_images, missing_comparison_inputs
+from .history import get_history
+from .export import append_parquet, build_tables, parquet_archive
+from .records import json_default, plain
+from .spool import get_session_spool
+from .utils import strip_images
 
 def display_comparison(title: str, comparison: Dict[str, Dict[str, str]]) -> None:
     """Display comparison results in a formatted way.
@@ -29,6 +45,8 @@ def display_comparison(title: str, comparison: Dict[str, Dict[str, str]]) -> Non
             compare_type = 'AED' if 'aed' in data else 'Image'
             compare_value = data.get(compare_type.lower(), 'N/A')
             cols[2].markdown(f"*{compare_type}:*  \n`{compare_value}`")
+            if data.get('confidence', 1) < 1:
+                cols[2].caption(f"Confiance de lecture : {data['confidence']:.0%}")
             if data.get('match', False):
                 cols[3].success("✅")
             else:
@@ -40,17 +58,468 @@ def display_comparison(title: str, comparison: Dict[str, Dict[str, str]]) -> Non
                 st.error(data['error'])
         st.markdown("---")
 
+def inspection_uid(uploaded_files) -> str:
+    """Derive a stable inspection identifier from the uploaded files.
+
+    Args:
+        uploaded_files: Files uploaded for the inspection.
+
+    Returns:
+        Hex digest identifying the set of files.
+    """
+    digest = hashlib.sha1()
+    for uploaded_file in sorted(uploaded_files, key=lambda f: f.name):
+        digest.update(f"{uploaded_file.name}:{uploaded_file.size};".encode('utf-8'))
+    return digest.hexdigest()
+
+def _save_to_history(uid: str, processed_data: Dict) -> None:
+    """Persist an inspection in the history store."""
+    aed = aed_record(processed_data, st.session_state.dae_type)
+    get_history().save_inspection(uid, processed_data, aed.get('generation', st.session_state.dae_type))
+
+def record_inspection() -> None:
+    """Persist the current inspection in the history store."""
+    uid = st.session_state.get('inspection_uid')
+    if not uid or not st.session_state.processed_data.get('RVD'):
+        return
+    try:
+        _save_to_history(uid, st.session_state.processed_data)
+    except sqlite3.Error as e:
+        st.warning(f"Impossible d'enregistrer l'inspection dans l'historique : {e}")
+
+def select_inspection(index: int) -> None:
+    """Make one of the uploaded inspections the one shown in the other views."""
+    inspection = st.session_state.inspections[index]
+    st.session_state.active_inspection = index
+    st.session_state.processed_data = inspection['processed_data']
+    st.session_state.uploaded_files = inspection['uploaded_files']
+    st.session_state.inspection_uid = inspection['uid']
+
+def render_inspections_summary() -> None:
+    """Show the per-site summary of the uploaded inspections and pick the active one."""
+    inspections = st.session_state.inspections
+    st.subheader(f"🏥 {len(inspections)} inspection(s) détectée(s)")
+    st.dataframe(
+        [inspection_summary(inspection, st.session_state.dae_type) for inspection in inspections],
+        use_container_width=True,
+        hide_index=True
+    )
+    if len(inspections) > 1:
+        index = st.selectbox(
+            "Inspection affichée dans les autres vues",
+            range(len(inspections)),
+            index=st.session_state.get('active_inspection', 0),
+            format_func=lambda idx: inspections[idx]['key']
+        )
+        if index != st.session_state.get('active_inspection'):
+            select_inspection(index)
+            refresh_comparisons()
+    if st.button("Enregistrer toutes les inspections dans l'historique"):
+        saved = 0
+        try:
+            for inspection in inspections:
+                if inspection['processed_data']['RVD']:
+                    _save_to_history(inspection['uid'], inspection['processed_data'])
+                    saved += 1
+            st.success(f"{saved} inspection(s) enregistrée(s)")
+        except sqlite3.Error as e:
+            st.warning(f"Impossible d'enregistrer les inspections dans l'historique : {e}")
+
+def _display_history_rows(rows: List[Dict], elapsed_ms: float) -> None:
+    """Display history query results with their latency."""
+    if rows:
+        st.dataframe(rows, use_container_width=True)
+    else:
+        st.info("Aucun résultat")
+    st.caption(f"{len(rows)} résultat(s) en {elapsed_ms:.1f} ms")
+
+def render_history_panel() -> None:
+    """Render fleet lookups over the inspection history."""
+    try:
+        history = get_history()
+    except sqlite3.Error as e:
+        st.error(f"Historique indisponible : {e}")
+        return
+    st.caption(f"{history.count()} inspection(s) enregistrée(s)")
+
+    with st.expander("Recherche par numéro de série", expanded=True):
+        serial = st.text_input("Numéro de série", key="history_serial")
+        if serial:
+            start = time.perf_counter()
+            rows = history.find_by_serial(serial)
+            _display_history_rows(rows, (time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            suggestions = [s for s in history.suggest_serials(serial) if s['distance'] > 0]
+            if suggestions:
+                st.markdown("**Numéros proches** (erreurs de lecture possibles)")
+                _display_history_rows(suggestions, (time.perf_counter() - start) * 1000)
+
+    with st.expander("Recherche par code site", expanded=False):
+        code_site = st.text_input("Code site", key="history_site")
+        if code_site:
+            start = time.perf_counter()
+            rows = history.find_by_site(code_site)
+            _display_history_rows(rows, (time.perf_counter() - start) * 1000)
+
+    with st.expander("Électrodes arrivant à péremption", expanded=False):
+        today = date.today()
+        month_start = today.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        period = st.date_input(
+            "Période",
+            (month_start, next_month - timedelta(days=1)),
+            key="history_expiry_period"
+        )
+        if isinstance(period, tuple) and len(period) == 2:
+            start = time.perf_counter()
+            rows = history.find_expiring(period[0], period[1])
+            _display_history_rows(rows, (time.perf_counter() - start) * 1000)
+
+def refresh_comparisons() -> Tuple[Dict, Dict]:
+    """Compare the active inspection with its reports and photos and record it.
+
+    Comparisons are memoized, so this is cheap when nothing changed, and the
+    inspection is only written to the history once per AED generation.
+
+    Returns:
+        RVD vs AED and RVD vs images comparison results.
+    """
+    aed_results = compare_rvd_aed()
+    image_results = compare_rvd_images()
+    recorded = st.session_state.setdefault('recorded_inspections', set())
+    key = (st.session_state.get('inspection_uid'), st.session_state.dae_type)
+    if key not in recorded and st.session_state.processed_data.get('RVD'):
+        record_inspection()
+        recorded.add(key)
+    return aed_results, image_results
+
+def gallery_thumbnail(pixels: np.ndarray) -> bytes:
+    """Return the JPEG thumbnail shown in the gallery for a photo, encoded once.
+
+    Args:
+        pixels: Decoded pixels of the photo.
+
+    Returns:
+        JPEG bytes of the photo downscaled to GALLERY_THUMBNAIL_SIDE.
+    """
+    memo = st.session_state.setdefault('gallery_memo', {})
+    # Keyed by content: only the thumbnail is kept, not the pixels
+    key = hashlib.blake2b(np.ascontiguousarray(pixels), digest_size=16).digest()
+    thumbnail = memo.get(key)
+    if thumbnail is None:
+        image = Image.fromarray(pixels)
+        image.thumbnail((GALLERY_THUMBNAIL_SIDE, GALLERY_THUMBNAIL_SIDE))
+        buffer = io.BytesIO()
+        image.convert('RGB').save(buffer, format='JPEG', quality=85)
+        thumbnail = memo[key] = buffer.getvalue()
+    return thumbnail
+
+def adopt_inspections(inspections: List[Dict], files: List) -> None:
+    """Make processed inspections those of the session, the first one active.
+
+    Args:
+        inspections: Inspections returned by process_uploaded_inspections.
+        files: Spooled files of the upload.
+    """
+    for inspection in inspections:
+        names = set(inspection['processed_data']['files'])
+        inspection['uploaded_files'] = [f for f in files if f.name in names]
+        inspection['uid'] = inspection_uid(inspection['uploaded_files'])
+    st.session_state.inspections = inspections
+    st.session_state.pop('active_inspection', None)
+    st.session_state.pop('gallery_memo', None)  # Thumbnails of the previous upload
+    if inspections:
+        select_inspection(0)
+        refresh_comparisons()
+
+@st.fragment(run_every=BUDGET_POLL_INTERVAL_S)
+def render_background_completion() -> None:
+    """Wait for provisional results to be completed, then show the final ones.
+
+    The completion runs outside of the script run and leaves the provisional
+    results untouched; the final results replace them here, in the session.
+    """
+    completion = st.session_state.get('background_completion')
+    if not completion:
+        return
+    if not completion['future'].done():
+        st.caption(f"⏳ Finalisation de {completion['provisional']} résultat(s) provisoire(s) en arrière-plan…")
+        return
+    del st.session_state.background_completion
+    try:
+        pairs, messages = completion['future'].result()
+    except Exception as e:
+        st.warning(f"Impossible de finaliser les résultats provisoires : {e}")
+        return
+    # Toasts outlive the rerun below; successes were already reported by the first pass
+    for level, message in messages:
+        if level != 'success':
+            st.toast(message, icon='❌' if level == 'error' else '⚠️')
+    final = {id(provisional): completed for provisional, completed in pairs}
+    images = [final.get(id(img_data), img_data) for img_data in completion['images']]
+    # Images may now be matched to another inspection of the upload
+    inspections = group_inspections(completion['pdf_reports'], images)
+    compare_inspections(inspections, st.session_state.dae_type)
+    st.session_state.pop('recorded_inspections', None)
+    adopt_inspections(inspections, completion['files'])
+    st.rerun()
+
+def render_upload_view(client, reader) -> None:
+    """Render the upload view and process new uploads."""
+    st.title("📋 Téléversement des documents")
+    st.markdown("---")
+    with st.expander("Téléverser des documents", expanded=True):
+        # The uploader is reset once its files are spooled, so it does not keep their bytes
+        generation = st.session_state.setdefault('uploader_generation', 0)
+        uploaded_files = st.file_uploader(
+            "Glissez et déposez des fichiers ici",
+            type=ALLOWED_EXTENSIONS,
+            accept_multiple_files=True,
+            help="Téléverser des rapports PDF et des images de dispositifs",
+            key=f"uploader_{generation}"
+        )
+        if uploaded_files:
+            # Originals are kept on disk, not in the session, until the export reads them again
+            spool = get_session_spool()
+            spool.clear()
+            st.session_state.pop('background_completion', None)
+            st.session_state.pop('batch_uid', None)
+            for uploaded_file in uploaded_files:
+                spool.add(uploaded_file)
+            st.session_state.uploader_generation = generation + 1
+            st.rerun()
+        spooled_files = list(st.session_state.spool.files) if 'spool' in st.session_state else []
+        if spooled_files:
+            batch_uid = inspection_uid(spooled_files)
+            if st.session_state.get('batch_uid') != batch_uid:
+                with st.container():
+                    progress_bar = st.progress(0)
+                    status_text = st.empty()
+                    error_container = st.empty()
+                    try:
+                        inspections = process_uploaded_inspections(
+                            spooled_files, progress_bar, status_text, error_container,
+                            client, reader,
+                            ocr_pool=get_ocr_pool(reader)
+                        )
+                    except ValueError as e:
+                        error_container.error(f"Erreur de valeur lors du traitement des fichiers : {e}")
+                        inspections = []
+                    adopt_inspections(inspections, spooled_files)
+                    st.session_state.batch_uid = batch_uid
+                    st.success(f"Traitement terminé pour tous les {len(spooled_files)} fichiers.")
+    if st.session_state.get('inspections'):
+        render_inspections_summary()
+
+@st.fragment
+def render_gallery() -> None:
+    """Render the analysed photos, rerun on its own."""
+    if st.session_state.processed_data['images']:
+        with st.expander("Résultats d'analyse d'images", expanded=True):
+            cols = st.columns(3)
+            for idx, img_data in enumerate(st.session_state.processed_data['images']):
+                with cols[idx % 3]:
+                    st.image(gallery_thumbnail(img_data['image']), use_container_width=True)
+
+                    # Customize display based on image type
+                    type_display = img_data['type']
+                    if type_display in ['Non classifié', 'Erreur de classification', 'Erreur de traitement']:
+                        type_display = f"{type_display} ⚠️"
+                    if img_data.get('provisional'):
+                        type_display = f"{type_display} ⏳ (provisoire)"
+
+                    st.markdown(
+                        f"""
+                        **Type:** {type_display}  
+                        **Numéro de série:** {img_data.get('serial', 'N/A')}  
+                        **Date:** {img_data.get('date', 'N/A')}  
+                        **Photos similaires regroupées:** {len(img_data.get('duplicates', []))}
+                        """,
+                        unsafe_allow_html=True
+                    )
+    else:
+        st.info("Aucune image traitée à afficher pour le moment.")
+
+def render_analysis_view() -> None:
+    """Render the extracted report data and the photo gallery."""
+    st.title("📊 Analyse de données traitées")
+
+    # Display processed RVD and AED data
+    with st.expander("Données traitées", expanded=True):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("Données RVD")
+            st.json(plain(st.session_state.processed_data['RVD']), expanded=False)
+        with col2:
+            aed_data = aed_record(st.session_state.processed_data, st.session_state.dae_type)
+            st.subheader(f"Données AED {aed_data.get('generation', st.session_state.dae_type)}")
+            st.json(plain(aed_data) if aed_data else {"status": "Aucune donnée AED trouvée"}, expanded=False)
+    render_gallery()
+
+@st.fragment
+def render_comparison_view() -> None:
+    """Render the comparisons of the active inspection, rerun on its own."""
+    st.title("📋v📑 Comparaison des documents")
+    with st.expander("Comparaison des documents", expanded=True):
+        # Removed the button and its styling
+        for message in missing_comparison_inputs():
+            st.info(message)
+        if any(img_data.get('provisional') for img_data in st.session_state.processed_data['images']):
+            st.warning("Certains résultats d'images sont provisoires : la comparaison sera mise à jour")
+        aed_results, image_results = refresh_comparisons()
+        display_comparison("Comparaison RVD vs Rapport AED", aed_results)
+        display_comparison("Comparaison RVD vs Données d'images", image_results)
+        all_matches = all(
+            item.get('match', False)
+            for comp in [aed_results, image_results]
+            for item in comp.values()
+        )
+        if all_matches:
+            st.success("Tous les contrôles sont réussis ! Le dispositif est conforme.")
+        else:
+            failed = [
+                k for comp in [aed_results, image_results]
+                for k, v in comp.items() if not v.get('match', True)
+            ]
+            st.error(f"Échec de validation pour : {', '.join(failed)}")
+
+@st.fragment
+def render_export_view() -> None:
+    """Render the export form and preview, rerun on its own."""
+    st.title("📤 Export automatisé")
+    with st.container():
+        col_config, col_preview = st.columns([1, 2])
+        with col_config:
+            with st.form("export_config"):
+                st.markdown("#### ⚙️ Paramètres d'export")
+                export_format = st.selectbox(
+                    "Format de sortie",
+                    ["ZIP", "Parquet", "PDF", "CSV", "XLSX"],
+                    index=0
+                )
+                include_images = st.checkbox("Inclure les images", True)
+                st.markdown("---")
+                with st.expander("Exportation des fichiers", expanded=True):
+                    if st.form_submit_button("Générer un package d'export"):
+                        refresh_comparisons()
+                        if not st.session_state.processed_data.get('RVD'):
+                            st.warning("Aucune donnée RVD disponible pour le nommage")
+                        elif export_format == "Parquet":
+                            tables = build_tables(
+                                st.session_state.processed_data,
+                                st.session_state.get('inspection_uid') or 'session',
+                                st.session_state.dae_type
+                            )
+                            paths = append_parquet(tables)
+                            st.session_state.parquet_export = parquet_archive(tables)
+                            st.success(f"{len(paths)} table(s) ajoutée(s) au jeu de données {EXPORT_PARQUET_DIR}")
+                        else:
+                            code_site = st.session_state.processed_data['RVD'].get('Code site', 'INCONNU')
+                            date_str = datetime.now().strftime("%Y%m%d")
+                            aed_data = aed_record(st.session_state.processed_data, st.session_state.dae_type)
+                            aed_generation = aed_data.get('generation', st.session_state.dae_type)
+                            # Built in the session spool, so concurrent sessions do not share it
+                            export_path = os.path.join(get_session_spool().path, 'export.zip')
+                            with zipfile.ZipFile(export_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                                zipf.writestr(
+                                    'processed_data.json',
+                                    json.dumps(strip_images(st.session_state.processed_data), indent=2, default=str)
+                                )
+                                summary = (
+                                    "Résumé de l'inspection\n\n"
+                                    "Données RVD:\n" +
+                                    json.dumps(st.session_state.processed_data['RVD'], indent=2, default=json_default) +
+                                    "\n\n" +
+                                    f"Données AED {aed_generation}:\n" +
+                                    json.dumps(aed_data, indent=2, default=json_default) +
+                                    "\n\nComparaisons:\n"
+                                )
+                                for comp_type, comp_data in st.session_state.processed_data['comparisons'].items():
+                                    summary += f"{comp_type.replace('_vs_', ' vs ').upper()}:\n"
+                                    for field, data in comp_data.items():
+                                        summary += (
+                                            f"  {field.replace('_', ' ').title()}: "
+                                            f"{'✅' if data.get('match', False) else '❌'}\n"
+                                        )
+                                zipf.writestr("summary.txt", summary)
+                                if 'uploaded_files' in st.session_state:
+                                    for uploaded_file in st.session_state.uploaded_files:
+                                        if (
+                                            uploaded_file.type == "application/pdf" or
+                                            (include_images and uploaded_file.type.startswith("image/"))
+                                        ):
+                                            if uploaded_file.type == "application/pdf":
+                                                if 'rapport de vérification' in uploaded_file.name.lower():
+                                                    new_name = f"RVD_{code_site}_{date_str}.pdf"
+                                                else:
+                                                    new_name = f"AED_{aed_generation}_{code_site}_{date_str}.pdf"
+                                            else:
+                                                new_name = f"IMAGE_{code_site}_{date_str}_{uploaded_file.name}"
+                                            zipf.write(uploaded_file.path, new_name)
+                            st.session_state.export_ready = True
+                            st.session_state.export_path = export_path
+        with col_preview:
+            st.markdown("#### 👁️ Aperçu de l'export")
+            if st.session_state.get('parquet_export'):
+                st.download_button(
+                    label="📥 Télécharger les tables Parquet",
+                    data=st.session_state.parquet_export,
+                    file_name=f"Inspection_{datetime.now().strftime('%Y%m%d')}_parquet.zip",
+                    mime="application/zip",
+                    use_container_width=True
+                )
+            if st.session_state.get('export_ready'):
+                st.success("✅ Package prêt pour téléchargement !")
+                preview_data = {
+                    "format": export_format,
+                    "fichiers_inclus": [
+                        "processed_data.json",
+                        "summary.txt",
+                        *(
+                            ["images.zip"]
+                            if include_images and any(
+                                f.type.startswith("image/")
+                                for f in st.session_state.get('uploaded_files', [])
+                            )
+                            else []
+                        )
+                    ],
+                    "taille_estimee": f"{(len(st.session_state.get('uploaded_files', []))*0.5):.1f} MB"
+                }
+                st.json(preview_data)
+                export_path = st.session_state.get('export_path')
+                if export_path and os.path.exists(export_path):
+                    # Offered here since download buttons are not allowed in the export form
+                    with open(export_path, "rb") as f:
+                        if st.download_button(
+                            label="📥 Télécharger l'export complet",
+                            data=f,
+                            file_name=f"Inspection_{datetime.now().strftime('%Y%m%d')}.zip",
+                            mime="application/zip",
+                            help="Cliquez pour télécharger le package complet",
+                            use_container_width=True,
+                            type="primary"
+                        ):
+                            st.balloons()
+            else:
+                st.markdown(
+                    """
+                    <div style="padding: 2rem; text-align: center; opacity: 0.5;">
+                        ⚠️ Aucun export généré
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+
+def render_history_view() -> None:
+    """Render the inspection history lookups."""
+    st.title("🗂️ Historique des inspections")
+    render_history_panel()
+
 def setup_session_state():
     """Initialize session state variables."""
     if 'processed_data' not in st.session_state:
-        st.session_state.processed_data = {
-            'RVD': {},
-            'AEDG5': {},
-            'AEDG3': {},
-            'images': [],
-            'files': [],
-            'comparisons': {'rvd_vs_aed': {}, 'rvd_vs_images': {}}
-        }
+        st.session_state.processed_data = new_processed_data()
     if 'dae_type' not in st.session_state:
         st.session_state.dae_type = 'G5'
     if 'uploaded_files' not in st.session_state:
@@ -90,7 +559,8 @@ def render_ui(client, reader):
             "Type d'AED",
             ("G5", "G3"),
             index=0,
-            help="Sélectionnez le type de dispositif à inspecter"
+            help="Sélectionnez le type de dispositif à inspecter "
+                 "(utilisé si la génération n'est pas détectée dans le rapport AED)"
         )
         st.subheader("🔧 Options de traitement")
         st.session_state.enable_ocr = st.checkbox(
@@ -103,6 +573,83 @@ def render_ui(client, reader):
             True,
             help="Active la classification automatique des documents"
         )
+        st.session_state.enable_prefilter = st.checkbox(
+            "Pré-classification locale",
+            True,
+            help="Évite l'appel au modèle distant quand le type est évident "
+                 "(nom de fichier, codes-barres, photo de référence)"
+        )
+        st.session_state.enable_dedup = st.checkbox(
+            "Regrouper les photos en rafale",
+            True,
+            help="Ne traite que la photo la plus nette parmi des photos quasi identiques "
+                 "prises à quelques secondes d'intervalle"
+        )
+        dedup_stats = st.session_state.get('dedup_stats')
+        if dedup_stats and dedup_stats['images'] > dedup_stats['groups']:
+            st.caption(
+                f"{dedup_stats['images'] - dedup_stats['groups']} photo(s) en double "
+                f"sur {dedup_stats['images']} non retraitée(s)"
+            )
+        st.session_state.ocr_tiered = st.checkbox(
+            "OCR rapide à deux niveaux",
+            True,
+            help="Lecture rapide à résolution réduite, puis lecture complète "
+                 "seulement si le numéro de série ou la date manque"
+        )
+        st.session_state.ocr_fast_max_side = st.slider(
+            "Résolution de la lecture rapide (px)",
+            min_value=512, max_value=2048, value=1024, step=128,
+            disabled=not st.session_state.ocr_tiered
+        )
+        if OCR_POOL_WORKERS >= 2:
+            st.caption(f"OCR réparti sur {OCR_POOL_WORKERS} processus (OCR_POOL_WORKERS)")
+        st.session_state.time_budget = st.slider(
+            "Budget de temps par inspection (s)",
+            min_value=0, max_value=600, value=INSPECTION_TIME_BUDGET_S, step=10,
+            help="Au-delà, les images restantes sont lues en qualité réduite ou reportées, "
+                 "puis finalisées en arrière-plan (0 : sans limite)"
+        )
+        ocr_stats = st.session_state.get('ocr_stats')
+        if ocr_stats and (ocr_stats['fast_hits'] + ocr_stats['escalated']):
+            with st.expander("Statistiques OCR", expanded=False):
+                total = ocr_stats['fast_hits'] + ocr_stats['escalated']
+                st.metric("Résolues en lecture rapide", f"{ocr_stats['fast_hits'] / total:.0%}")
+                if ocr_stats['escalated']:
+                    st.metric(
+                        "Résolues en lecture complète",
+                        f"{ocr_stats['full_hits'] / ocr_stats['escalated']:.0%}"
+                    )
+        memory_stats = st.session_state.get('memory_stats')
+        if memory_stats and memory_stats['images']:
+            with st.expander("Mémoire des images", expanded=False):
+                allocated = memory_stats['decoded'] + memory_stats['derived'] + memory_stats['scratch_allocated']
+                st.metric("Tampons alloués par image", f"{allocated / memory_stats['images']:.1f}")
+                st.metric("Tampons de travail réutilisés", memory_stats['scratch_reused'])
+                if memory_stats['peak_bytes'] is not None:
+                    st.metric("Pic mémoire d'un lot", f"{memory_stats['peak_bytes'] / 2**20:.1f} Mo")
+        budget_stats = st.session_state.get('budget_stats')
+        if budget_stats and budget_stats['inspections']:
+            with st.expander("Budget de temps", expanded=False):
+                st.metric(
+                    "Inspections hors budget",
+                    f"{budget_stats['over_budget']}/{budget_stats['inspections']}"
+                )
+                st.metric("Résultats provisoires", budget_stats['provisional'])
+                st.json(budget_stats['tiers'], expanded=False)
+        prefilter_stats = st.session_state.get('prefilter_stats')
+        if prefilter_stats and prefilter_stats['total']:
+            with st.expander("Statistiques de pré-classification", expanded=False):
+                st.metric(
+                    "Appels distants évités",
+                    f"{prefilter_stats['short_circuited']}/{prefilter_stats['total']}"
+                )
+                if prefilter_stats['audited']:
+                    st.metric(
+                        "Accord avec le modèle (échantillon)",
+                        f"{prefilter_stats['agreed'] / prefilter_stats['audited']:.0%}"
+                    )
+                st.json(prefilter_stats['by_source'], expanded=False)
         st.markdown("---")
         st.markdown("#### 🔍 Guide d'utilisation")
         with st.expander("Comment utiliser l'application ?", expanded=False):
@@ -123,211 +670,15 @@ def render_ui(client, reader):
         st.markdown("---")
         st.caption("Développé par Locacoeur • [Support technique](mailto:support@locacoeur.com)")
 
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "📋 Téléversement des documents",
-        "📊 Analyse approfondie",
-        "📋vs📋 Comparaison des documents",
-        "📤 Export automatisé"
-    ])
-
-    with tab1:
-        st.title("📋 Téléversement des documents")
-        st.markdown("---")
-        with st.expander("Téléverser des documents", expanded=True):
-            uploaded_files = st.file_uploader(
-                "Glissez et déposez des fichiers ici",
-                type=ALLOWED_EXTENSIONS,
-                accept_multiple_files=True,
-                help="Téléverser des rapports PDF et des images de dispositifs"
-            )
-            if uploaded_files:
-                with st.container() as processing_container:
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    error_container = st.empty()
-                    total_files = len(uploaded_files)
-
-                    for i, uploaded_file in enumerate(uploaded_files):
-                        try:
-                            process_uploaded_file(
-                                uploaded_file, progress_bar, status_text,
-                                error_container, i, total_files, client, reader
-                            )
-                        except ValueError as e:
-                            error_container.error(
-                                f"Erreur de valeur lors du traitement de {uploaded_file.name} : {e}"
-                            )
-
-                    st.session_state.uploaded_files = uploaded_files
-                    st.success(f"Traitement terminé pour tous les {total_files} fichiers.")
-
-    with tab2:
-        st.title("📊 Analyse de données traitées")
-        
-        # Display processed RVD and AED data
-        with st.expander("Données traitées", expanded=True):
-            col1, col2 = st.columns(2)
-            with col1:
-                st.subheader("Données RVD")
-                st.json(st.session_state.processed_data['RVD'], expanded=False)
-            with col2:
-                st.subheader(f"Données AED {st.session_state.dae_type}")
-                aed_type = f'AEDG{st.session_state.dae_type[-1]}'
-                aed_data = st.session_state.processed_data.get(aed_type, {})
-                st.json(aed_data if aed_data else {"status": "Aucune donnée AED trouvée"}, expanded=False)
-        
-        # Display all images, including unclassified or errored ones
-        if st.session_state.processed_data['images']:
-            with st.expander("Résultats d'analyse d'images", expanded=True):
-                cols = st.columns(3)
-                for idx, img_data in enumerate(st.session_state.processed_data['images']):
-                    with cols[idx % 3]:
-                        st.image(img_data['image'], use_container_width=True)
-                        
-                        # Customize display based on image type
-                        type_display = img_data['type']
-                        if type_display in ['Non classifié', 'Erreur de classification', 'Erreur de traitement']:
-                            type_display = f"{type_display} ⚠️"
-                        
-                        st.markdown(
-                            f"""
-                            **Type:** {type_display}  
-                            **Numéro de série:** {img_data.get('serial', 'N/A')}  
-                            **Date:** {img_data.get('date', 'N/A')}
-                            """,
-                            unsafe_allow_html=True
-                        )
-        else:
-            st.info("Aucune image traitée à afficher pour le moment.")
-
-    with tab3:
-        st.title("📋v📑 Comparaison des documents")
-        with st.expander("Comparaison des documents", expanded=True):
-            # Removed the button and its styling
-            aed_results = compare_rvd_aed()
-            image_results = compare_rvd_images()
-            display_comparison("Comparaison RVD vs Rapport AED", aed_results)
-            display_comparison("Comparaison RVD vs Données d'images", image_results)
-            all_matches = all(
-                item.get('match', False)
-                for comp in [aed_results, image_results]
-                for item in comp.values()
-            )
-            if all_matches:
-                st.success("Tous les contrôles sont réussis ! Le dispositif est conforme.")
-            else:
-                failed = [
-                    k for comp in [aed_results, image_results]
-                    for k, v in comp.items() if not v.get('match', True)
-                ]
-                st.error(f"Échec de validation pour : {', '.join(failed)}")
-
-    with tab4:
-        st.title("📤 Export automatisé")
-        with st.container():
-            col_config, col_preview = st.columns([1, 2])
-            with col_config:
-                with st.form("export_config"):
-                    st.markdown("#### ⚙️ Paramètres d'export")
-                    export_format = st.selectbox(
-                        "Format de sortie",
-                        ["ZIP", "PDF", "CSV", "XLSX"],
-                        index=0
-                    )
-                    include_images = st.checkbox("Inclure les images", True)
-                    st.markdown("---")
-                    with st.expander("Exportation des fichiers", expanded=True):
-                        if st.form_submit_button("Générer un package d'export"):
-                            if not st.session_state.processed_data.get('RVD'):
-                                st.warning("Aucune donnée RVD disponible pour le nommage")
-                            else:
-                                code_site = st.session_state.processed_data['RVD'].get('Code site', 'INCONNU')
-                                date_str = datetime.now().strftime("%Y%m%d")
-                                with zipfile.ZipFile('export.zip', 'w', zipfile.ZIP_DEFLATED) as zipf:
-                                    zipf.writestr(
-                                        'processed_data.json',
-                                        json.dumps(st.session_state.processed_data, indent=2)
-                                    )
-                                    summary = (
-                                        "Résumé de l'inspection\n\n"
-                                        "Données RVD:\n" +
-                                        json.dumps(st.session_state.processed_data['RVD'], indent=2) +
-                                        "\n\n" +
-                                        f"Données AED {st.session_state.dae_type}:\n" +
-                                        json.dumps(st.session_state.processed_data[f'AEDG{st.session_state.dae_type[-1]}'], indent=2) +
-                                        "\n\nComparaisons:\n"
-                                    )
-                                    for comp_type, comp_data in st.session_state.processed_data['comparisons'].items():
-                                        summary += f"{comp_type.replace('_vs_', ' vs ').upper()}:\n"
-                                        for field, data in comp_data.items():
-                                            summary += (
-                                                f"  {field.replace('_', ' ').title()}: "
-                                                f"{'✅' if data.get('match', False) else '❌'}\n"
-                                            )
-                                    zipf.writestr("summary.txt", summary)
-                                    if 'uploaded_files' in st.session_state:
-                                        for uploaded_file in st.session_state.uploaded_files:
-                                            if (
-                                                uploaded_file.type == "application/pdf" or
-                                                (include_images and uploaded_file.type.startswith("image/"))
-                                            ):
-                                                original_bytes = uploaded_file.getvalue()
-                                                if uploaded_file.type == "application/pdf":
-                                                    if 'rapport de vérification' in uploaded_file.name.lower():
-                                                        new_name = f"RVD_{code_site}_{date_str}.pdf"
-                                                    else:
-                                                        new_name = f"AED_{st.session_state.dae_type}_{code_site}_{date_str}.pdf"
-                                                else:
-                                                    new_name = f"IMAGE_{code_site}_{date_str}_{uploaded_file.name}"
-                                                zipf.writestr(new_name, original_bytes)
-                                st.session_state.export_ready = True
-                                if os.path.exists('export.zip'):
-                                    with open("export.zip", "rb") as f:
-                                        st.download_button(
-                                            label="Télécharger le package d'export",
-                                            data=f,
-                                            file_name=f"Inspection_{code_site}_{date_str}.zip",
-                                            mime="application/zip"
-                                        )
-            with col_preview:
-                st.markdown("#### 👁️ Aperçu de l'export")
-                if st.session_state.get('export_ready'):
-                    st.success("✅ Package prêt pour téléchargement !")
-                    preview_data = {
-                        "format": export_format,
-                        "fichiers_inclus": [
-                            "processed_data.json",
-                            "summary.txt",
-                            *(
-                                ["images.zip"]
-                                if include_images and any(
-                                    f.type.startswith("image/")
-                                    for f in st.session_state.get('uploaded_files', [])
-                                )
-                                else []
-                            )
-                        ],
-                        "taille_estimee": f"{(len(st.session_state.get('uploaded_files', []))*0.5):.1f} MB"
-                    }
-                    st.json(preview_data)
-                    if os.path.exists('export.zip'):
-                        with open("export.zip", "rb") as f:
-                            if st.download_button(
-                                label="📥 Télécharger l'export complet",
-                                data=f,
-                                file_name=f"Inspection_{datetime.now().strftime('%Y%m%d')}.zip",
-                                mime="application/zip",
-                                help="Cliquez pour télécharger le package complet",
-                                use_container_width=True,
-                                type="primary"
-                            ):
-                                st.balloons()
-                else:
-                    st.markdown(
-                        """
-                        <div style="padding: 2rem; text-align: center; opacity: 0.5;">
-                            ⚠️ Aucun export généré
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
+    # Only the selected view is rendered, unlike st.tabs which runs every tab on each rerun
+    views = {
+        "📋 Téléversement des documents": lambda: render_upload_view(client, reader),
+        "📊 Analyse approfondie": render_analysis_view,
+        "📋vs📋 Comparaison des documents": render_comparison_view,
+        "📤 Export automatisé": render_export_view,
+        "🗂️ Historique": render_history_view,
+    }
+    view = st.radio("Vue", list(views), horizontal=True, key="active_view", label_visibility="collapsed")
+    if st.session_state.get('background_completion'):
+        render_background_completion()
+    views[view]()
@@ -2,7 +2,7 @@
 
 import re
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 
 def parse_date(date_str: str) -> Tuple[Optional[datetime.date], Optional[str]]:
     """Parse a date string into a date object.
@@ -38,3 +38,20 @@ def normalize_serial(serial: str) -> str:
         Normalized serial number.
     """
     return re.sub(r'[^A-Z0-9]', '', str(serial).upper())
+
+def strip_images(processed_data: Dict) -> Dict:
+    """Return a copy of processed data without the decoded image objects.
+
+    Args:
+        processed_data: Processed inspection data.
+
+    Returns:
+        JSON-serializable copy of the data, records converted to dicts.
+    """
+    from .records import plain
+    payload = {k: v for k, v in processed_data.items() if k != 'images'}
+    payload['images'] = [
+        {k: v for k, v in img.items() if k != 'image'}
+        for img in processed_data.get('images', [])
+    ]
+    return plain(payload)
@@ -0,0 +1,97 @@
+"""Tests of the time budget of interactive inspections."""
+
+import numpy as np
+import pytest
+from src.budget import CostModel, TimeBudget, megapixels, new_budget_stats, provisional_message
+from src.pixels import ImagePixels
+from src.processing import _run_ocr_tiers, new_ocr_stats
+from src.stubs import StubOcrReader
+
+PRIORS = {'ocr:full': 2.0, 'ocr:roi': 0.6, 'ocr:fast': 0.2, 'classify:full': 0.1}
+
+def test_costs_scale_with_megapixels_and_follow_measures():
+    costs = CostModel(alpha=0.5, priors=PRIORS)
+    assert costs.estimate('ocr', 'full', 2.0) == 4.0
+    costs.observe('ocr', 'full', 2.0, 2.0)
+    assert costs.snapshot()['ocr:full'] == 1.5
+    costs.observe('barcode', 'full', 1.0, 0.3)
+    assert costs.snapshot()['barcode:full'] == 0.3
+    assert costs.estimate('unknown', 'full', 1.0) == 0.0
+
+def test_without_limit_every_step_runs_at_full_quality():
+    budget = TimeBudget(None, CostModel(priors=PRIORS))
+    budget.plan('ocr', 2)
+    assert budget.remaining() == float('inf')
+    assert [budget.choose('ocr', 100.0) for _ in range(2)] == ['full', 'full']
+
+def test_cheaper_tiers_are_chosen_as_time_runs_out():
+    budget = TimeBudget(1.0, CostModel(priors=PRIORS))
+    budget.plan('ocr', 1)
+    assert budget.choose('ocr', 0.4) == 'full'
+    budget.plan('ocr', 1)
+    assert budget.choose('ocr', 1.0) == 'roi'
+    budget.plan('ocr', 1)
+    assert budget.choose('ocr', 4.0) == 'fast'
+    budget.plan('ocr', 1)
+    assert budget.choose('ocr', 10.0) is None
+
+def test_remaining_time_is_shared_between_waiting_images():
+    budget = TimeBudget(1.0, CostModel(priors=PRIORS))
+    budget.plan('ocr', 4)
+    assert budget.choose('ocr', 0.4) == 'roi'
+    budget.skip('ocr')
+    budget.skip('ocr')
+    assert budget.choose('ocr', 0.4, workers=1) == 'full'
+
+def test_report_counts_tiers_and_provisional_results():
+    budget = TimeBudget(0.01, CostModel(priors=PRIORS))
+    budget.plan('ocr', 1)
+    budget.choose('ocr', 10.0)
+    stats = new_budget_stats()
+    budget.report(stats, provisional=1)
+    assert stats == {'inspections': 1, 'over_budget': 1, 'provisional': 1, 'tiers': {'ocr:defer': 1}}
+    assert provisional_message(1) is not None
+    assert provisional_message(0) is None
+
+def _pixels():
+    return ImagePixels(np.zeros((600, 800, 3), dtype=np.uint8))
+
+def _serial_and_date(results):
+    return results[1][1], results[2][1]
+
+def test_only_the_passes_that_ran_are_timed():
+    timings = {}
+    _run_ocr_tiers(StubOcrReader(), [_pixels()], [_serial_and_date], tiered=True, fast_max_side=400,
+                   stats=new_ocr_stats(), timings=timings, cache=False)
+    assert set(timings) == {'fast'}
+
+    timings = {}
+    _run_ocr_tiers(StubOcrReader(confidence=0.1), [_pixels()], [_serial_and_date], tiered=True,
+                   fast_max_side=400, stats=new_ocr_stats(), timings=timings, cache=False)
+    assert set(timings) == {'fast', 'full'}
+
+    timings = {}
+    _, limited = _run_ocr_tiers(StubOcrReader(confidence=0.1), [_pixels()], [_serial_and_date], tiered=True,
+                                fast_max_side=400, stats=new_ocr_stats(), escalation='none',
+                                timings=timings, cache=False)
+    assert set(timings) == {'fast'}
+    assert limited == [0]
+
+def test_background_completion_leaves_provisional_results_untouched():
+    pytest.importorskip("src.extraction", exc_type=ImportError)  # Needs the zbar library
+    from src.processing import complete_provisional
+    from src.records import ImageResult
+    from src.stubs import StubInferenceClient
+    pixels = _pixels()
+    provisional = ImageResult(type='Batterie', serial=None, date=None, image=pixels.array,
+                              filename='b.jpg', provisional=True)
+    pairs, messages = complete_provisional([('b.jpg', pixels)], [provisional], StubInferenceClient(),
+                                           StubOcrReader(), use_prefilter=False)
+    (original, final), = pairs
+    assert original is provisional and provisional['serial'] is None and provisional['provisional']
+    assert final['serial'] == 'STUB00001' and 'provisional' not in final
+    assert final['filename'] == 'b.jpg'
+    assert all(level != 'error' for level, _ in messages)
+
+def test_megapixels():
+    assert megapixels((4000, 3000)) == 12.0
@@ -0,0 +1,92 @@
+"""Tests of the record/replay of remote inference calls."""
+
+import time
+import pytest
+from src.cassette import RecordingInferenceClient, ReplayInferenceClient, content_key
+from src.stubs import StubInferenceClient
+
+class FailingClient:
+    def infer(self, image_path, model_id=''):
+        raise TimeoutError("no answer")
+
+@pytest.fixture
+def cassette(tmp_path):
+    """Cassette recorded from a stub client: two answered images and a failed one."""
+    paths = []
+    for name in ("a.jpg", "b.jpg", "c.jpg"):
+        path = tmp_path / name
+        path.write_bytes(name.encode() * 100)
+        paths.append(str(path))
+    cassette_path = str(tmp_path / "cassettes" / "inference.jsonl")
+    recorder = RecordingInferenceClient(StubInferenceClient('Batterie', latency=0.05), cassette_path)
+    recorder.infer(paths[0], model_id="model/1")
+    recorder.infer(paths[1], model_id="model/1")
+    with pytest.raises(TimeoutError):
+        RecordingInferenceClient(FailingClient(), cassette_path).infer(paths[2], model_id="model/1")
+    return cassette_path, paths
+
+def test_content_key(tmp_path):
+    first, copy, other = tmp_path / "1.jpg", tmp_path / "2.jpg", tmp_path / "3.jpg"
+    first.write_bytes(b"label")
+    copy.write_bytes(b"label")
+    other.write_bytes(b"other")
+    assert content_key(str(first), "m") == content_key(str(copy), "m")
+    assert content_key(str(first), "m") != content_key(str(other), "m")
+    assert content_key(str(first), "m") != content_key(str(first), "n")
+
+def test_replay_returns_the_recorded_answers(cassette):
+    cassette_path, paths = cassette
+    replay = ReplayInferenceClient(cassette_path, latency='none')
+    assert len(replay) == 3
+    answer = replay.infer(paths[0], "model/1")
+    assert answer == StubInferenceClient('Batterie').infer(paths[0])
+    answer['predictions'].clear()  # Callers get a copy
+    assert replay.infer(paths[0], "model/1")['predictions']
+    with pytest.raises(RuntimeError, match="TimeoutError: no answer"):
+        replay.infer(paths[2], "model/1")
+    with pytest.raises(KeyError):
+        replay.infer(paths[0], "model/2")
+
+def _timed(replay, path):
+    start = time.perf_counter()
+    replay.infer(path, "model/1")
+    return time.perf_counter() - start
+
+def test_latency_modes(cassette):
+    cassette_path, paths = cassette
+    assert _timed(ReplayInferenceClient(cassette_path, latency='none'), paths[0]) < 0.04
+    assert _timed(ReplayInferenceClient(cassette_path, latency='recorded'), paths[0]) >= 0.05
+    assert _timed(ReplayInferenceClient(cassette_path, latency=0.1), paths[0]) >= 0.1
+    scaled = ReplayInferenceClient(cassette_path, latency=0.1, latency_scale=0.0)
+    assert _timed(scaled, paths[0]) < 0.04
+
+def test_jitter_is_reproducible_and_never_negative(cassette):
+    cassette_path, _ = cassette
+    entry = {'latency': 0.01}
+    draws = [ReplayInferenceClient(cassette_path, jitter=0.05, seed=7) for _ in range(2)]
+    first, second = ([replay._delay(entry) for _ in range(50)] for replay in draws)
+    assert first == second
+    assert min(first) == 0.0 and len(set(first)) > 10
+    assert ReplayInferenceClient(cassette_path, jitter=0.0)._delay(entry) == 0.01
+
+def test_error_rate(cassette):
+    cassette_path, paths = cassette
+    never = ReplayInferenceClient(cassette_path, latency='none', error_rate=0.0)
+    always = ReplayInferenceClient(cassette_path, latency='none', error_rate=1.0)
+    assert never.infer(paths[1], "model/1")
+    with pytest.raises(ConnectionError):
+        always.infer(paths[1], "model/1")
+
+    def failures(seed):
+        replay = ReplayInferenceClient(cassette_path, latency='none', error_rate=0.3, seed=seed)
+        outcomes = []
+        for _ in range(200):
+            try:
+                replay.infer(paths[1], "model/1")
+                outcomes.append(False)
+            except ConnectionError:
+                outcomes.append(True)
+        return outcomes
+
+    assert failures(1) == failures(1)
+    assert 30 < sum(failures(1)) < 90
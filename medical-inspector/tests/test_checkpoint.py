@@ -0,0 +1,84 @@
+"""Tests of the checkpoint journal of batch runs."""
+
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from src.checkpoint import CheckpointJournal, batch_job_id, resume_message
+from src.records import ImageResult
+
+def test_job_id_depends_on_files_and_parameters_not_order():
+    files = [("a.pdf", "1"), ("b.jpg", "2")]
+    assert batch_job_id(files, "G5") == batch_job_id(list(reversed(files)), "G5")
+    assert batch_job_id(files, "G5") != batch_job_id(files, "G3")
+    assert batch_job_id(files, "G5") != batch_job_id([("a.pdf", "1"), ("b.jpg", "3")], "G5")
+
+def test_interrupted_run_is_resumed(tmp_path):
+    journal = CheckpointJournal("job", str(tmp_path))
+    journal.record("a.jpg", "d1", "image", ImageResult(type='Batterie', serial='S1'))
+    journal.record("b.jpg", "d2", "classify", {'type': 'Electrodes', 'classified': True})
+    journal.close()
+
+    resumed = CheckpointJournal("job", str(tmp_path))
+    assert len(resumed) == 2
+    assert resumed.get("a.jpg", "d1", "image")['serial'] == 'S1'
+    assert resumed.get("a.jpg", "other digest", "image") is None
+    assert resumed.get("b.jpg", "d2", "classify")['classified']
+    resumed.record("b.jpg", "d2", "image", {'type': 'Electrodes'})
+    assert resumed.report() == {'resumed': ['a.jpg'], 'partial': ['b.jpg'], 'recomputed': []}
+    assert resume_message(resumed.report()) is not None
+    resumed.close()
+
+def test_finish_deletes_the_journal(tmp_path):
+    journal = CheckpointJournal("job", str(tmp_path))
+    journal.record("a.jpg", "d1", "image", {'type': 'Batterie'})
+    journal.finish()
+    assert not os.path.exists(journal.path)
+    assert len(CheckpointJournal("job", str(tmp_path))) == 0
+
+def test_torn_tail_is_dropped_and_appends_stay_readable(tmp_path):
+    journal = CheckpointJournal("job", str(tmp_path))
+    journal.record("a.jpg", "d1", "image", {'type': 'Batterie'})
+    journal.close()
+    with open(journal.path, 'ab') as f:
+        f.write(b'\x84\xa4file')  # Entry cut short by a crash
+
+    resumed = CheckpointJournal("job", str(tmp_path))
+    assert len(resumed) == 1
+    resumed.record("b.jpg", "d2", "image", {'type': 'Electrodes'})
+    resumed.close()
+    assert len(CheckpointJournal("job", str(tmp_path))) == 2
+
+def test_concurrent_runs_of_the_same_files_keep_their_own_journal(tmp_path):
+    first = CheckpointJournal("job", str(tmp_path))
+    first.record("a.jpg", "d1", "image", {'type': 'Batterie'})
+    second = CheckpointJournal("job", str(tmp_path))
+    assert second.path != first.path
+    assert len(second) == 0
+    second.record("b.jpg", "d2", "image", {'type': 'Electrodes'})
+
+    first.finish()
+    assert os.path.exists(second.path)
+    second.finish()
+    assert os.listdir(tmp_path) == []
+
+def test_images_can_be_resumed_twice_from_the_same_journal(tmp_path):
+    pytest.importorskip("src.extraction", exc_type=ImportError)  # Needs the zbar library
+    from src.processing import analyze_images
+    from src.stubs import StubInferenceClient, StubOcrReader
+    rng = np.random.default_rng(0)
+    images = [
+        (f"i{idx}.jpg", Image.fromarray(rng.integers(0, 255, (120, 160, 3), dtype=np.uint8)))
+        for idx in range(2)
+    ]
+    client, reader = StubInferenceClient(), StubOcrReader()
+
+    journal = CheckpointJournal("job", str(tmp_path))
+    first = analyze_images(images, client, reader, use_prefilter=False, journal=journal)
+    journal.close()
+    journal = CheckpointJournal("job", str(tmp_path))
+    for _ in range(2):
+        again = analyze_images(images, client, reader, use_prefilter=False, journal=journal)
+        assert [(r['type'], r['serial']) for r in again] == [(r['type'], r['serial']) for r in first]
+    assert journal.report()['resumed'] == ['i0.jpg', 'i1.jpg']
+    journal.finish()
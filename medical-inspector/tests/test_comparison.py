@@ -0,0 +1,42 @@
+"""Tests of the memoized field comparisons."""
+
+from src.comparison import compare_rvd_aed_data, compare_rvd_images_data
+
+RVD = {
+    "Numéro de série DEFIBRILLATEUR": "DEF-001",
+    "Date-Heure rapport vérification défibrillateur": "14/03/2024 10:00",
+    "Date mise en service BATTERIE": "01/01/2023",
+    "Niveau de charge de la batterie en %": "90",
+    "Changement batterie": "Non",
+    "Numéro de série Batterie": "BAT001",
+    "Date fabrication BATTERIE": "01/06/2022",
+}
+AED = {'generation': 'G5', 'serial': 'DEF001', 'report_date': '2024-03-14',
+       'battery_install_date': '2023-01-01', 'battery_capacity': 89.0}
+
+def test_rvd_and_aed_fields_are_compared():
+    results = compare_rvd_aed_data(RVD, AED)
+    assert all(results[field]['match'] for field in results)
+    assert results['serial']['depends_on'] == ['AEDG5.serial', 'RVD.Numéro de série DEFIBRILLATEUR']
+
+def test_invalid_battery_level_is_reported_not_raised():
+    results = compare_rvd_aed_data(RVD, dict(AED, battery_capacity=None))
+    assert results['battery_level']['match'] is False
+    assert 'error' in results['battery_level']
+
+def test_unchanged_inputs_are_served_from_the_memo():
+    memo = {}
+    first = compare_rvd_aed_data(RVD, AED, memo)
+    second = compare_rvd_aed_data(RVD, dict(AED, battery_capacity=50.0), memo)
+    assert second['serial'] is first['serial']
+    assert second['battery_level'] is not first['battery_level']
+    assert second['battery_level']['match'] is False
+
+def test_new_photo_invalidates_only_its_fields():
+    memo = {}
+    battery = {'type': 'Batterie', 'serial': 'BAT0O1', 'date': '2022-06-01'}
+    first = compare_rvd_images_data(RVD, [battery], memo)
+    assert first['battery_serial']['match']
+    second = compare_rvd_images_data(RVD, [dict(battery, serial='BAT999')], memo)
+    assert not second['battery_serial']['match']
+    assert second['battery_date'] is first['battery_date']
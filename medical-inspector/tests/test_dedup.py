@@ -0,0 +1,68 @@
+"""Tests of the grouping of near-duplicate photos."""
+
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter
+from src.pixels import ImagePixels
+from src.processing import group_near_duplicates, hamming_distance, perceptual_hash, sharpness
+
+def _label(seed, size=(240, 320)):
+    """Photo of a label: random blocks, so two seeds give unrelated images."""
+    blocks = np.random.default_rng(seed).integers(0, 255, (size[0] // 40, size[1] // 40, 3), dtype=np.uint8)
+    return np.kron(blocks, np.ones((40, 40, 1), dtype=np.uint8))
+
+def _shot(array, taken=None):
+    return ImagePixels(array.copy(), taken)
+
+def _blurred(array, radius=3):
+    return np.asarray(Image.fromarray(array).filter(ImageFilter.GaussianBlur(radius)))
+
+def test_hash_is_stable_under_small_changes():
+    label = _label(1)
+    noisy = np.clip(label.astype(np.int16) + np.random.default_rng(2).integers(-6, 6, label.shape), 0, 255)
+    same = perceptual_hash(_shot(label), 16)
+    assert same == perceptual_hash(Image.fromarray(label), 16)
+    assert hamming_distance(same, perceptual_hash(_shot(noisy.astype(np.uint8)), 16)) <= 12
+    assert hamming_distance(same, perceptual_hash(_shot(_label(3)), 16)) > 12
+    assert perceptual_hash(_shot(label)) < 1 << 64
+
+def test_burst_shots_are_grouped():
+    first, other = _label(1), _label(2)
+    shots = [_shot(first, 100.0), _shot(other, 104.0), _shot(_blurred(first, 1), 108.0), _shot(first, 130.0)]
+    # Each shot extends the burst of its group
+    assert group_near_duplicates(shots) == [[0, 2, 3], [1]]
+
+def test_same_label_of_another_burst_is_kept_apart():
+    label = _label(1)
+    # A second site photographed later, whose label looks the same
+    shots = [_shot(label, 0.0), _shot(label, 5.0), _shot(label, 3600.0)]
+    assert group_near_duplicates(shots) == [[0, 1], [2]]
+    assert group_near_duplicates(shots, max_interval=None) == [[0, 1, 2]]
+
+def test_shots_without_capture_time_are_grouped_only_within_an_inspection():
+    label = _label(1)
+    shots = [_shot(label), _shot(label), _shot(label, 10.0)]
+    assert group_near_duplicates(shots) == [[0], [1], [2]]
+    assert group_near_duplicates(shots, max_interval=None) == [[0, 1, 2]]
+
+def test_sharpness_prefers_the_focused_shot():
+    label = _label(1)
+    assert sharpness(_shot(label)) > sharpness(_shot(_blurred(label, 1))) > sharpness(_shot(_blurred(label, 4)))
+    assert sharpness(_shot(np.zeros((2, 2, 3), dtype=np.uint8))) == 0.0
+
+def test_sharpest_shot_stands_for_its_burst():
+    pytest.importorskip("src.extraction", exc_type=ImportError)
+    from src.processing import analyze_images
+    from src.stubs import StubInferenceClient, StubOcrReader
+    label = _label(1)
+    named_images = [
+        ("blurred.jpg", _shot(_blurred(label, 3), 0.0)),
+        ("sharp.jpg", _shot(label, 2.0)),
+        ("shaky.jpg", _shot(_blurred(label, 1), 4.0)),
+        ("other_site.jpg", _shot(label, 7200.0)),
+    ]
+    results = analyze_images(named_images, StubInferenceClient(), StubOcrReader(), use_prefilter=False,
+                             ocr_cache=False)
+    assert [(r['filename'], r.get('duplicates', [])) for r in results] == [
+        ("sharp.jpg", ["blurred.jpg", "shaky.jpg"]), ("other_site.jpg", []),
+    ]
@@ -0,0 +1,78 @@
+"""Tests of the typed Parquet export."""
+
+import io
+import zipfile
+from datetime import date, datetime
+import pyarrow.parquet as pq
+from src.export import SCHEMAS, append_parquet, build_tables, parquet_archive
+from src.records import FieldComparison, ImageResult, RvdFields
+
+EXPORTED_AT = datetime(2024, 3, 15, 10, 30)
+
+def _processed_data():
+    return {
+        'RVD': RvdFields({
+            "Code site": "A1",
+            "Numéro de série Batterie": "BAT-001",
+            "Date fabrication BATTERIE": "15/03/2024",
+            "Niveau de charge de la batterie en %": "87,5 %",
+            "Changement batterie": "Non",
+            "Numéro de série ELECTRODES ADULTES": "N/A",
+        }),
+        'AED': {'generation': 'G5', 'serial': 'DEF001', 'serial_norm': 'DEF001', 'report_date': '2024-03-14',
+                'battery_capacity': 90.0, 'raw': {'N° série DAE': 'DEF001'}},
+        'images': [ImageResult(type='Batterie', serial='bat001', date='illisible', filename='b.jpg',
+                               duplicates=['b2.jpg'])],
+        'comparisons': {
+            'rvd_vs_images': {
+                'battery_serial': FieldComparison(rvd='BAT-001', image='bat001', match=True),
+                'battery_date': FieldComparison(rvd='15/03/2024', image='illisible', match=False,
+                                                errors=["Unrecognized format: "]),
+            },
+            'rvd_vs_aed': {'battery_level': FieldComparison(error="Données de batterie invalides", match=False)},
+        },
+    }
+
+def test_tables_follow_their_schemas():
+    tables = build_tables(_processed_data(), "uid-1", exported_at=EXPORTED_AT)
+    assert set(tables) == set(SCHEMAS)
+    for name, table in tables.items():
+        assert table.schema == SCHEMAS[name]
+    assert [tables[name].num_rows for name in ('rvd', 'aed', 'images', 'comparisons')] == [1, 1, 1, 3]
+
+def test_rvd_values_are_typed():
+    row = build_tables(_processed_data(), "uid-1", exported_at=EXPORTED_AT)['rvd'].to_pylist()[0]
+    assert row['inspection_uid'] == "uid-1"
+    assert row['code_site'] == "A1"
+    assert row['battery_manufactured'] == date(2024, 3, 15)
+    assert row['battery_level'] == 87.5
+    assert row['battery_replaced'] is False
+    assert row['electrode_serial'] is None
+    assert dict(row['fields'])["Code site"] == "A1"
+
+def test_unparseable_image_date_keeps_its_text():
+    row = build_tables(_processed_data(), "uid-1", exported_at=EXPORTED_AT)['images'].to_pylist()[0]
+    assert row['date'] is None
+    assert row['date_text'] == 'illisible'
+    assert row['serial_norm'] == 'BAT001'
+    assert row['duplicates'] == ['b2.jpg']
+
+def test_comparison_errors_are_joined():
+    rows = build_tables(_processed_data(), "uid-1", exported_at=EXPORTED_AT)['comparisons'].to_pylist()
+    by_field = {row['field']: row for row in rows}
+    assert by_field['battery_serial']['other_value'] == 'bat001'
+    assert by_field['battery_date']['error'] == "Unrecognized format: "
+    assert by_field['battery_level']['error'] == "Données de batterie invalides"
+    assert by_field['battery_level']['rvd_value'] is None
+
+def test_empty_inspection_gives_empty_tables():
+    tables = build_tables({'images': [], 'comparisons': {}}, "uid-2", exported_at=EXPORTED_AT)
+    assert all(table.num_rows == 0 for table in tables.values())
+
+def test_tables_are_appended_and_archived(tmp_path):
+    tables = build_tables(_processed_data(), "uid-1", exported_at=EXPORTED_AT)
+    append_parquet(tables, str(tmp_path))
+    append_parquet(tables, str(tmp_path))
+    assert pq.read_table(str(tmp_path / 'comparisons')).num_rows == 6
+    with zipfile.ZipFile(io.BytesIO(parquet_archive(tables))) as archive:
+        assert sorted(archive.namelist()) == sorted(f"{name}.parquet" for name in SCHEMAS)
@@ -0,0 +1,71 @@
+"""Tests of the inspection history store and its lookups."""
+
+from datetime import date
+from src.history import InspectionHistory, collect_expiries, collect_serials, report_date
+
+def _inspection(site, reported, electrodes_expiry, battery="BAT-001", images=()):
+    return {
+        'RVD': {
+            'Code site': site,
+            'Date-Heure rapport vérification défibrillateur': reported,
+            'Numéro de série Batterie': battery,
+            'Date de péremption ELECTRODES ADULTES': electrodes_expiry,
+            'Numéro de série ELECTRODES ADULTES': "Non trouvé",
+        },
+        'AEDG5': {'N° série DAE': "DAE-42"},
+        'images': list(images),
+    }
+
+def test_collected_values():
+    data = _inspection("a1", "12/03/2024 10:15", "01/06/2025", images=[
+        {'type': 'Batterie', 'serial': "BAT-001", 'date': None},
+        {'type': 'Electrodes', 'serial': "N/A", 'date': "2025-06-01"},
+    ])
+    assert sorted(collect_serials(data)) == [
+        ('batterie', 'RVD', "BAT-001"), ('batterie', 'image', "BAT-001"), ('defibrillateur', 'AEDG5', "DAE-42"),
+    ]
+    assert collect_expiries(data) == [('electrodes', 'RVD', date(2025, 6, 1)), ('electrodes', 'image', date(2025, 6, 1))]
+    assert report_date(data) == date(2024, 3, 12)
+    assert report_date({'RVD': {}}) is None
+
+def test_saved_inspections_are_found(tmp_path):
+    history = InspectionHistory(str(tmp_path / "history.sqlite3"))
+    data = _inspection(" a1 ", "12/03/2024", "01/06/2025")
+    assert history.save_inspection("uid1", data, 'G5') is not None
+    assert history.save_inspection("uid1", data, 'G5') is None  # Unchanged
+    assert history.count() == 1
+    rows = history.find_by_serial("bat 001")
+    assert [(row['code_site'], row['component'], row['serial'], row['report_date']) for row in rows] == [
+        ("A1", 'batterie', "BAT-001", "2024-03-12")
+    ]
+    assert [row['uid'] for row in history.find_by_site("a1")] == ["uid1"]
+    assert history.get_payload("uid1")['RVD']['Code site'] == " a1 "
+    assert history.get_payload("unknown") is None
+    assert history.suggest_serials("BAT-0O1")[0]['serial'] == "BAT001"
+
+    # A changed inspection replaces the stored one
+    history.save_inspection("uid1", _inspection("A1", "12/03/2024", "01/06/2025", battery="BAT-002"), 'G5')
+    assert history.count() == 1
+    assert history.find_by_serial("BAT-001") == []
+    assert len(history.find_by_serial("BAT-002")) == 1
+
+def test_latest_inspection_is_the_last_reported_not_the_last_saved(tmp_path):
+    history = InspectionHistory(str(tmp_path / "history.sqlite3"))
+    # A catch-up saves the folders in directory order, here the newer report first
+    history.save_inspection("2024", _inspection("A1", "12/03/2024", "01/06/2025"), 'G5')
+    history.save_inspection("2023", _inspection("A1", "10/03/2023", "15/06/2025"), 'G5')
+    history.save_inspection("undated", _inspection("A1", "Non trouvé", "20/06/2025"), 'G5')
+    history.save_inspection("other", _inspection("B2", "01/01/2024", "10/06/2025"), 'G5')
+    assert [row['uid'] for row in history.find_by_site("A1")] == ["2024", "2023", "undated"]
+    june = history.find_expiring(date(2025, 6, 1), date(2025, 6, 30))
+    assert [(row['code_site'], row['expiry_date']) for row in june] == [("A1", "2025-06-01"), ("B2", "2025-06-10")]
+    assert [row['uid'] for row in history.find_by_serial("BAT-001")] == ["2024", "other", "2023", "undated"]
+
+def test_site_left_by_a_resaved_inspection_keeps_a_latest_one(tmp_path):
+    history = InspectionHistory(str(tmp_path / "history.sqlite3"))
+    history.save_inspection("old", _inspection("A1", "10/03/2023", "15/06/2025"), 'G5')
+    history.save_inspection("new", _inspection("A1", "12/03/2024", "01/06/2025"), 'G5')
+    # The site code of the newer inspection was misread, and is corrected
+    history.save_inspection("new", _inspection("C3", "12/03/2024", "01/06/2025"), 'G5')
+    june = history.find_expiring(date(2025, 6, 1), date(2025, 6, 30))
+    assert [(row['code_site'], row['expiry_date']) for row in june] == [("C3", "2025-06-01"), ("A1", "2025-06-15")]
@@ -0,0 +1,133 @@
+"""Tests of the incremental ingestion of inspection folders."""
+
+import os
+import time
+import numpy as np
+import pytest
+from PIL import Image
+from src.checkpoint import CheckpointJournal
+from src.ingest import FolderDebouncer, _changed_files, _write_json, ingest_folder, load_state
+from src.stubs import StubInferenceClient, StubOcrReader
+
+def _photo(path, seed):
+    pixels = np.random.default_rng(seed).integers(0, 255, (64, 64, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path)
+
+def test_debouncer_releases_quiet_folders_once(tmp_path):
+    debouncer = FolderDebouncer(debounce=0.05)
+    debouncer.touch(str(tmp_path / "a" / "photo.jpg"))
+    debouncer.touch(str(tmp_path / "a" / "~$rapport.pdf"))
+    debouncer.touch(str(tmp_path / "b" / "notes.txt"))
+    assert debouncer.ready() == []
+    time.sleep(0.1)
+    assert debouncer.ready() == [str(tmp_path / "a")]
+    assert debouncer.ready() == []
+
+def test_debouncer_waits_for_the_last_event(tmp_path):
+    debouncer = FolderDebouncer(debounce=0.1)
+    debouncer.touch(str(tmp_path / "photo1.jpg"))
+    time.sleep(0.07)
+    debouncer.touch(str(tmp_path / "photo2.jpg"))
+    time.sleep(0.07)
+    assert debouncer.ready() == []
+    time.sleep(0.05)
+    assert debouncer.ready() == [str(tmp_path)]
+
+def test_changed_files(tmp_path):
+    _photo(tmp_path / "same.jpg", 1)
+    _photo(tmp_path / "touched.jpg", 2)
+    _photo(tmp_path / "edited.jpg", 3)
+    (tmp_path / "notes.txt").write_text("ignored")
+    first = _changed_files(str(tmp_path), {'files': {}})
+    assert sorted(first) == ["edited.jpg", "same.jpg", "touched.jpg"]
+    assert all(entry['pending'] for entry in first.values())
+
+    state = {'files': {name: {**{k: v for k, v in entry.items() if k != 'pending'}, 'image': {'type': 'Batterie'}}
+                       for name, entry in first.items()}}
+    later = time.time() + 10
+    os.utime(tmp_path / "touched.jpg", (later, later))
+    _photo(tmp_path / "edited.jpg", 4)
+    _photo(tmp_path / "new.jpg", 5)
+    entries = _changed_files(str(tmp_path), state)
+    assert entries["same.jpg"] is state['files']["same.jpg"]
+    # Same content under a new time: results kept, fingerprint refreshed
+    assert not entries["touched.jpg"].get('pending')
+    assert entries["touched.jpg"]['image'] == {'type': 'Batterie'}
+    assert entries["touched.jpg"]['mtime_ns'] != state['files']["touched.jpg"]['mtime_ns']
+    assert entries["edited.jpg"]['pending'] and 'image' not in entries["edited.jpg"]
+    assert entries["new.jpg"]['pending']
+
+def test_entry_without_hash_is_pending_again(tmp_path):
+    _photo(tmp_path / "failed.jpg", 1)
+    stat = os.stat(tmp_path / "failed.jpg")
+    state = {'files': {"failed.jpg": {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}}}
+    assert _changed_files(str(tmp_path), state)["failed.jpg"]['pending']
+
+class FlakyClient(StubInferenceClient):
+    """Client whose first calls fail, as during a network outage."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def infer(self, image_path, model_id=''):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("service unavailable")
+        return super().infer(image_path, model_id)
+
+def test_incremental_rerun_retries_failed_files(tmp_path, monkeypatch):
+    pytest.importorskip("src.extraction", exc_type=ImportError)
+    monkeypatch.chdir(tmp_path)
+    folder = tmp_path / "site"
+    folder.mkdir()
+    _photo(folder / "a.jpg", 1)
+    _photo(folder / "b.jpg", 2)
+    (folder / "broken.jpg").write_bytes(b"not an image")
+    reader = StubOcrReader()
+
+    first = ingest_folder(str(folder), FlakyClient(failures=100), reader)
+    assert first['processed_files'] == ["a.jpg", "b.jpg", "broken.jpg"]
+    assert first['failed_files'] == ["a.jpg", "b.jpg", "broken.jpg"]
+    assert all('sha256' not in entry for entry in load_state(str(folder))['files'].values())
+
+    # The failed files are retried although none of them changed
+    second = ingest_folder(str(folder), StubInferenceClient(), reader)
+    assert second['processed_files'] == ["a.jpg", "b.jpg", "broken.jpg"]
+    assert second['failed_files'] == ["broken.jpg"]
+    files = load_state(str(folder))['files']
+    assert files["a.jpg"]['sha256'] and files["a.jpg"]['image']['type'] == 'Batterie'
+    assert 'sha256' not in files["broken.jpg"]
+
+    third = ingest_folder(str(folder), StubInferenceClient(), reader)
+    assert third['processed_files'] == ["broken.jpg"]
+    (folder / "broken.jpg").unlink()
+    assert ingest_folder(str(folder), StubInferenceClient(), reader)['processed_files'] == []
+    assert ingest_folder(str(folder), StubInferenceClient(), reader) is None
+
+def test_journal_released_when_the_outputs_fail(tmp_path, monkeypatch):
+    pytest.importorskip("src.extraction", exc_type=ImportError)
+    monkeypatch.chdir(tmp_path)
+    folder = tmp_path / "site"
+    folder.mkdir()
+    _photo(folder / "a.jpg", 1)
+
+    journals = []
+
+    class TrackedJournal(CheckpointJournal):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            journals.append(self)
+
+    def full_disk(path, data):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("src.ingest.CheckpointJournal", TrackedJournal)
+    monkeypatch.setattr("src.ingest._write_json", full_disk)
+    with pytest.raises(OSError):
+        ingest_folder(str(folder), StubInferenceClient(), StubOcrReader())
+    assert journals[0]._file.closed
+    monkeypatch.setattr("src.ingest._write_json", _write_json)
+    # The completed stages are kept for the next run
+    result = ingest_folder(str(folder), StubInferenceClient(), StubOcrReader())
+    assert result['checkpoint']['resumed'] == ["a.jpg"]
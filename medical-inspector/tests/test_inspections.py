@@ -0,0 +1,91 @@
+"""Tests of the assembly of reports into inspections."""
+
+from src.inspections import (
+    UNASSIGNED, add_reports, compare_inspections, group_inspections, new_processed_data, report_documents
+)
+
+def test_aed_record_joins_the_report_it_was_parsed_from():
+    reports = [('RVD', {'Code site': 'A1'}), ('AEDG5', {'N° série DAE': 'S1'}), ('AED', {'serial': 'S1'})]
+    assert report_documents(reports) == [
+        {'RVD': {'Code site': 'A1'}},
+        {'AEDG5': {'N° série DAE': 'S1'}, 'AED': {'serial': 'S1'}},
+    ]
+
+def test_repeated_reports_are_rejected_not_overwritten():
+    processed_data = new_processed_data()
+    first = [('RVD', {'Code site': 'A1'}), ('AEDG5', {'N° série DAE': 'S1'}), ('AED', {'serial': 'S1'})]
+    assert add_reports(processed_data, first) == []
+    second = [('RVD', {'Code site': 'B2'}), ('AEDG5', {'N° série DAE': 'S2'}), ('AED', {'serial': 'S2'})]
+    assert add_reports(processed_data, second) == ['RVD', 'AEDG5']
+    assert processed_data['RVD'] == {'Code site': 'A1'}
+    assert processed_data['AED'] == {'serial': 'S1'}
+
+def _rvd(site, aed_serial, battery_serial):
+    return {'Code site': site, 'Numéro de série DEFIBRILLATEUR': aed_serial, 'Numéro de série Batterie': battery_serial}
+
+def test_files_are_grouped_by_site_and_serial():
+    pdf_reports = [
+        ('a.pdf', [('RVD', _rvd('a1', 'DEF001', 'BAT001'))]),
+        ('b.pdf', [('RVD', _rvd('B2', 'DEF002', 'BAT002'))]),
+        ('aed.pdf', [('AEDG5', {'N° série DAE': 'DEF002'}), ('AED', {'serial': 'DEF002'})]),
+    ]
+    images = [
+        {'type': 'Batterie', 'serial': 'BAT0O1', 'filename': 'bat.jpg'},
+        {'type': 'Batterie', 'serial': 'ZZZ999', 'filename': 'other.jpg'},
+    ]
+    inspections = {
+        inspection['key']: inspection['processed_data'] for inspection in group_inspections(pdf_reports, images)
+    }
+    assert set(inspections) == {'A1', 'B2', UNASSIGNED}
+    assert inspections['A1']['files'] == ['a.pdf', 'bat.jpg']
+    assert inspections['B2']['AED'] == {'serial': 'DEF002'}
+    assert inspections[UNASSIGNED]['files'] == ['other.jpg']
+
+def test_rvds_of_the_same_site_keep_their_own_inspection():
+    messages = []
+    pdf_reports = [
+        ('a.pdf', [('RVD', _rvd('A1', 'DEF001', 'BAT001'))]),
+        ('b.pdf', [('RVD', _rvd('A1', 'DEF002', 'BAT002'))]),
+    ]
+    images = [{'type': 'Batterie', 'serial': 'BAT002', 'filename': 'bat.jpg'}]
+    inspections = group_inspections(pdf_reports, images, lambda level, message: messages.append(level))
+    assert [inspection['key'] for inspection in inspections] == ['A1', 'A1 (2)']
+    assert inspections[1]['processed_data']['files'] == ['b.pdf', 'bat.jpg']
+    assert messages == ['warning']
+
+def test_every_inspection_is_compared():
+    pdf_reports = [('a.pdf', [('RVD', _rvd('A1', 'DEF001', 'BAT001'))])]
+    images = [{'type': 'Batterie', 'serial': 'BAT001', 'date': None, 'filename': 'bat.jpg'}]
+    inspections = group_inspections(pdf_reports, images)
+    compare_inspections(inspections, 'G5')
+    assert inspections[0]['processed_data']['comparisons']['rvd_vs_images']
+
+def _aed(serial):
+    return [('AEDG5', {'N° série DAE': serial}), ('AED', {'serial': serial})]
+
+def test_second_aed_of_an_inspection_is_rejected_not_overwritten():
+    messages = []
+    pdf_reports = [
+        ('r.pdf', [('RVD', _rvd('A1', 'DEF111', 'BAT001'))]),
+        ('r2.pdf', [('RVD', _rvd('B2', 'DEF222', 'BAT002'))]),
+        ('a1.pdf', _aed('DEF111')),
+        ('a1bis.pdf', _aed('DEF111')),
+    ]
+    inspections = group_inspections(pdf_reports, [], lambda level, message: messages.append((level, message)))
+    first = inspections[0]['processed_data']
+    assert first['AED'] == {'serial': 'DEF111'}
+    assert first['files'] == ['r.pdf', 'a1.pdf']
+    assert len(messages) == 1 and messages[0][0] == 'error' and 'a1bis.pdf' in messages[0][1]
+
+def test_unmatched_aeds_each_get_their_own_group():
+    pdf_reports = [
+        ('r.pdf', [('RVD', _rvd('A1', 'DEF111', 'BAT001'))]),
+        ('r2.pdf', [('RVD', _rvd('B2', 'DEF222', 'BAT002'))]),
+        ('x.pdf', _aed('XXX001')),
+        ('y.pdf', _aed('YYY002')),
+    ]
+    inspections = {inspection['key']: inspection['processed_data']
+                   for inspection in group_inspections(pdf_reports, [])}
+    assert inspections[UNASSIGNED]['AED'] == {'serial': 'XXX001'}
+    assert inspections[UNASSIGNED]['files'] == ['x.pdf']
+    assert inspections[f"{UNASSIGNED} (2)"]['AED'] == {'serial': 'YYY002'}
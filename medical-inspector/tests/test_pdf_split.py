@@ -0,0 +1,55 @@
+"""Tests of the splitting of merged PDFs into reports."""
+
+from src.pdf_split import classify_page, split_reports
+
+RVD_FIRST = "Rapport de vérification\nCode site : A1"
+RVD_NEXT = "Numéro de série DEFIBRILLATEUR : S1"
+AED_G5 = "Rapport DAE\nN° série DAE : S1"
+AED_G3 = "Série DSA : S2\nDernier échec de DSA : aucun"
+
+def test_pages_are_classified_by_their_markers():
+    assert classify_page(RVD_FIRST) == 'RVD'
+    assert classify_page(AED_G5) == 'AEDG5'
+    assert classify_page(AED_G3) == 'AEDG3'
+    assert classify_page("Annexe sans marqueur") is None
+
+def test_reports_of_several_types_are_split():
+    pages = [RVD_FIRST, RVD_NEXT, "Annexe", AED_G5]
+    assert [(slot, pages) for slot, pages, _ in split_reports(pages)] == [('RVD', [0, 1, 2]), ('AEDG5', [3])]
+
+def test_repeated_reports_of_a_type_are_kept_apart():
+    pages = [RVD_FIRST, RVD_NEXT, RVD_FIRST.replace("A1", "B2"), AED_G5]
+    reports = split_reports(pages)
+    assert [(slot, pages) for slot, pages, _ in reports] == [('RVD', [0, 1]), ('RVD', [2]), ('AEDG5', [3])]
+    assert "B2" in reports[1][2] and "A1" not in reports[1][2]
+
+def test_leading_pages_without_markers_are_dropped():
+    assert [pages for _, pages, _ in split_reports(["Couverture", AED_G3])] == [[1]]
+    assert split_reports(["Couverture"]) == []
+
+def test_report_types_without_header_continue_the_current_report():
+    pages = [AED_G3, AED_G3]
+    assert [pages for _, pages, _ in split_reports(pages, headers={})] == [[0, 1]]
+
+def test_field_labels_do_not_start_a_report():
+    pages = ["Rapport DAE\nN° série DAE : S123", "Rapport DAE - Erreurs en cours : aucune\nDate / Heure: 12/03/2024"]
+    assert [(slot, pages) for slot, pages, _ in split_reports(pages)] == [('AEDG5', [0, 1])]
+    pages = [AED_G3, "Autotest\nOK\nRappel Série DSA : S2", AED_G3.replace("S2", "S3")]
+    assert [pages for _, pages, _ in split_reports(pages)] == [[0, 1], [2]]
+
+def test_multi_page_bundle():
+    pages = [
+        "Couverture",
+        "  \nRapport de vérification\nCode site : A1",
+        "Numéro de série DEFIBRILLATEUR : S1\nvoir le rapport de vérification",
+        AED_G5,
+        "Rapport DAE - Erreurs en cours : aucune",
+        "Rapport de vérification\nCode site : B2",
+        AED_G5.replace("S1", "S2"),
+        "Date / Heure: 12/03/2024",
+    ]
+    reports = split_reports(pages)
+    assert [(slot, pages) for slot, pages, _ in reports] == [
+        ('RVD', [1, 2]), ('AEDG5', [3, 4]), ('RVD', [5]), ('AEDG5', [6, 7])
+    ]
+    assert "12/03/2024" in reports[3][2] and "S1" not in reports[3][2]
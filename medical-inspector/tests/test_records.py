@@ -0,0 +1,57 @@
+"""Tests of the slotted result records and their msgpack serialization."""
+
+import io
+import json
+import pytest
+from src.records import (
+    AedRecord, FieldComparison, ImageResult, RvdFields, json_default, pack, plain, read_packed, unpack
+)
+
+def test_records_behave_like_dicts():
+    rvd = RvdFields({"Code site": "A1"})
+    rvd["Numéro de série Batterie"] = "B1"
+    assert dict(rvd) == {"Code site": "A1", "Numéro de série Batterie": "B1"}
+    assert rvd.get("Changement batterie") is None
+    assert "Changement batterie" not in rvd
+    assert rvd.pop("Code site") == "A1"
+    assert len(rvd) == 1
+    with pytest.raises(KeyError):
+        rvd["Code site"]
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(KeyError):
+        ImageResult(colour="red")
+
+def test_pack_round_trip_keeps_types_and_absent_fields():
+    data = {
+        'rvd': RvdFields({"Code site": "A1"}),
+        'aed': AedRecord(generation='G5', serial='S1', raw={'N° série DAE': 'S1'}),
+        'images': [ImageResult(type='Batterie', serial=None, filename='b.jpg', duplicates=['c.jpg'])],
+        'comparisons': {'serial': FieldComparison(rvd='S1', aed='S1', match=True, depends_on=['RVD.x'])},
+    }
+    restored = unpack(pack(data))
+    assert isinstance(restored['rvd'], RvdFields)
+    assert isinstance(restored['images'][0], ImageResult)
+    assert plain(restored) == plain(data)
+    assert 'date' not in restored['images'][0]
+    assert restored['images'][0]['serial'] is None
+
+def test_transient_fields_are_not_serialized():
+    image = ImageResult(type='Batterie', image=object(), filename='b.jpg')
+    restored = unpack(pack(image))
+    assert 'image' not in restored
+    assert restored['filename'] == 'b.jpg'
+    assert 'image' not in plain(image)
+
+def test_unknown_values_are_packed_as_text():
+    assert unpack(pack({'when': 1.5j})) == {'when': '1.5j'}
+
+def test_read_packed_stops_at_a_torn_value():
+    first, second = pack(ImageResult(type='A')), pack(ImageResult(type='B'))
+    values, intact = read_packed(io.BytesIO(first + second[:-2]))
+    assert [value['type'] for value in values] == ['A']
+    assert intact == len(first)
+
+def test_json_default_writes_records_as_objects():
+    text = json.dumps({'image': ImageResult(type='Batterie', image=b'x')}, default=json_default)
+    assert json.loads(text) == {'image': {'type': 'Batterie'}}
@@ -0,0 +1,70 @@
+"""Tests of the pipelined stage scheduler."""
+
+import threading
+import time
+import pytest
+from src.scheduler import Pipeline, Stage, run_in_background
+
+def _pipeline_threads():
+    return [t for t in threading.enumerate() if t is not threading.current_thread() and t.daemon]
+
+def _wait_for_threads(before, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and len(_pipeline_threads()) > len(before):
+        time.sleep(0.02)
+    return len(_pipeline_threads()) - len(before)
+
+def test_items_go_through_every_stage_tagged_with_their_position():
+    pipeline = Pipeline([Stage('double', lambda x: x * 2, workers=3), Stage('inc', lambda x: x + 1)])
+    outputs = list(pipeline.run(range(20)))
+    assert sorted((index, item) for index, item, _ in outputs) == [(i, i * 2 + 1) for i in range(20)]
+    assert all(error is None for _, _, error in outputs)
+    assert pipeline.stats['double']['items'] == 20
+    assert pipeline.stats['inc']['items'] == 20
+
+def test_stage_error_skips_the_remaining_stages():
+    seen = []
+
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("bad item")
+        return x
+
+    pipeline = Pipeline([Stage('check', fail_on_three), Stage('record', lambda x: seen.append(x) or x)])
+    outputs = {index: (item, error) for index, item, error in pipeline.run(range(5))}
+    assert isinstance(outputs[3][1], ValueError)
+    assert 3 not in seen
+    assert sorted(seen) == [0, 1, 2, 4]
+
+def test_input_error_is_raised_after_items_in_flight():
+    def items():
+        yield from range(3)
+        raise RuntimeError("input failed")
+
+    pipeline = Pipeline([Stage('identity', lambda x: x)])
+    received = []
+    with pytest.raises(RuntimeError, match="input failed"):
+        for index, _, _ in pipeline.run(items()):
+            received.append(index)
+    assert sorted(received) == [0, 1, 2]
+
+def test_closing_early_stops_every_thread():
+    before = _pipeline_threads()
+    pipeline = Pipeline([Stage('slow', lambda x: x, workers=2), Stage('next', lambda x: x)], queue_size=1)
+    outputs = pipeline.run(range(1000))
+    next(outputs)
+    outputs.close()
+    assert _wait_for_threads(before) == 0
+
+def test_consumer_error_stops_every_thread():
+    before = _pipeline_threads()
+    pipeline = Pipeline([Stage('identity', lambda x: x)], queue_size=1)
+    with pytest.raises(KeyError):
+        for _ in pipeline.run(range(1000)):
+            raise KeyError("consumer failed")
+    assert _wait_for_threads(before) == 0
+
+def test_run_in_background_returns_the_result_or_the_error():
+    assert run_in_background(lambda a, b: a + b, 1, 2).result(timeout=5) == 3
+    with pytest.raises(ZeroDivisionError):
+        run_in_background(lambda: 1 / 0).result(timeout=5)
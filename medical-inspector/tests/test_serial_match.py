@@ -0,0 +1,34 @@
+"""Tests of the OCR-tolerant serial matching."""
+
+from src.serial_match import SerialIndex, match_serials, serial_distance
+
+def test_confusions_cost_less_than_real_edits():
+    assert serial_distance("AB-1234", "ab1234") == 0.0
+    assert serial_distance("SN1O5", "5N105") == 0.5
+    assert serial_distance("SN123", "SN124") == 1.0
+
+def test_match_tolerates_confusions_only():
+    assert match_serials("SN1O5", "5N105")[0]
+    assert not match_serials("SN123", "SN124")[0]
+    assert match_serials("", "") == (False, 0.0)
+
+def test_nearest_finds_confusions_and_one_edit():
+    index = SerialIndex(["SN100234", "XY998877"])
+    assert index.nearest("5N1OO234")[0]['serial'] == "SN100234"
+    assert index.nearest("SN10023")[0]['distance'] == 1.0
+    assert index.nearest("SN100999") == []
+
+def test_nearest_ranks_closest_first_and_limits():
+    index = SerialIndex(["SN100234", "SN100235", "SN1OO234"])
+    found = index.nearest("SN100234", limit=2)
+    assert [entry['serial'] for entry in found] == ["SN100234", "SN1OO234"]
+    assert found[0]['confidence'] == 1.0
+
+def test_empty_and_duplicate_serials_are_ignored():
+    index = SerialIndex(["", "--", "ab-12", "AB12"])
+    assert len(index) == 1
+    assert index.nearest("") == []
+
+def test_max_distance_bounds_results():
+    index = SerialIndex(["SN100234"])
+    assert index.nearest("SN10023", max_distance=0.5) == []
@@ -0,0 +1,121 @@
+"""Tests of the HTTP inspection service, with the stubbed clients."""
+
+import asyncio
+import io
+import json
+import threading
+import time
+import numpy as np
+import pytest
+from aiohttp import FormData
+from aiohttp.test_utils import TestClient, TestServer
+from PIL import Image
+
+# The service decodes barcodes from its start
+pytest.importorskip("src.extraction", exc_type=ImportError)
+
+import service
+from src.config import SERVICE_MAX_PENDING
+from src.stubs import StubInferenceClient, StubOcrReader
+
+def _photo(seed):
+    pixels = np.random.default_rng(seed).integers(0, 255, (64, 64, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+def _form(count):
+    form = FormData()
+    for i in range(count):
+        form.add_field('files', _photo(i), filename=f"photo{i}.jpg", content_type='image/jpeg')
+    return form
+
+def _run(scenario, client, monkeypatch, tmp_path, **app_options):
+    """Run a scenario against the service, started with the stub OCR reader."""
+    monkeypatch.chdir(tmp_path)  # Checkpoint journals are written to the working folder
+
+    async def main():
+        app = service.create_app(client, StubOcrReader(), **app_options)
+        async with TestClient(TestServer(app)) as http:
+            return await scenario(http, app)
+
+    return asyncio.run(main())
+
+async def _events(response):
+    return [json.loads(line) for line in (await response.text()).splitlines()]
+
+def test_events_of_an_inspection(monkeypatch, tmp_path):
+
+    async def scenario(http, app):
+        response = await http.post('/inspections', data=_form(2))
+        assert response.status == 200
+        assert response.headers['Content-Type'] == 'application/x-ndjson'
+        return await _events(response)
+
+    events = _run(scenario, StubInferenceClient(), monkeypatch, tmp_path)
+    assert [event['event'] for event in events] == ['progress', 'progress', 'result']
+    assert [event['done'] for event in events[:2]] == [1, 2]
+    assert all(event['total'] == 2 for event in events[:2])
+    result = events[-1]
+    assert [image['type'] for image in result['data']['images']] == ['Batterie', 'Batterie']
+    assert result['checkpoint']['resumed'] == []
+
+def test_rejected_when_too_many_requests_are_pending(monkeypatch, tmp_path):
+    async def scenario(http, app):
+        app['pending'] = SERVICE_MAX_PENDING
+        busy = await http.post('/inspections', data=_form(1))
+        app['pending'] = 0
+        empty = await http.post('/inspections', data=FormData({'dae_type': 'G5'}, default_to_multipart=True))
+        return busy.status, busy.headers.get('Retry-After'), empty.status
+
+    assert _run(scenario, StubInferenceClient(), monkeypatch, tmp_path) == (503, '5', 400)
+
+class GatedClient(StubInferenceClient):
+    """Stub client whose classifications wait for the test to let them through."""
+
+    def __init__(self):
+        super().__init__()
+        self.gates = [threading.Event() for _ in range(3)]
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def infer(self, image_path, model_id=''):
+        with self.lock:
+            gate = self.gates[self.calls]
+            self.calls += 1
+        gate.wait(10)
+        return super().infer(image_path, model_id)
+
+def test_slot_held_until_the_run_of_a_gone_client_ends(monkeypatch, tmp_path):
+    finished = threading.Event()
+    run_inspection = service.run_inspection
+
+    def tracked_run(*args, **kwargs):
+        try:
+            return run_inspection(*args, **kwargs)
+        finally:
+            finished.set()
+
+    monkeypatch.setattr(service, 'run_inspection', tracked_run)
+    client = GatedClient()
+
+    async def wait_for(condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        return condition()
+
+    async def scenario(http, app):
+        client.gates[0].set()
+        response = await http.post('/inspections', data=_form(3))
+        first = json.loads(await response.content.readline())
+        assert first['event'] == 'progress'
+        response.close()  # The client disconnects
+        client.gates[1].set()  # The next event is written to the gone client
+        assert not await wait_for(lambda: app['pending'] == 0, timeout=0.5)
+        assert app['slots'].locked() and not finished.is_set()
+        client.gates[2].set()
+        assert await wait_for(lambda: app['pending'] == 0)
+        return finished.is_set(), app['slots'].locked()
+
+    assert _run(scenario, client, monkeypatch, tmp_path, max_concurrent=1) == (True, False)
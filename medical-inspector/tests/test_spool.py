@@ -0,0 +1,89 @@
+"""Tests of the disk spool of uploaded originals."""
+
+import gc
+import io
+import os
+import subprocess
+import sys
+import time
+from src.config import SPOOL_PREFIX
+from src.spool import SessionSpool, map_file, purge_stale_spools
+
+class Upload(io.BytesIO):
+    """Stand-in for Streamlit's UploadedFile."""
+
+    def __init__(self, name, content, type='image/jpeg'):
+        super().__init__(content)
+        self.name = name
+        self.type = type
+        self.size = len(content)
+
+def test_map_file(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"%PDF-1.4 content")
+    with map_file(str(path)) as content:
+        assert content[:8] == b"%PDF-1.4"
+        assert content.read() == b"%PDF-1.4 content"
+    (tmp_path / "empty.pdf").write_bytes(b"")
+    with map_file(str(tmp_path / "empty.pdf")) as content:
+        assert content == b""
+
+def test_spool_keeps_originals_on_disk(tmp_path):
+    spool = SessionSpool(str(tmp_path))
+    upload = Upload("Photo.JPG", b"x" * 1000)
+    upload.read()  # The spool copies from the start whatever the position
+    spooled = spool.add(upload)
+    assert (spooled.name, spooled.type, spooled.size) == ("Photo.JPG", "image/jpeg", 1000)
+    assert spooled.path.startswith(spool.path) and spooled.path.endswith(".jpg")
+    assert spooled.getvalue() == b"x" * 1000
+    assert spooled.digest == spool.add(Upload("copy.jpg", b"x" * 1000)).digest
+    assert os.path.basename(spool.path).startswith(f"{SPOOL_PREFIX}{os.getpid()}-")
+
+    spool.clear()
+    assert spool.files == [] and not os.path.exists(spooled.path)
+    assert os.path.isdir(spool.path)
+    spool.close()
+    assert not os.path.exists(spool.path)
+
+def test_spool_folder_deleted_with_the_spool(tmp_path):
+    spool = SessionSpool(str(tmp_path))
+    path = spool.path
+    del spool
+    gc.collect()
+    assert not os.path.exists(path)
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def test_purge_keeps_spools_of_live_owners(tmp_path):
+    live = SessionSpool(str(tmp_path))
+    owner = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        other_live = tmp_path / f"{SPOOL_PREFIX}{owner.pid}-abc"
+        dead = tmp_path / f"{SPOOL_PREFIX}{_dead_pid()}-abc"
+        for folder in (other_live, dead):
+            folder.mkdir()
+        # Owners are checked whatever the age of the folder
+        old = time.time() - 10 * 24 * 3600
+        for folder in (live.path, other_live, dead):
+            os.utime(folder, (old, old))
+        assert purge_stale_spools(str(tmp_path), max_age=60) == 1
+        assert os.path.isdir(live.path) and other_live.is_dir() and not dead.exists()
+    finally:
+        owner.kill()
+        owner.wait()
+        live.close()
+
+def test_purge_falls_back_on_age_for_unknown_owners(tmp_path):
+    recent = tmp_path / f"{SPOOL_PREFIX}abc"
+    stale = tmp_path / f"{SPOOL_PREFIX}def"
+    unrelated = tmp_path / "other"
+    for folder in (recent, stale, unrelated):
+        folder.mkdir()
+    old = time.time() - 3600
+    for folder in (stale, unrelated):
+        os.utime(folder, (old, old))
+    assert purge_stale_spools(str(tmp_path), max_age=60) == 1
+    assert recent.is_dir() and not stale.exists() and unrelated.is_dir()
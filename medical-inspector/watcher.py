@@ -0,0 +1,88 @@
+"""Watch-folder ingestion daemon for the Comparateur_PDF project.
+
+Watches a directory tree where inspection folders are synced. Each folder
+holding reports or photos is processed once its files stop changing, and
+again whenever files are added, replaced or removed; only those files go
+through the pipeline. Results are written to a "_resultats" folder next to
+the inputs.
+
+Usage:
+    python watcher.py ROOT [--debounce S] [--polling] [--dae-type G5|G3]
+                      [--ocr-workers N] [--stub | --replay CASSETTE]
+"""
+
+import argparse
+import logging
+import time
+from src.config import INGEST_DEBOUNCE_S, OCR_POOL_WORKERS
+from src.history import InspectionHistory
+from src.ingest import FolderDebouncer, ingest_folder, inspection_folders, start_observer
+from src.processing import new_pipeline_stats
+
+logger = logging.getLogger("watcher")
+
+def main():
+    """Start the ingestion daemon."""
+    parser = argparse.ArgumentParser(description="Watch-folder ingestion daemon")
+    parser.add_argument('root', help="Watched directory tree")
+    parser.add_argument('--debounce', type=float, default=INGEST_DEBOUNCE_S,
+                        help="Quiet time in seconds before a folder is processed")
+    parser.add_argument('--polling', action='store_true', help="Poll instead of using inotify")
+    parser.add_argument('--dae-type', default='G5', choices=('G5', 'G3'),
+                        help="AED generation used when it cannot be detected")
+    parser.add_argument('--ocr-workers', type=int, default=OCR_POOL_WORKERS)
+    parser.add_argument('--stub', action='store_true', help="Use stubbed inference and OCR")
+    parser.add_argument('--replay', metavar='CASSETTE',
+                        help="Serve classifications from a recorded cassette")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.stub:
+        from src.stubs import StubInferenceClient, StubOcrReader
+        client, reader = StubInferenceClient(), StubOcrReader()
+    elif args.replay:
+        from src.cassette import ReplayInferenceClient
+        from src.clients import load_ocr_reader
+        client, reader = ReplayInferenceClient(args.replay, latency='none'), load_ocr_reader()
+    else:
+        from src.clients import initialize_clients
+        client, reader = initialize_clients()
+    ocr_pool = None
+    if args.ocr_workers >= 2 and not args.stub:
+        from src.ocr_pool import OcrWorkerPool
+        ocr_pool = OcrWorkerPool(args.ocr_workers)
+    history = InspectionHistory()
+    stats = new_pipeline_stats()
+
+    def process(folder: str) -> None:
+        start = time.perf_counter()
+        try:
+            result = ingest_folder(folder, client, reader, args.dae_type, ocr_pool, stats, history)
+        except Exception:
+            logger.exception("Échec du traitement de %s", folder)
+            return
+        if result is not None:
+            logger.info("%s : %d fichier(s) traité(s) en %.1f s", folder,
+                        len(result['processed_files']), time.perf_counter() - start)
+
+    debouncer = FolderDebouncer(args.debounce)
+    observer = start_observer(args.root, debouncer.touch, polling=args.polling)
+    logger.info("Surveillance de %s (%s)", args.root, type(observer).__name__)
+    # Catch up once with what arrived while the daemon was stopped
+    for folder in inspection_folders(args.root):
+        process(folder)
+    try:
+        while True:
+            for folder in debouncer.ready():
+                process(folder)
+            time.sleep(min(1.0, args.debounce))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        observer.stop()
+        observer.join()
+        if ocr_pool is not None:
+            ocr_pool.close()
+
+if __name__ == "__main__":
+    main()